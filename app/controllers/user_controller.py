@@ -1,88 +1,137 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
-from sqlalchemy.orm import Session
-from typing import List
-from ..utils.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..utils.database import get_async_db, get_read_db, replicas
 from ..models.user import User
 from ..schemas.user import User as UserSchema, UserCreate, UserUpdate
 from ..services.user_service import UserService
 from ..utils.auth import get_current_active_user
-from ..utils.file_upload import save_upload_file
+from ..services.photo_service import PhotoBusy, PhotoService
+from ..utils.fast_json import FAST_JSON_RESPONSES, FastJSONResponse, dumps, rows_as_dicts, rows_to_json
+from ..utils.file_upload import FileTooLarge, stage_upload_file
+from ..utils.pagination import decode_cursor, encode_cursor
+from ..utils.query_budget import query_budget
 import os
 
 router = APIRouter()
 
-@router.post("/users/", response_model=UserSchema)
-def create_user(
+@router.post("/users/", response_model=UserSchema, dependencies=[query_budget(2)])
+async def create_user(
     user: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = UserService.get_user_by_email(db, email=user.email)
-    if db_user:
+    db_user = await UserService.create_user(db=db, user=user)
+    if db_user is None:
+        # Only a failed insert pays for finding out which one was taken
+        taken = await UserService.get_user_by_email(db, email=user.email)
         raise HTTPException(
             status_code=400,
-            detail="Email already registered"
+            detail="Email already registered" if taken else "Username already registered"
         )
+    return db_user
 
-    return UserService.create_user(db=db, user=user)
-
-@router.get("/users/", response_model=List[UserSchema])
-def read_users(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)    
+@router.get("/users/", response_model=List[UserSchema], dependencies=[query_budget(1)])
+async def read_users(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    users = UserService.get_users(db, skip=skip, limit=limit)
-    return users
+    """
+    List users ordered by id.
+
+    Pages are keyset-based: pass the ``X-Next-Cursor`` response header back
+    as ``cursor`` to get the next page. ``skip`` without a cursor still
+    uses an OFFSET query for older clients.
+    """
+    if skip and cursor is None:
+        users = await UserService.get_users(db, skip=skip, limit=limit, as_rows=FAST_JSON_RESPONSES)
+    else:
+        after_id = 0
+        if cursor is not None:
+            try:
+                after_id = int(decode_cursor(cursor)["id"])
+            except (ValueError, KeyError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        users = await UserService.get_users_after(db, after_id=after_id, limit=limit, as_rows=FAST_JSON_RESPONSES)
+
+    if FAST_JSON_RESPONSES:
+        # Rows go straight to JSON, skipping response_model validation
+        response = FastJSONResponse(rows_to_json(users))
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor({"id": users[-1].id})
+    return response if FAST_JSON_RESPONSES else users
 
-@router.get("/users/{user_id}", response_model=UserSchema)
-def read_user(
+@router.get("/users/export", dependencies=[query_budget(1)])
+async def export_users(request: Request, batch_size: int = Query(1000, ge=1, le=10000)):
+    """
+    Stream every user as newline-delimited JSON in constant memory.
+    """
+    async def generate():
+        # The request's session is closed before the body is streamed
+        async with replicas.session_for(request.scope) as db:
+            async for rows in UserService.stream_users(db, batch_size=batch_size):
+                # Same columns and encoding as the /users/ fast path
+                yield b"".join(dumps(row) + b"\n" for row in rows_as_dicts(rows))
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@router.get("/users/{user_id}", response_model=UserSchema, dependencies=[query_budget(1)])
+async def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    db_user = UserService.get_user(db, user_id=user_id)
+    db_user = await UserService.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
-@router.put("/users/{user_id}", response_model=UserSchema)
-def update_user(
+@router.put("/users/{user_id}", response_model=UserSchema, dependencies=[query_budget(2)])
+async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_user = UserService.update_user(db, user_id=user_id, user_update=user_update)
+    db_user = await UserService.update_user(db, user_id=user_id, user_update=user_update)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
-@router.delete("/users/{user_id}")
-def delete_user(
+@router.delete("/users/{user_id}", dependencies=[query_budget(6)])
+async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    success = UserService.delete_user(db, user_id=user_id)
+    success = await UserService.delete_user(db, user_id=user_id)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
 
-@router.post("/users/{user_id}/photo", response_model=UserSchema)
+@router.post("/users/{user_id}/photo", response_model=UserSchema, dependencies=[query_budget(9)])
 async def upload_user_photo(
     user_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     try:
         # Save the uploaded file
-        photo_url = save_upload_file(file, user_id)
-        
-        # Update user with new photo URL
-        user_update = UserUpdate(photo_url=photo_url)
-        updated_user = UserService.update_user(db, user_id=user_id, user_update=user_update)
+        staged = await stage_upload_file(file)
+
+        # Store it by content and point the user at it
+        updated_user = await PhotoService.set_user_photo(db, user_id=user_id, staged=staged)
         
         if updated_user is None:
             raise HTTPException(status_code=404, detail="User not found")
             
         return updated_user
+    except HTTPException:
+        raise
+    except FileTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PhotoBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,22 +1,60 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .controllers import auth_controller, user_controller
-from .routers import chat_router
-from .models import user, chat
-from .utils.database import engine
+from .middleware.request_middleware import AuthMiddleware
+from .routers import chat_router, internal_router
+from .models import user, chat, photo
+from .utils.database import engine, async_engine, replicas
+from .utils.loop_monitor import LOOP_LAG_MONITOR, loop_monitor
+from .utils.password_hashing import password_hasher
+from .utils.query_budget import QueryBudgetMiddleware
+from .utils.replicas import ReplicaRoutingMiddleware
+from .utils.request_profiler import ProfilerMiddleware
+from .utils.metrics import MetricsMiddleware
+from .utils.session_tracking import SessionScopeMiddleware
+from .utils.schema import upgrade_schema
+from .utils.thumbnails import thumbnail_pool
+from .utils.upload_files import UploadFiles
+from .services.photo_service import PhotoService
 from .websocket.chat_server import app as socket_app
 from socketio import ASGIApp
-from .websocket.chat_server import sio
+from .websocket.chat_server import sio, start_realtime, stop_realtime
+from .websocket.message_writer import message_writer
 
-# Create database tables
-user.Base.metadata.create_all(bind=engine)
-chat.Base.metadata.create_all(bind=engine)
+# Create database tables, and columns and indexes added since; workers take turns
+upgrade_schema(engine, user.Base.metadata)
 
-app = FastAPI(title="LabFast API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if LOOP_LAG_MONITOR:
+        loop_monitor.start()
+    message_writer.start()
+    thumbnail_pool.check()
+    replicas.start()
+    await start_realtime()
+    yield
+    await stop_realtime()
+    # Flush queued chat messages before the engine goes away
+    await message_writer.stop()
+    await PhotoService.wait_for_variants()
+    thumbnail_pool.shutdown()
+    password_hasher.shutdown()
+    await replicas.stop()
+    await async_engine.dispose()
+    await loop_monitor.stop()
+
+app = FastAPI(title="LabFast API", lifespan=lifespan)
 
 sio_app = ASGIApp(sio)
 app.mount("/ws", sio_app)
 
+# Uploaded photos
+app.mount("/uploads", UploadFiles(), name="uploads")
+
+# Verify bearer tokens once, inside CORS so preflights never need one
+app.add_middleware(AuthMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -25,11 +63,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(SessionScopeMiddleware)
+app.add_middleware(ReplicaRoutingMiddleware, replicas=replicas)
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(ProfilerMiddleware)
+# Outermost, so latency covers the other middleware too
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(auth_controller.router, tags=["auth"])
 app.include_router(user_controller.router, tags=["users"])
 app.include_router(chat_router.router, tags=["chat"])
+app.include_router(internal_router.router, tags=["internal"])
 
 # Mount Socket.IO app
 app.mount("/socket.io", socket_app)
@@ -1,13 +1,7 @@
 from fastapi import Request, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
+from jose import JWTError
+from ..utils.auth import verify_token
 
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
@@ -35,7 +29,7 @@ class JWTBearer(HTTPBearer):
 
     def verify_jwt(self, jwtoken: str) -> bool:
         try:
-            payload = jwt.decode(jwtoken, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = verify_token(jwtoken)
             return bool(payload)
         except JWTError:
             return False 
\ No newline at end of file
@@ -1,30 +1,64 @@
-from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
-from .auth_middleware import JWTBearer
+from ..utils.auth import NOT_AUTHENTICATED, authenticate_token, bearer_token
+import os
 import re
+from dotenv import load_dotenv
 
-# List of paths that don't require authentication
+load_dotenv()
+
+# Reject unauthenticated requests to non-public paths here instead of in each route
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+
+# Requests that don't require authentication, matched against "<METHOD> <path>"
 PUBLIC_PATHS = [
-    r"^/auth/login",
-    r"^/auth/register"
+    r"\w+ /auth/login",
+    r"\w+ /auth/register",
+    r"POST /users/$",
+    r"GET /$",
+    r"GET /(docs|redoc|openapi\.json)",
+    r"(GET|HEAD) /uploads/",
+    # Socket.IO authenticates with ?token= on connect
+    r"\w+ /(ws|socket\.io)/",
+    # Guarded by X-Internal-Token
+    r"\w+ /internal/",
 ]
 
-jwt_bearer = JWTBearer()
-
-async def auth_middleware(request: Request, call_next):
-    # Check if the path is public
-    path = request.url.path
-    if any(re.match(pattern, path) for pattern in PUBLIC_PATHS):
-        return await call_next(request)
-
-    try:
-        # Verify the token
-        token = await jwt_bearer(request)
-        # Add the token to the request state for use in route handlers
-        request.state.token = token
-        return await call_next(request)
-    except HTTPException as e:
-        return JSONResponse(
-            status_code=e.status_code,
-            content={"detail": e.detail}
-        ) 
\ No newline at end of file
+# One pass over the path instead of one re.match per pattern
+PUBLIC_PATH_PATTERN = re.compile("|".join(f"(?:{pattern})" for pattern in PUBLIC_PATHS))
+
+def is_public(method: str, path: str) -> bool:
+    return PUBLIC_PATH_PATTERN.match(f"{method} {path}") is not None
+
+class AuthMiddleware:
+    """
+    Pure ASGI middleware that verifies the bearer token once per request.
+
+    The outcome (``Authentication``) goes into ``scope["auth"]``, where
+    ``get_current_user`` picks it up instead of decoding the token again.
+    With ``required`` set, requests to non-public paths without a valid
+    token get a 401 before reaching the app.
+    """
+
+    def __init__(self, app, required: bool = AUTH_REQUIRED):
+        self.app = app
+        self.required = required
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        authentication = NOT_AUTHENTICATED
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authentication = authenticate_token(bearer_token(value.decode("latin-1")))
+                break
+        scope["auth"] = authentication
+
+        if self.required and authentication.error is not None and not is_public(scope["method"], scope["path"]):
+            response = JSONResponse(
+                status_code=401,
+                content={"detail": authentication.error},
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..utils.database import Base
@@ -49,6 +49,11 @@ from ..utils.database import Base
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # History pages seek on (timestamp, id) within a room or a conversation
+        Index("ix_chat_messages_room_timestamp", "room_id", "timestamp", "id"),
+        Index("ix_chat_messages_pair_timestamp", "sender_id", "receiver_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     room_id = Column(Integer, nullable=False)
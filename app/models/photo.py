@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, Integer, String, func
+from ..utils.database import Base
+
+class PhotoBlob(Base):
+    """
+    A stored photo, keyed by the SHA-256 of its content.
+
+    ``refcount`` counts the users whose photo it is; the file is deleted
+    when it drops to zero. While that happens the row is held at -1 so a
+    concurrent upload of the same image waits instead of reusing files
+    that are about to disappear. ``released_at`` says since when, so a
+    release that never finished can be told apart and reclaimed.
+    """
+    __tablename__ = "photo_blobs"
+
+    digest = Column(String(64), primary_key=True)
+    extension = Column(String(8), nullable=False)
+    size = Column(Integer, nullable=False)
+    refcount = Column(Integer, nullable=False, default=0)
+    # Comma-separated sizes of the WebP variants that exist, e.g. "64,256"
+    variants = Column(String, nullable=True)
+    released_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
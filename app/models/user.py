@@ -5,12 +5,20 @@ from sqlalchemy.orm import relationship
 
 class User(Base):
     __tablename__ = "users"
+    # Server-generated columns come back with the INSERT/UPDATE (RETURNING),
+    # so writes don't need a refresh() round trip
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    photo_url = Column(String, nullable=True)
+    # PhotoBlob holding the current photo
+    photo_digest = Column(String(64), nullable=True, index=True)
+    # Bumped to revoke every token issued before (tokens carry it as "ver")
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now()) 
 
@@ -1,48 +1,90 @@
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from ..utils.database import get_db
-from ..models.chat import ChatMessage
-from ..schemas.chat import ChatRoomCreate, ChatRoomResponse, MessageResponse, MessageCreate
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..utils.database import get_read_db
+from ..schemas.chat import ChatRoomCreate, ChatRoomResponse, ChatMessageResponse, MessageCreate, MessagePage
+from ..services.chat_service import ChatService
+from ..utils.fast_json import FAST_JSON_RESPONSES, FastJSONResponse, dumps, rows_as_dicts, rows_to_json
+from ..utils.query_budget import query_budget
 
 router = APIRouter()
 
-@router.get("/messages/{user_id}", response_model=List[MessageResponse])
+@router.get("/messages/{user_id}", response_model=List[ChatMessageResponse], dependencies=[query_budget(1)])
 async def get_messages(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all messages between the current user and another user.
     """
     try:
-        # Get all messages where either user is the sender or receiver
-        messages = db.query(ChatMessage).filter(
-            (
-                (ChatMessage.sender_id == user_id) & 
-                (ChatMessage.receiver_id == user_id)
-            ) | (
-                (ChatMessage.sender_id == user_id) & 
-                (ChatMessage.receiver_id == user_id)
-            )
-        ).order_by(ChatMessage.timestamp.asc()).all()
-
-        # Format messages for response
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                "id": msg.id,
-                "content": msg.content,
-                "sender_id": msg.sender_id,
-                "receiver_id": msg.receiver_id,
-                "timestamp": msg.timestamp.isoformat(),
-                "is_read": msg.is_read
-            })
-
-        return formatted_messages
+        if FAST_JSON_RESPONSES:
+            rows = await ChatService.get_messages_between(db, user_id, user_id, as_rows=True)
+            return FastJSONResponse(rows_to_json(rows))
+        return await ChatService.get_messages_between(db, user_id, user_id)
 
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error fetching messages: {str(e)}"
-        ) 
+        )
+
+def page_response(page: dict) -> FastJSONResponse:
+    return FastJSONResponse(dumps({**page, "items": rows_as_dicts(page["items"])}))
+
+def check_cursors(before: Optional[str], after: Optional[str]):
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either 'before' or 'after', not both"
+        )
+
+@router.get("/rooms/{room_id}/messages", response_model=MessagePage, dependencies=[query_budget(1)])
+async def get_room_history(
+    room_id: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Page through a room's messages, oldest first within a page.
+
+    With no cursor the latest ``limit`` messages are returned. Pass
+    ``next_before`` as ``before`` to load older messages, or ``next_after``
+    as ``after`` to fetch messages that arrived since.
+    """
+    check_cursors(before, after)
+    try:
+        if FAST_JSON_RESPONSES:
+            return page_response(await ChatService.get_room_history(
+                db, room_id, before=before, after=after, limit=limit, as_rows=True
+            ))
+        return await ChatService.get_room_history(db, room_id, before=before, after=after, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/messages/{user_id}/history", response_model=MessagePage, dependencies=[query_budget(2)])
+async def get_conversation_history(
+    user_id: int,
+    peer_id: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Page through the direct messages between two users, with the same
+    cursors as the room history.
+    """
+    check_cursors(before, after)
+    try:
+        if FAST_JSON_RESPONSES:
+            return page_response(await ChatService.get_conversation_history(
+                db, user_id, peer_id, before=before, after=after, limit=limit, as_rows=True
+            ))
+        return await ChatService.get_conversation_history(
+            db, user_id, peer_id, before=before, after=after, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
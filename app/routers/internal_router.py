@@ -0,0 +1,210 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse, Response
+from typing import Optional
+from anyio import to_thread
+from ..services.user_cache import user_cache
+from ..utils.database import async_engine, engine, replica_engines, replicas
+from ..utils.db_pool import pool_stats
+from ..utils.loop_monitor import loop_monitor
+from ..utils.metrics import metrics
+from ..utils.request_profiler import request_profiler
+from ..utils.session_tracking import session_tracker
+from ..utils.token_cache import claims_cache
+from ..utils.token_denylist import token_denylist
+from ..websocket.chat_server import manager, presence, sio, typing_tracker
+from ..websocket.message_writer import message_writer
+import hmac
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Internal endpoints require a matching X-Internal-Token header; unset disables them
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+
+def require_internal_access(x_internal_token: Optional[str] = Header(None)):
+    if (
+        not INTERNAL_API_TOKEN
+        or x_internal_token is None
+        or not hmac.compare_digest(x_internal_token.encode(), INTERNAL_API_TOKEN.encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Internal endpoint"
+        )
+
+router = APIRouter(prefix="/internal", dependencies=[Depends(require_internal_access)])
+
+@router.get("/auth/claims-cache")
+async def get_claims_cache_stats():
+    """
+    Hit/miss counters for the verified JWT claims cache.
+    """
+    return claims_cache.stats()
+
+@router.get("/auth/user-cache")
+async def get_user_cache_stats():
+    """
+    Hit/miss counters for the principal (user snapshot) cache.
+    """
+    return user_cache.stats()
+
+@router.get("/auth/token-denylist")
+async def get_token_denylist_stats():
+    """
+    Users with revoked tokens still remembered, and how many tokens were rejected.
+    """
+    return token_denylist.stats()
+
+@router.get("/db/pool")
+async def get_pool_stats():
+    """
+    Live connection pool stats, plus the threadpool limit that sync
+    endpoints share, so the two can be sized against each other.
+    """
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        "engines": pool_stats({
+            "sync": engine,
+            "async": async_engine.sync_engine,
+            **{name: replica.sync_engine for name, replica in replica_engines.items()},
+        }),
+        "threadpool": {
+            "total_tokens": limiter.total_tokens,
+            "borrowed_tokens": limiter.borrowed_tokens,
+        },
+    }
+
+@router.get("/db/replicas")
+async def get_replica_stats():
+    """
+    Health and read counts per read replica, plus reads kept on the
+    primary by stickiness or because no replica was healthy.
+    """
+    return replicas.stats()
+
+@router.get("/db/sessions")
+async def get_session_stats():
+    """
+    Session lifetime counters: leaked, outlived their scope or held too long.
+    """
+    return session_tracker.stats()
+
+@router.get("/loop/lag")
+async def get_loop_lag_stats():
+    """
+    Event loop lag samples, stalls over the threshold and the worst lag seen.
+    """
+    return loop_monitor.stats()
+
+@router.get("/loop/stalls")
+async def get_loop_stalls():
+    """
+    Recent event loop stalls with the stack of the code that was blocking.
+    """
+    return list(loop_monitor.stalls)
+
+@router.get("/profiles")
+async def get_profiles():
+    """
+    Profiler settings and the slowest profiled requests kept.
+    """
+    return {**request_profiler.stats(), "profiles": request_profiler.slowest()}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: int, format: str = "text", sort: str = "cumulative"):
+    """
+    One request profile: a ``pstats`` text report sorted by ``sort``, or
+    with ``format=pstats`` the raw dump for snakeviz or flameprof.
+    """
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    if format == "pstats":
+        return Response(
+            profile.dump(),
+            media_type="application/octet-stream",
+            headers={"content-disposition": f'attachment; filename="request-{profile_id}.pstats"'},
+        )
+    try:
+        return PlainTextResponse(profile.report(sort))
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown sort key '{sort}'"
+        )
+
+@router.get("/ws/message-writer")
+async def get_message_writer_stats():
+    """
+    Queue depth and batch counters of the chat message writer.
+    """
+    return message_writer.stats()
+
+@router.get("/ws/connections")
+async def get_connection_stats():
+    """
+    Socket.IO connections, users and rooms held by this worker.
+    """
+    return manager.registry.stats()
+
+@router.get("/ws/presence")
+async def get_presence_stats():
+    """
+    Presence changes seen, deltas sent and remote workers mirrored.
+    """
+    return presence.stats()
+
+@router.get("/ws/typing")
+async def get_typing_stats():
+    """
+    Typing events received, suppressed as repeats, and updates sent.
+    """
+    return typing_tracker.stats()
+
+@router.get("/ws/outbound")
+async def get_outbound_stats(sid: Optional[str] = None, limit: int = 20):
+    """
+    Outbound queue depth per Socket.IO connection: one ``sid``, or the
+    ``limit`` deepest queues with drop and disconnect totals.
+    """
+    if sid is None:
+        return sio.outbound_stats(limit)
+    stats = sio.connection_stats(sid)
+    if stats is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Connection not found"
+        )
+    return stats
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Request, SQL and Socket.IO metrics in Prometheus text format, plus
+    values read from the stats above at scrape time.
+    """
+    connections = manager.registry.stats()
+    outbound = sio.outbound_stats(0)
+    writer = message_writer.stats()
+    extra = {
+        "socketio_connections": ("gauge", "Socket.IO connections on this worker", connections["connections"]),
+        "socketio_users": ("gauge", "Users connected to this worker", connections["users"]),
+        "socketio_rooms": ("gauge", "Rooms with members on this worker", connections["rooms"]),
+        "socketio_outbound_queued_packets": ("gauge", "Packets waiting in outbound queues", outbound["queued_packets"]),
+        "socketio_outbound_dropped_total": ("counter", "Packets dropped under backpressure", outbound["dropped"]),
+        "socketio_slow_disconnects_total": ("counter", "Connections dropped for not keeping up", outbound["slow_disconnects"]),
+        "message_writer_queued": ("gauge", "Chat messages waiting to be written", writer["queued"]),
+        "message_writer_written_total": ("counter", "Chat messages written", writer["written"]),
+        "message_writer_failed_total": ("counter", "Chat messages that failed to write", writer["failed"]),
+        "db_sessions_open": ("gauge", "Open DB sessions", session_tracker.stats()["open"]),
+    }
+    for name, stats in pool_stats({"sync": engine, "async": async_engine.sync_engine}).items():
+        if "checked_out" in stats:
+            extra[f"db_pool_{name}_checked_out"] = (
+                "gauge", f"Connections checked out of the {name} pool", stats["checked_out"]
+            )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
@@ -34,6 +34,24 @@ class MessageResponse(MessageBase):
     class Config:
         from_attributes = True
 
+class ChatMessageResponse(MessageBase):
+    id: int
+    room_id: int
+    sender_id: int
+    receiver_id: int
+    is_read: bool
+    timestamp: datetime
+
+    class Config:
+        from_attributes = True
+
+class MessagePage(BaseModel):
+    items: List[ChatMessageResponse]
+    # Pass back as ?before= for older messages or ?after= for newer ones
+    next_before: Optional[str] = None
+    next_after: Optional[str] = None
+    has_more: bool = False
+
 class ParticipantBase(BaseModel):
     user_id: int
     room_id: int
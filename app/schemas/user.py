@@ -21,6 +21,7 @@ class UserUpdate(BaseModel):
 class User(UserBase):
     id: int
     is_active: bool
+    photo_url: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
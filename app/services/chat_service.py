@@ -0,0 +1,135 @@
+import heapq
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import and_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.chat import ChatMessage
+from ..utils.pagination import decode_cursor, encode_cursor
+
+# Columns of ChatMessageResponse, for queries that skip the ORM
+# In the field order of ChatMessageResponse, so fast-path bodies match
+MESSAGE_COLUMNS = (
+    ChatMessage.content,
+    ChatMessage.message_type,
+    ChatMessage.id,
+    ChatMessage.room_id,
+    ChatMessage.sender_id,
+    ChatMessage.receiver_id,
+    ChatMessage.is_read,
+    ChatMessage.timestamp,
+)
+
+def message_cursor(message: ChatMessage) -> str:
+    return encode_cursor({"ts": message.timestamp.isoformat(), "id": message.id})
+
+def parse_message_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    position = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(position["ts"]), int(position["id"])
+    except (KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+class ChatService:
+    @staticmethod
+    def _select(as_rows: bool):
+        return select(*MESSAGE_COLUMNS) if as_rows else select(ChatMessage)
+
+    @staticmethod
+    async def _fetch(db: AsyncSession, query, as_rows: bool) -> list:
+        result = await db.execute(query)
+        return list(result.all() if as_rows else result.scalars().all())
+
+    @staticmethod
+    def _seek(query, before: Optional[str], after: Optional[str], limit: int):
+        """
+        Apply a (timestamp, id) keyset window to a message query.
+
+        Without ``after`` rows come newest first, so the first page is the
+        latest messages. One extra row is fetched to tell whether more exist.
+        """
+        position = tuple_(ChatMessage.timestamp, ChatMessage.id)
+        if after is not None:
+            query = query.where(position > tuple_(*parse_message_cursor(after)))
+            query = query.order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+        else:
+            if before is not None:
+                query = query.where(position < tuple_(*parse_message_cursor(before)))
+            query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+        return query.limit(limit + 1)
+
+    @staticmethod
+    async def get_messages_between(db: AsyncSession, user_id: int, peer_id: int, as_rows: bool = False) -> list:
+        """Every message between two users, oldest first."""
+        query = ChatService._select(as_rows).where(
+            ((ChatMessage.sender_id == user_id) & (ChatMessage.receiver_id == peer_id))
+            | ((ChatMessage.sender_id == peer_id) & (ChatMessage.receiver_id == user_id))
+        ).order_by(ChatMessage.timestamp.asc())
+        return await ChatService._fetch(db, query, as_rows)
+
+    @staticmethod
+    def _page(rows: list, after: Optional[str], limit: int) -> dict:
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if after is None:
+            rows.reverse()
+        # Items are always returned oldest first
+        return {
+            "items": rows,
+            "next_before": message_cursor(rows[0]) if rows else None,
+            "next_after": message_cursor(rows[-1]) if rows else after,
+            "has_more": has_more,
+        }
+
+    @staticmethod
+    async def get_room_history(
+        db: AsyncSession,
+        room_id: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 50,
+        as_rows: bool = False,
+    ) -> dict:
+        """
+        Args:
+            as_rows: Return plain column rows instead of ChatMessage objects
+        """
+        query = ChatService._seek(
+            ChatService._select(as_rows).where(ChatMessage.room_id == room_id), before, after, limit
+        )
+        return ChatService._page(await ChatService._fetch(db, query, as_rows), after, limit)
+
+    @staticmethod
+    async def get_conversation_history(
+        db: AsyncSession,
+        user_id: int,
+        peer_id: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 50,
+        as_rows: bool = False,
+    ) -> dict:
+        # One index range scan per direction, merged here, instead of an OR
+        # that the planner may not serve from the (sender, receiver) index
+        directions = []
+        for sender_id, receiver_id in ((user_id, peer_id), (peer_id, user_id)):
+            query = ChatService._seek(
+                ChatService._select(as_rows).where(and_(
+                    ChatMessage.sender_id == sender_id,
+                    ChatMessage.receiver_id == receiver_id,
+                )),
+                before, after, limit,
+            )
+            directions.append(await ChatService._fetch(db, query, as_rows))
+            if user_id == peer_id:
+                break
+
+        rows = list(heapq.merge(
+            *directions,
+            key=lambda message: (message.timestamp, message.id),
+            reverse=after is None,
+        ))
+        return ChatService._page(rows, after, limit)
@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from anyio import to_thread
+from dotenv import load_dotenv
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.photo import PhotoBlob
+from ..models.user import User
+from ..utils.database import AsyncSessionLocal
+from ..utils.file_upload import (
+    StagedFile,
+    discard_staged_file,
+    remove_stored_files,
+    store_staged_file,
+    stored_name,
+    upload_path,
+    upload_url,
+    variant_name,
+)
+from ..utils.thumbnails import thumbnail_pool
+from .user_cache import UserSnapshot, user_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long an upload waits for a concurrent delete of the same image
+PHOTO_RELEASE_WAIT = float(os.getenv("PHOTO_RELEASE_WAIT", "5"))
+# A delete still unfinished after this many seconds died half way and is reclaimed
+PHOTO_RELEASE_STALE = float(os.getenv("PHOTO_RELEASE_STALE", "60"))
+
+class PhotoBusy(Exception):
+    pass
+
+# digest -> task rendering its variants
+_variant_tasks: Dict[str, asyncio.Task] = {}
+
+def photo_url(digest: str, extension: str, variants: Optional[str]) -> str:
+    """URL of the largest variant of a photo, or of the original if it has none yet."""
+    if variants:
+        return upload_url(variant_name(digest, max(int(size) for size in variants.split(","))))
+    return upload_url(stored_name(digest, extension))
+
+class PhotoService:
+    @staticmethod
+    async def acquire(db: AsyncSession, staged: StagedFile) -> Optional[str]:
+        """
+        Take a reference on the stored photo with ``staged``'s content.
+
+        Returns:
+            Optional[str]: The photo's existing variants, None if it has none
+
+        Raises:
+            PhotoBusy: If the same image was still being deleted after
+                ``PHOTO_RELEASE_WAIT`` seconds
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PHOTO_RELEASE_WAIT
+        while True:
+            result = await db.execute(
+                update(PhotoBlob)
+                .where(PhotoBlob.digest == staged.digest, PhotoBlob.refcount >= 0)
+                .values(refcount=PhotoBlob.refcount + 1)
+            )
+            if result.rowcount:
+                await db.commit()
+                break
+            refcount = await db.scalar(select(PhotoBlob.refcount).where(PhotoBlob.digest == staged.digest))
+            if refcount is not None:
+                # The last reference is being released; wait for its files to go
+                await db.rollback()
+                if await PhotoService._reclaim_stale(db, staged.digest):
+                    continue
+                if loop.time() >= deadline:
+                    raise PhotoBusy("The same photo is being deleted, try again shortly")
+                await asyncio.sleep(0.05)
+                continue
+            db.add(PhotoBlob(digest=staged.digest, extension=staged.extension, size=staged.size, refcount=1))
+            try:
+                await db.commit()
+                break
+            except IntegrityError:
+                await db.rollback()
+        return await db.scalar(select(PhotoBlob.variants).where(PhotoBlob.digest == staged.digest))
+
+    @staticmethod
+    async def _reclaim_stale(db: AsyncSession, digest: str) -> bool:
+        """Drop a -1 row whose release never finished; its files may be half gone."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=PHOTO_RELEASE_STALE)
+        result = await db.execute(
+            delete(PhotoBlob).where(
+                PhotoBlob.digest == digest,
+                PhotoBlob.refcount == -1,
+                or_(PhotoBlob.released_at.is_(None), PhotoBlob.released_at < cutoff),
+            )
+        )
+        await db.commit()
+        if result.rowcount:
+            logger.warning("Reclaimed photo %s from a release that never finished", digest)
+        return bool(result.rowcount)
+
+    @staticmethod
+    async def release(db: AsyncSession, digest: str):
+        """Drop a reference on a stored photo, deleting its files with the last one."""
+        await db.execute(
+            update(PhotoBlob)
+            .where(PhotoBlob.digest == digest, PhotoBlob.refcount > 0)
+            .values(refcount=PhotoBlob.refcount - 1)
+        )
+        claimed = await db.execute(
+            update(PhotoBlob)
+            .where(PhotoBlob.digest == digest, PhotoBlob.refcount == 0)
+            .values(refcount=-1, released_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+        if not claimed.rowcount:
+            return
+
+        try:
+            task = _variant_tasks.get(digest)
+            if task is not None:
+                await asyncio.wait([task])
+            extension = await db.scalar(select(PhotoBlob.extension).where(PhotoBlob.digest == digest))
+            await to_thread.run_sync(remove_stored_files, digest, extension, thumbnail_pool.sizes)
+        except BaseException:
+            await db.rollback()
+            raise
+        finally:
+            # Never leave the row at -1: uploads of the same image wait on it
+            await db.execute(delete(PhotoBlob).where(PhotoBlob.digest == digest, PhotoBlob.refcount == -1))
+            await db.commit()
+
+    @staticmethod
+    async def set_user_photo(db: AsyncSession, user_id: int, staged: StagedFile) -> Optional[User]:
+        """
+        Make a staged upload the user's photo.
+
+        Identical images are stored once. The user's previous photo is
+        released, and variants are rendered in the background if this
+        image has none yet; ``photo_url`` is switched to the largest one
+        when they are ready.
+        """
+        result = await db.execute(select(User).where(User.id == user_id))
+        db_user = result.scalars().first()
+        if db_user is None:
+            await to_thread.run_sync(discard_staged_file, staged)
+            return None
+
+        try:
+            variants = await PhotoService.acquire(db, staged)
+        except BaseException:
+            await to_thread.run_sync(discard_staged_file, staged)
+            raise
+        try:
+            await to_thread.run_sync(store_staged_file, staged)
+            previous = db_user.photo_digest
+            db_user.photo_digest = staged.digest
+            db_user.photo_url = photo_url(staged.digest, staged.extension, variants)
+            await db.commit()
+        except BaseException:
+            await to_thread.run_sync(discard_staged_file, staged)
+            await db.rollback()
+            await PhotoService.release(db, staged.digest)
+            raise
+
+        user_cache.invalidate(user_id)
+        user_cache.put(UserSnapshot.from_orm(db_user))
+        if previous is not None:
+            await PhotoService.release(db, previous)
+        if variants is None:
+            PhotoService.schedule_variants(staged.digest, staged.extension)
+        return db_user
+
+    @staticmethod
+    def schedule_variants(digest: str, extension: str):
+        if not thumbnail_pool.available or digest in _variant_tasks:
+            return
+        # Fresh context, so the render isn't counted against the upload request
+        task = contextvars.Context().run(asyncio.create_task, PhotoService._render_variants(digest, extension))
+        _variant_tasks[digest] = task
+        task.add_done_callback(lambda _: _variant_tasks.pop(digest, None))
+
+    @staticmethod
+    async def _render_variants(digest: str, extension: str):
+        sizes = thumbnail_pool.sizes
+        async with AsyncSessionLocal() as db:
+            # Rendered since the uploader looked
+            if await db.scalar(select(PhotoBlob.variants).where(PhotoBlob.digest == digest)):
+                return
+        try:
+            await thumbnail_pool.render(
+                str(upload_path(stored_name(digest, extension))),
+                [(size, str(upload_path(variant_name(digest, size)))) for size in sizes],
+            )
+        except Exception:
+            logger.exception("Rendering variants of %s failed", digest)
+            return
+
+        variants = ",".join(str(size) for size in sizes)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(PhotoBlob)
+                .where(PhotoBlob.digest == digest, PhotoBlob.refcount >= 0)
+                .values(variants=variants)
+            )
+            user_ids = (await db.execute(select(User.id).where(User.photo_digest == digest))).scalars().all()
+            await db.execute(
+                update(User)
+                .where(User.photo_digest == digest)
+                .values(photo_url=photo_url(digest, extension, variants))
+            )
+            await db.commit()
+        for user_id in user_ids:
+            user_cache.invalidate(user_id)
+
+    @staticmethod
+    async def wait_for_variants():
+        """Wait for variants being rendered; used at shutdown."""
+        if _variant_tasks:
+            await asyncio.wait(list(_variant_tasks.values()))
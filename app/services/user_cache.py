@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+from dotenv import load_dotenv
+from ..models.user import User
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Immutable copy of a user row, safe to share between requests.
+
+    The password hash is left out on purpose: logins read it from the
+    database, so a stale snapshot can never accept an old password.
+    """
+    id: int
+    email: str
+    username: str
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    photo_url: Optional[str] = None
+    token_version: int = 0
+
+    @classmethod
+    def from_orm(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_active=user.is_active,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            photo_url=user.photo_url,
+            token_version=user.token_version or 0,
+        )
+
+class InvalidationChannel:
+    """
+    Fans user invalidations out to the other workers.
+
+    This default implementation is process-local: it only notifies its own
+    subscribers. Multi-worker deployments plug in a channel backed by a
+    shared broker with ``user_cache.set_channel()``. ``publish`` must not
+    block the caller.
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[int], None]] = []
+
+    def subscribe(self, callback: Callable[[int], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, user_id: int):
+        pass
+
+    def deliver(self, user_id: int):
+        """Called by channel implementations when a remote invalidation arrives."""
+        for callback in self._subscribers:
+            callback(user_id)
+
+class UserCache:
+    """
+    In-process cache of user snapshots keyed by id and by username.
+
+    Entries expire after ``ttl`` seconds as a safety net. Correctness
+    comes from ``invalidate``, which ``UserService`` calls on every write.
+
+    A read that races a write could put back what the write just
+    invalidated, so callers filling the cache from the database read
+    ``generation`` before their query and pass it to ``put``.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL,
+                 channel: Optional[InvalidationChannel] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._by_id: "OrderedDict[int, tuple]" = OrderedDict()
+        self._by_username: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        # Bumped by every invalidation
+        self.generation = 0
+        self.channel = None
+        self.set_channel(channel or InvalidationChannel())
+
+    def set_channel(self, channel: InvalidationChannel):
+        self.channel = channel
+        channel.subscribe(self._drop)
+
+    def _lookup(self, user_id: Optional[int]) -> Optional[UserSnapshot]:
+        entry = self._by_id.get(user_id) if user_id is not None else None
+        if entry is None:
+            self.misses += 1
+            return None
+        snapshot, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(user_id)
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(user_id)
+        self.hits += 1
+        return snapshot
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        with self._lock:
+            return self._lookup(user_id)
+
+    def get_by_username(self, username: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            return self._lookup(self._by_username.get(username))
+
+    def put(self, snapshot: UserSnapshot, generation: Optional[int] = None):
+        """
+        Cache ``snapshot``, unless ``generation`` is given and a user was
+        invalidated since it was read: the snapshot may predate that write.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_puts += 1
+                return
+            self._remove(snapshot.id)
+            self._by_id[snapshot.id] = (snapshot, time.monotonic() + self.ttl)
+            self._by_username[snapshot.username] = snapshot.id
+            while len(self._by_id) > self.max_size:
+                self._remove(next(iter(self._by_id)))
+
+    def _remove(self, user_id: int):
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None and self._by_username.get(entry[0].username) == user_id:
+            del self._by_username[entry[0].username]
+
+    def _drop(self, user_id: int):
+        with self._lock:
+            self._remove(user_id)
+            self.invalidations += 1
+            self.generation += 1
+
+    def invalidate(self, user_id: int):
+        """Drop a user locally and tell the other workers to do the same."""
+        self._drop(user_id)
+        self.channel.publish(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_username.clear()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._by_id),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
+
+user_cache = UserCache()
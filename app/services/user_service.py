@@ -1,61 +1,165 @@
-from sqlalchemy.orm import Session
+from typing import AsyncIterator, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.user import User
 from ..schemas.user import UserCreate, UserUpdate
-from ..utils.auth import get_password_hash
+from ..utils.password_hashing import password_hasher
+from ..utils.token_denylist import token_denylist
+from .photo_service import PhotoService
+from .user_cache import UserSnapshot, user_cache
+
+# Columns of the public User schema, for queries that skip the ORM
+# In the field order of schemas.user.User, so fast-path bodies match
+USER_COLUMNS = (
+    User.email,
+    User.username,
+    User.id,
+    User.is_active,
+    User.photo_url,
+    User.created_at,
+    User.updated_at,
+)
 
 class UserService:
     @staticmethod
-    def get_user(db: Session, user_id: int) -> User:
-        return db.query(User).filter(User.id == user_id).first()
+    async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
+        result = await db.execute(select(User).where(User.id == user_id))
+        return result.scalars().first()
 
     @staticmethod
-    def get_user_by_email(db: Session, email: str) -> User:
-        return db.query(User).filter(User.email == email).first()
-    
+    async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.email == email))
+        return result.scalars().first()
+
     @staticmethod
-    def get_user_by_name(db: Session, username: str) -> User:
-        return db.query(User).filter(User.username == username).first()
+    async def get_user_by_name(db: AsyncSession, username: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
 
     @staticmethod
-    def get_users(db: Session, skip: int = 0, limit: int = 100) -> list[User]:
-        return db.query(User).offset(skip).limit(limit).all()
-    
+    async def get_principal(db: AsyncSession, user_id: int) -> Optional[UserSnapshot]:
+        """Cached snapshot of a user; only queries the database on a miss."""
+        snapshot = user_cache.get(user_id)
+        if snapshot is None:
+            generation = user_cache.generation
+            db_user = await UserService.get_user(db, user_id)
+            if db_user is None:
+                return None
+            snapshot = UserSnapshot.from_orm(db_user)
+            user_cache.put(snapshot, generation)
+        return snapshot
+
+    @staticmethod
+    async def get_principal_by_name(db: AsyncSession, username: str) -> Optional[UserSnapshot]:
+        """Cached snapshot of a user by username; only queries the database on a miss."""
+        snapshot = user_cache.get_by_username(username)
+        if snapshot is None:
+            generation = user_cache.generation
+            db_user = await UserService.get_user_by_name(db, username)
+            if db_user is None:
+                return None
+            snapshot = UserSnapshot.from_orm(db_user)
+            user_cache.put(snapshot, generation)
+        return snapshot
+
     @staticmethod
-    def create_user(db: Session, user: UserCreate) -> User:
-        hashed_password = get_password_hash(user.password)
+    async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, as_rows: bool = False) -> list:
+        query = select(*USER_COLUMNS) if as_rows else select(User)
+        # Ordered like the keyset pages, so X-Next-Cursor continues where this page ends
+        result = await db.execute(query.order_by(User.id).offset(skip).limit(limit))
+        return list(result.all() if as_rows else result.scalars().all())
+
+    @staticmethod
+    async def get_users_after(db: AsyncSession, after_id: int = 0, limit: int = 100, as_rows: bool = False) -> list:
+        """
+        Keyset page: the first ``limit`` users with an id greater than ``after_id``.
+
+        Args:
+            as_rows: Return plain column rows instead of User objects
+        """
+        query = select(*USER_COLUMNS) if as_rows else select(User)
+        result = await db.execute(
+            query.where(User.id > after_id).order_by(User.id).limit(limit)
+        )
+        return list(result.all() if as_rows else result.scalars().all())
+
+    @staticmethod
+    async def stream_users(db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Sequence]:
+        """
+        Yield batches of user rows from a server-side cursor.
+
+        Only plain columns are selected, so memory stays at one batch no
+        matter how many users there are.
+        """
+        result = await db.stream(
+            select(*USER_COLUMNS)
+            .order_by(User.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user: UserCreate) -> Optional[User]:
+        """
+        Insert a user.
+
+        Returns:
+            The new user, or None if the email or username is taken
+        """
+        hashed_password = await password_hasher.hash(user.password)
         db_user = User(
             email=user.email,
             username=user.username,
-            hashed_password=hashed_password
+            hashed_password=hashed_password,
+            # Known to be empty; otherwise it is fetched after the INSERT
+            updated_at=None,
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
         return db_user
 
     @staticmethod
-    def update_user(db: Session, user_id: int, user_update: UserUpdate) -> User:
-        db_user = UserService.get_user(db, user_id)
+    async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate) -> Optional[User]:
+        db_user = await UserService.get_user(db, user_id)
         if not db_user:
             return None
 
         update_data = user_update.dict(exclude_unset=True)
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await password_hasher.hash(update_data.pop("password"))
 
         for field, value in update_data.items():
             setattr(db_user, field, value)
+        # A new password ends every session
+        revoke = "hashed_password" in update_data
+        if revoke:
+            db_user.token_version = (db_user.token_version or 0) + 1
 
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        user_cache.invalidate(user_id)
+        user_cache.put(UserSnapshot.from_orm(db_user))
+        if revoke:
+            token_denylist.revoke(user_id, db_user.token_version)
         return db_user
 
     @staticmethod
-    def delete_user(db: Session, user_id: int) -> bool:
-        db_user = UserService.get_user(db, user_id)
+    async def delete_user(db: AsyncSession, user_id: int) -> bool:
+        db_user = await UserService.get_user(db, user_id)
         if not db_user:
             return False
 
-        db.delete(db_user)
-        db.commit()
-        return True 
\ No newline at end of file
+        photo_digest = db_user.photo_digest
+        token_version = db_user.token_version or 0
+        await db.delete(db_user)
+        await db.commit()
+        user_cache.invalidate(user_id)
+        token_denylist.revoke(user_id, token_version + 1)
+        if photo_digest is not None:
+            await PhotoService.release(db, photo_digest)
+        return True
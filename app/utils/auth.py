@@ -1,13 +1,14 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from ..models.user import User
-from ..schemas.user import TokenData
-from .database import get_db
+from jose import ExpiredSignatureError, JWTError, jwt
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..services.user_cache import UserSnapshot, user_cache
+from ..services.user_service import UserService
+from .database import get_async_db
+from .password_hashing import password_hasher
+from .token_cache import claims_cache
+from .token_denylist import token_denylist
 import os
 from dotenv import load_dotenv
 
@@ -18,14 +19,14 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def token_claims(user: UserSnapshot) -> dict:
+    """
+    Claims identifying ``user`` in an access token.
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    Besides the username, the token carries the user id and token version,
+    so the principal can be built without looking the user up.
+    """
+    return {"sub": user.username, "uid": user.id, "ver": user.token_version}
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -37,72 +38,123 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[UserSnapshot]:
+    # Always check against the primary: another worker's cache may still hold an old password
+    generation = user_cache.generation
+    db_user = await UserService.get_user_by_name(db, username)
+    if not db_user:
         raise HTTPException(status_code=401, detail="UserName doesn't match")
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(password, db_user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Password doesn't match")
+    if new_hash:
+        # Upgrade hashes made with an outdated scheme or cost factor
+        db_user.hashed_password = new_hash
+        await db.commit()
+        user_cache.invalidate(db_user.id)
+    user = UserSnapshot.from_orm(db_user)
+    user_cache.put(user, generation)
     return user
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+class Authentication:
+    """
+    Outcome of checking a request's bearer token, kept in ``scope["auth"]``.
+
+    Either ``claims`` holds the verified payload or ``error`` says why
+    there is none.
+    """
+    __slots__ = ("claims", "error")
+
+    def __init__(self, claims: Optional[dict] = None, error: Optional[str] = None):
+        self.claims = claims
+        self.error = error
+
+    @property
+    def username(self) -> Optional[str]:
+        return self.claims.get("sub") if self.claims else None
+
+    @property
+    def user_id(self) -> Optional[int]:
+        """The ``uid`` claim; None for tokens issued before it existed."""
+        return self.claims.get("uid") if self.claims else None
+
+    @property
+    def version(self) -> int:
+        return self.claims.get("ver", 0) if self.claims else 0
+
+NOT_AUTHENTICATED = Authentication(error="Not authenticated")
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """The token of an ``Authorization: Bearer <token>`` header value."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+def authenticate_token(token: Optional[str]) -> Authentication:
+    """Verify a bearer token; never raises."""
+    if token is None:
+        return NOT_AUTHENTICATED
     try:
-        # Decode the token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        
-        # Check if username exists in token
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Username not found in token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
-        # Create token data
-        token_data = TokenData(username=username)
-        
-        # Find user in database
-        user = db.query(User).filter(User.username == token_data.username).first()
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
-        return user
-        
-    except jwt.ExpiredSignatureError:
+        payload = verify_token(token)
+    except ExpiredSignatureError:
+        return Authentication(error="Token has expired")
+    except JWTError:
+        return Authentication(error="Invalid token")
+    if payload.get("sub") is None:
+        return Authentication(error="Username not found in token")
+    authentication = Authentication(claims=payload)
+    if authentication.user_id is not None and token_denylist.is_revoked(authentication.user_id, authentication.version):
+        return Authentication(error="Token has been revoked")
+    return authentication
+
+def request_authentication(request: Request) -> Authentication:
+    """
+    The request's token check: the one ``AuthMiddleware`` already made, or
+    a fresh one when the middleware isn't installed.
+    """
+    authentication = request.scope.get("auth")
+    if isinstance(authentication, Authentication):
+        return authentication
+    return authenticate_token(bearer_token(request.headers.get("authorization")))
+
+async def get_current_user(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
+    authentication = request_authentication(request)
+    if authentication.error is not None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
+            detail=authentication.error,
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except jwt.JWTError:
+
+    # Find user in the principal cache, or the database on a miss
+    if authentication.user_id is not None:
+        user = await UserService.get_principal(db, authentication.user_id)
+    else:
+        user = await UserService.get_principal_by_name(db, authentication.username)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token",
+            detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except Exception as e:
+    # Catches revocations the denylist no longer (or never) held, e.g. after a restart
+    if authentication.user_id is not None and user.token_version > authentication.version:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Authentication error: {str(e)}",
+            detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserSnapshot = Depends(get_current_user)
+) -> UserSnapshot:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
@@ -110,6 +162,9 @@ async def get_current_active_user(
 def verify_token(token: str) -> dict:
     """
     Verify and decode a JWT token.
+
+    Verified claims are cached until the token expires, so repeated calls
+    with the same token skip the signature check and JSON decode.
     
     Args:
         token: The JWT token to verify
@@ -120,6 +175,10 @@ def verify_token(token: str) -> dict:
     Raises:
         JWTError: If the token is invalid or expired
     """
+    payload = claims_cache.get(token)
+    if payload is not None:
+        return payload
+
     try:
         # Decode the token using the same SECRET_KEY and ALGORITHM
         payload = jwt.decode(
@@ -136,7 +195,10 @@ def verify_token(token: str) -> dict:
         if datetime.utcnow() > datetime.fromtimestamp(expire):
             raise JWTError("Token has expired")
             
+        claims_cache.put(token, payload)
         return payload
         
+    except ExpiredSignatureError as e:
+        raise ExpiredSignatureError(f"Invalid token: {str(e)}")
     except JWTError as e:
         raise JWTError(f"Invalid token: {str(e)}") 
\ No newline at end of file
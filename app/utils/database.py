@@ -1,7 +1,14 @@
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
+from .db_pool import engine_options, instrument_engine
+from .metrics import instrument_statements
+from .query_budget import instrument_queries
+from .replicas import ReplicaSet
+from .session_tracking import TrackedSession
 import os
 
 load_dotenv()
@@ -12,17 +19,80 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "sqlite:///./sql_app.db"
 )
 
-# Create engine with appropriate connect_args based on database type
-connect_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
+# Async drivers used when ASYNC_DATABASE_URL is not given explicitly
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
 
+def to_async_url(url: str) -> str:
+    """
+    Derive the async driver URL from a sync database URL.
+
+    Args:
+        url: A sync SQLAlchemy URL such as ``postgresql://...`` or ``sqlite:///...``
+
+    Returns:
+        str: The same URL using the asyncio driver for its dialect
+    """
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{dialect}'")
+    return f"{ASYNC_DRIVERS[dialect]}{sep}{rest}"
+
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    to_async_url(SQLALCHEMY_DATABASE_URL)
+)
+
+# Comma-separated read replicas for get_read_db(); unset reads from the primary
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+
+# Create engine with pool sizing and connect_args based on database type
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args=connect_args
+    **engine_options(SQLALCHEMY_DATABASE_URL)
+)
+instrument_engine("sync", engine)
+instrument_statements("sync", engine)
+instrument_queries(engine)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=TrackedSession)
+
+# Async engine for `async def` handlers, so queries never block the event loop
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL, is_async=True)
+)
+instrument_engine("async", async_engine.sync_engine)
+instrument_statements("async", async_engine.sync_engine)
+instrument_queries(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=TrackedSession,
+    autoflush=False,
+    expire_on_commit=False,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+replica_engines = {}
+for number, url in enumerate(DATABASE_REPLICA_URLS, 1):
+    replica_url = to_async_url(url)
+    replica_engine = create_async_engine(replica_url, **engine_options(replica_url, is_async=True))
+    name = f"replica{number}"
+    instrument_engine(name, replica_engine.sync_engine)
+    instrument_statements(name, replica_engine.sync_engine)
+    instrument_queries(replica_engine.sync_engine)
+    replica_engines[name] = replica_engine
+
+replicas = ReplicaSet(AsyncSessionLocal, replica_engines)
+replicas.track_writes(engine)
+replicas.track_writes(async_engine.sync_engine)
 
 Base = declarative_base()
 
@@ -32,4 +102,14 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Async dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Read-only dependency: a replica session unless the caller wrote recently
+async def get_read_db(request: Request):
+    async with replicas.session_for(request.scope) as db:
+        yield db
@@ -0,0 +1,192 @@
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Per-dialect defaults, overridable with the DB_POOL_* environment variables
+POOL_PROFILES = {
+    # SQLite allows a single writer, a small pool plus WAL is enough
+    "sqlite": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+    },
+    "postgresql": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+}
+
+ENV_OVERRIDES = {
+    "pool_size": ("DB_POOL_SIZE", int),
+    "max_overflow": ("DB_MAX_OVERFLOW", int),
+    "pool_timeout": ("DB_POOL_TIMEOUT", float),
+    "pool_recycle": ("DB_POOL_RECYCLE", int),
+    "pool_pre_ping": ("DB_POOL_PRE_PING", lambda value: value.lower() in ("1", "true", "yes")),
+}
+
+SQLITE_WAL = os.getenv("DB_SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+class PoolTelemetry:
+    """
+    Checkout counters and a wait-time histogram for one connection pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self, pool) -> dict:
+        observed = self.checkouts + self.timeouts
+        stats = {
+            "pool_class": type(pool).__name__,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": self.wait_total / observed * 1000 if observed else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+            # Cumulative counts per upper bound, Prometheus style
+            "wait_histogram": {
+                **{
+                    f"le_{bound}": sum(self.wait_buckets[:i + 1])
+                    for i, bound in enumerate(WAIT_BUCKETS)
+                },
+                "le_inf": observed,
+            },
+        }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        return stats
+
+class _TimedCheckoutMixin:
+    telemetry: Optional[PoolTelemetry] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            if self.telemetry is not None:
+                self.telemetry.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.telemetry is not None:
+            self.telemetry.observe_wait(time.perf_counter() - started)
+        return record
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the counters
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Build ``create_engine`` keyword arguments for a database URL.
+
+    Starts from the dialect's profile in ``POOL_PROFILES`` and applies any
+    ``DB_POOL_*`` environment overrides.
+
+    Args:
+        url: The SQLAlchemy database URL
+        is_async: Whether the options are for ``create_async_engine``
+
+    Returns:
+        dict: Keyword arguments for the engine factory
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options: dict = {"connect_args": {}}
+
+    if backend == "sqlite":
+        if not is_async:
+            options["connect_args"]["check_same_thread"] = False
+        if _is_sqlite_memory(parsed):
+            # Every connection would see its own empty database otherwise
+            options["poolclass"] = StaticPool
+            return options
+
+    profile = dict(POOL_PROFILES.get(backend, POOL_PROFILES["postgresql"]))
+    for option, (variable, convert) in ENV_OVERRIDES.items():
+        value = os.getenv(variable)
+        if value is not None:
+            profile[option] = convert(value)
+
+    options.update(profile)
+    options["poolclass"] = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def instrument_engine(name: str, engine: Engine) -> Engine:
+    """
+    Attach pool telemetry and dialect setup to an engine.
+
+    Pass ``async_engine.sync_engine`` for async engines.
+    """
+    if isinstance(engine.pool, _TimedCheckoutMixin):
+        engine.pool.telemetry = PoolTelemetry(name)
+    if engine.dialect.name == "sqlite" and not _is_sqlite_memory(engine.url):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+def pool_stats(engines: Dict[str, Engine]) -> dict:
+    stats = {}
+    for name, engine in engines.items():
+        telemetry = getattr(engine.pool, "telemetry", None)
+        if telemetry is None:
+            stats[name] = {"pool_class": type(engine.pool).__name__}
+        else:
+            stats[name] = telemetry.snapshot(engine.pool)
+    return stats
@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, List, Sequence
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Declared in requirements.txt; the stdlib encoder is a much slower fallback
+    orjson = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+if orjson is None:
+    logger.warning("orjson is not installed: JSON responses fall back to the much slower stdlib encoder")
+
+# Serialize large list responses straight from database rows
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+def _default(obj: Any):
+    if isinstance(obj, datetime):
+        # Same form as Pydantic: UTC as "Z"
+        text = obj.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Encode ``content`` as compact JSON with orjson (stdlib ``json`` if it is missing)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+def rows_as_dicts(rows: Sequence) -> List[dict]:
+    """Plain dicts of SQLAlchemy ``Row`` objects, keyed by column label."""
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+def rows_to_json(rows: Sequence) -> bytes:
+    """Encode rows as a JSON array of objects without building models."""
+    return dumps(rows_as_dicts(rows))
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with ``dumps``.
+
+    Content that is already encoded (``bytes``) is sent as is. Returning
+    it from an endpoint bypasses ``response_model`` validation, so it is
+    only for data that comes straight from trusted queries.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -1,12 +1,36 @@
+import hashlib
 import os
+import tempfile
+from dataclasses import dataclass
 from fastapi import UploadFile
-from datetime import datetime
-import shutil
 from pathlib import Path
+from typing import Iterable, Optional
+from anyio import to_thread
 
 UPLOAD_DIR = "uploads"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Leading bytes of each accepted image format -> extension it is stored under
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+SNIFF_SIZE = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+class FileTooLarge(ValueError):
+    pass
+
+@dataclass
+class StagedFile:
+    """A complete upload in a temporary file, not yet stored under its digest."""
+    path: str
+    digest: str
+    extension: str
+    size: int
 
 def get_upload_dir():
     upload_dir = Path(UPLOAD_DIR)
@@ -16,25 +40,123 @@ def get_upload_dir():
 def is_allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_upload_file(upload_file: UploadFile, user_id: int) -> str:
-    if not is_allowed_file(upload_file.filename):
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """
+    Identify an image from its first bytes.
+
+    Returns:
+        Optional[str]: The file extension for the image type, or None if it is not a PNG, JPEG or GIF
+    """
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def stored_name(digest: str, extension: str) -> str:
+    """Path of a stored file relative to the upload directory, sharded by digest prefix."""
+    return f"{digest[:2]}/{digest}.{extension}"
+
+def variant_name(digest: str, size: int) -> str:
+    return f"{digest[:2]}/{digest}_{size}.webp"
+
+def upload_path(name: str) -> Path:
+    return Path(UPLOAD_DIR) / name
+
+def upload_url(name: str) -> str:
+    return f"/uploads/{name}"
+
+def _open_temp_file(upload_dir: Path):
+    # Same file system as the final path so the rename is atomic
+    fd, temp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-", suffix=".part")
+    return os.fdopen(fd, "wb"), temp_path
+
+def _write_chunk(buffer, hasher, chunk: bytes):
+    buffer.write(chunk)
+    hasher.update(chunk)
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def _discard(buffer, temp_path: str):
+    buffer.close()
+    _remove(temp_path)
+
+async def stage_upload_file(upload_file: UploadFile) -> StagedFile:
+    """
+    Stream an uploaded image into a temporary file in the upload directory.
+
+    The upload is read in chunks, and written and hashed from a worker
+    thread, so the event loop never blocks on disk I/O. The size limit
+    applies to the bytes actually received and the image type comes from
+    the file's magic bytes rather than its name.
+
+    Args:
+        upload_file: The uploaded file
+
+    Returns:
+        StagedFile: The temporary file with its SHA-256 digest and image type
+
+    Raises:
+        FileTooLarge: If the upload exceeds MAX_FILE_SIZE
+        ValueError: If the file is not a PNG, JPEG or GIF image
+    """
+    if not is_allowed_file(upload_file.filename or ""):
         raise ValueError("File type not allowed")
-    
-    if upload_file.content_length and upload_file.content_length > MAX_FILE_SIZE:
-        raise ValueError("File too large")
-
-    # Create a unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_extension = upload_file.filename.rsplit(".", 1)[1].lower()
-    filename = f"user_{user_id}_{timestamp}.{file_extension}"
-    
-    # Ensure upload directory exists
-    upload_dir = get_upload_dir()
-    file_path = upload_dir / filename
-
-    # Save the file
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-
-    # Return the relative URL path
-    return f"/uploads/{filename}" 
\ No newline at end of file
+
+    if upload_file.size is not None and upload_file.size > MAX_FILE_SIZE:
+        raise FileTooLarge("File too large")
+
+    upload_dir = await to_thread.run_sync(get_upload_dir)
+    buffer, temp_path = await to_thread.run_sync(_open_temp_file, upload_dir)
+    try:
+        hasher = hashlib.sha256()
+        received = 0
+        head = b""
+        while True:
+            chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > MAX_FILE_SIZE:
+                raise FileTooLarge("File too large")
+            if len(head) < SNIFF_SIZE:
+                head += chunk[:SNIFF_SIZE - len(head)]
+            await to_thread.run_sync(_write_chunk, buffer, hasher, chunk)
+
+        file_extension = sniff_image_type(head)
+        if file_extension is None:
+            raise ValueError("File is not a PNG, JPEG or GIF image")
+        await to_thread.run_sync(buffer.close)
+    except BaseException:
+        await to_thread.run_sync(_discard, buffer, temp_path)
+        raise
+
+    return StagedFile(temp_path, hasher.hexdigest(), file_extension, received)
+
+def store_staged_file(staged: StagedFile) -> str:
+    """
+    Atomically move a staged file to its content-addressed path.
+
+    Identical content always lands on the same path, so replacing an
+    existing copy is harmless.
+
+    Returns:
+        str: The stored file's name relative to the upload directory
+    """
+    name = stored_name(staged.digest, staged.extension)
+    path = upload_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staged.path, path)
+    return name
+
+def discard_staged_file(staged: StagedFile):
+    _remove(staged.path)
+
+def remove_stored_files(digest: str, extension: str, sizes: Iterable[int]):
+    """Delete a stored file and its variants."""
+    _remove(upload_path(stored_name(digest, extension)))
+    for size in sizes:
+        _remove(upload_path(variant_name(digest, size)))
@@ -0,0 +1,137 @@
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import List, Optional
+from dotenv import load_dotenv
+from .metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Sample event loop lag and capture the stack of whatever blocks it. Off by
+# default: the watchdog thread reads every thread's frames while a stall lasts
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "false").lower() == "true"
+# How often the loop is sampled, in seconds
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+# Lag above this many seconds is a stall: its stack is captured and logged
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.1"))
+# Recent stalls kept for /internal/loop/stalls
+LOOP_LAG_KEEP = int(os.getenv("LOOP_LAG_KEEP", "50"))
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer", buckets=LAG_BUCKETS)
+loop_stalls = metrics.counter(
+    "event_loop_stalls_total", "Times the event loop was blocked longer than LOOP_LAG_THRESHOLD")
+
+class LoopMonitor:
+    """
+    Measures event loop lag and catches the code that causes stalls.
+
+    A heartbeat task sleeps for ``interval`` and records how late it
+    woke up. A watchdog thread checks the heartbeat; once it is more than
+    ``threshold`` seconds overdue, the loop is still blocked, so the
+    watchdog snapshots the loop thread's stack at that moment. When the
+    heartbeat finally runs, the stall is recorded with its full duration
+    and that stack.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD,
+                 keep: int = LOOP_LAG_KEEP):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = deque(maxlen=keep)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread: Optional[int] = None
+        # Heartbeat number and when it is due; written by the loop, read by the watchdog
+        self._beat = (0, 0.0)
+        self._captured: Optional[tuple] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._beat = (0, time.perf_counter() + self.interval)
+        self._task = contextvars.Context().run(asyncio.create_task, self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join()
+        self._watchdog = None
+
+    async def _run(self):
+        beat = 0
+        while True:
+            due = time.perf_counter() + self.interval
+            self._beat = (beat, due)
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - due, 0.0)
+            loop_lag.observe((), lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self._record_stall(beat, lag)
+            beat += 1
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            beat, due = self._beat
+            if time.perf_counter() - due <= self.threshold:
+                continue
+            if self._captured is not None and self._captured[0] == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._captured = (beat, traceback.format_stack(frame))
+
+    def _record_stall(self, beat: int, lag: float):
+        loop_stalls.inc()
+        stack: List[str] = []
+        if self._captured is not None and self._captured[0] == beat:
+            stack = self._captured[1]
+        self.stalls.append({
+            "at": time.time() - lag,
+            "duration_ms": lag * 1000,
+            "stack": [line.rstrip("\n") for line in stack],
+        })
+        logger.warning(
+            "Event loop blocked for %.0fms%s",
+            lag * 1000, ":\n" + "".join(stack) if stack else " (ended before a stack was captured)",
+        )
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "samples": loop_lag.count(),
+            "stalls": loop_stalls.value(),
+            "max_lag_ms": self.max_lag * 1000,
+        }
+
+loop_monitor = LoopMonitor()
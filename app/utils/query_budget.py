@@ -0,0 +1,192 @@
+import functools
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "off" only counts, "warn" logs requests/events over their budget, "raise" fails them
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+# Statements kept per scope for the report
+QUERY_BUDGET_STATEMENTS = int(os.getenv("QUERY_BUDGET_STATEMENTS", "20"))
+
+if QUERY_BUDGET_MODE not in ("off", "warn", "raise"):
+    raise ValueError(f"Unknown query budget mode '{QUERY_BUDGET_MODE}'")
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+class QueryCounter:
+    """
+    SQL statements executed inside one ``count_queries()`` block.
+
+    Blocks nest: a statement counts towards every enclosing block.
+    """
+
+    def __init__(self, label: str, budget: Optional[int] = None, record: bool = False,
+                 parent: Optional["QueryCounter"] = None):
+        self.label = label
+        self.budget = budget
+        self.record = record
+        self.parent = parent
+        self.count = 0
+        self.statements: List[str] = []
+
+    def add(self, statement: str):
+        counter = self
+        while counter is not None:
+            counter.count += 1
+            if counter.record and len(counter.statements) < QUERY_BUDGET_STATEMENTS:
+                counter.statements.append(" ".join(statement.split()))
+            counter = counter.parent
+
+    @property
+    def exceeded(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def report(self) -> str:
+        lines = [f"{self.label} ran {self.count} SQL statements, budget is {self.budget}"]
+        lines.extend(f"  {n}. {statement}" for n, statement in enumerate(self.statements, 1))
+        if self.count > len(self.statements) and self.statements:
+            lines.append(f"  ... {self.count - len(self.statements)} more")
+        return "\n".join(lines)
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.add(statement)
+
+def instrument_queries(engine: Engine) -> Engine:
+    """
+    Count statements against the current ``count_queries()`` block.
+
+    Pass ``async_engine.sync_engine`` for async engines.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    return engine
+
+def current_counter() -> Optional[QueryCounter]:
+    return _current.get()
+
+@contextmanager
+def count_queries(label: str = "block", budget: Optional[int] = None, record: bool = True):
+    """
+    Count the SQL statements run inside the block.
+
+    Yields:
+        QueryCounter: Live count and, if ``record``, the first statements
+    """
+    counter = QueryCounter(label, budget, record, parent=_current.get())
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def assert_max_queries(budget: int, label: str = "block"):
+    """
+    Fail if the block runs more than ``budget`` statements, in any mode.
+
+    For tests and benchmarks::
+
+        with assert_max_queries(2, "PUT /users/1"):
+            client.put("/users/1", json={...})
+
+    Raises:
+        QueryBudgetExceeded: With every statement the block ran
+    """
+    with count_queries(label, budget) as counter:
+        yield counter
+    if counter.exceeded:
+        raise QueryBudgetExceeded(counter.report())
+
+def check_budget(counter: QueryCounter, may_raise: bool = True):
+    """Warn or raise, per ``QUERY_BUDGET_MODE``, if the counter went over its budget."""
+    if not counter.exceeded or QUERY_BUDGET_MODE == "off":
+        return
+    if QUERY_BUDGET_MODE == "raise" and may_raise:
+        raise QueryBudgetExceeded(counter.report())
+    logger.warning(counter.report())
+
+@contextmanager
+def budget_scope(label: str, budget: Optional[int] = None):
+    """
+    Count one request or socket event and enforce its budget on exit.
+
+    Does nothing when ``QUERY_BUDGET_MODE`` is off.
+    """
+    if QUERY_BUDGET_MODE == "off":
+        yield None
+        return
+    with count_queries(label, budget) as counter:
+        try:
+            yield counter
+        except QueryBudgetExceeded:
+            raise
+        except BaseException:
+            # Don't mask the original error with a budget report
+            check_budget(counter, may_raise=False)
+            raise
+    check_budget(counter)
+
+def query_budget(budget: int):
+    """
+    Route dependency declaring how many statements the endpoint may run::
+
+        @router.get("/users/{user_id}", dependencies=[query_budget(1)])
+    """
+    async def declare_budget():
+        counter = _current.get()
+        if counter is not None:
+            counter.budget = budget
+    return Depends(declare_budget)
+
+def event_budget(budget: int):
+    """Decorator declaring how many statements a Socket.IO handler may run."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args):
+            with budget_scope(f"socket:{handler.__name__}", budget):
+                return await handler(*args)
+        return wrapper
+    return decorator
+
+class QueryBudgetMiddleware:
+    """
+    Pure ASGI middleware that counts the statements of each HTTP request
+    and checks them against the budget its route declared.
+
+    In "raise" mode the budget is checked before every message the app
+    sends, so an overrun fails the request with a 500 before the response
+    starts, or aborts a streaming body, instead of going out as a success.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or QUERY_BUDGET_MODE == "off":
+            return await self.app(scope, receive, send)
+        with budget_scope(f"{scope['method']} {scope['path']}") as counter:
+            if QUERY_BUDGET_MODE == "raise":
+                send = self._within_budget(counter, send)
+            await self.app(scope, receive, send)
+
+    @staticmethod
+    def _within_budget(counter: QueryCounter, send):
+        async def send_within_budget(message):
+            if counter.exceeded:
+                raise QueryBudgetExceeded(counter.report())
+            await send(message)
+        return send_within_budget
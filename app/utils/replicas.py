@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from starlette.requests import cookie_parser
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long reads stay on the primary after a write, to cover replication lag
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", "2"))
+# Anonymous writers get a cookie that keeps their reads on the primary;
+# empty disables it. Client addresses are never used: behind a proxy or
+# NAT one writer would pin everyone to the primary.
+REPLICA_STICKY_COOKIE = os.getenv("REPLICA_STICKY_COOKIE", "replica_sticky")
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def routing_keys(scope) -> List[str]:
+    """Who a request acts for: the user its bearer token names, if any."""
+    user_id = getattr(scope.get("auth"), "user_id", None)
+    return [user_key(user_id)] if user_id is not None else []
+
+def has_sticky_cookie(scope) -> bool:
+    if not REPLICA_STICKY_COOKIE:
+        return False
+    for name, value in scope.get("headers", ()):
+        if name == b"cookie":
+            return REPLICA_STICKY_COOKIE in cookie_parser(value.decode("latin-1"))
+    return False
+
+class _RequestWrites:
+    __slots__ = ("scope", "wrote")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.wrote = False
+
+# The HTTP request being handled, for attributing writes
+_current_request: ContextVar[Optional[_RequestWrites]] = ContextVar("replica_routing_request", default=None)
+
+class ReplicaSet:
+    """
+    Read replicas behind ``get_read_db()``.
+
+    Read sessions rotate round-robin over the replicas that passed their
+    last health check. Requests from a user that wrote within
+    ``sticky_seconds``, or carrying the cookie set on an anonymous write,
+    read from the primary instead, so they see their own writes; so does
+    everyone while no replica is healthy.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        engines: Dict[str, AsyncEngine],
+        sticky_seconds: float = REPLICA_STICKY_SECONDS,
+        health_interval: float = REPLICA_HEALTH_INTERVAL,
+        health_timeout: float = REPLICA_HEALTH_TIMEOUT,
+    ):
+        self.primary = primary
+        self.engines = engines
+        self.sticky_seconds = sticky_seconds
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        # Same session options as the primary, bound to each replica
+        self._sessionmakers = {
+            name: async_sessionmaker(**{**primary.kw, "bind": engine}, class_=primary.class_)
+            for name, engine in engines.items()
+        }
+        # Trusted until the first health check says otherwise
+        self._healthy: List[str] = list(engines)
+        self._next = 0
+        # routing key -> monotonic time its reads may leave the primary
+        self._sticky: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.reads = {name: 0 for name in engines}
+        self.sticky_reads = 0
+        self.fallback_reads = 0
+        self.health_failures = {name: 0 for name in engines}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def mark_written(self, keys: Iterable[str]):
+        """Keep the reads of ``keys`` on the primary for ``sticky_seconds``."""
+        if not self.enabled:
+            return
+        until = time.monotonic() + self.sticky_seconds
+        with self._lock:
+            for key in keys:
+                self._sticky[key] = until
+
+    def is_sticky(self, keys: Iterable[str]) -> bool:
+        now = time.monotonic()
+        return any(self._sticky.get(key, 0) > now for key in keys)
+
+    def pick(self) -> Optional[str]:
+        """The next healthy replica in round-robin order, or None."""
+        healthy = self._healthy
+        if not healthy:
+            return None
+        with self._lock:
+            self._next = (self._next + 1) % len(healthy)
+            return healthy[self._next]
+
+    def session_for(self, scope) -> AsyncSession:
+        """A read session for the HTTP request with ``scope``."""
+        return self.session(routing_keys(scope), sticky=has_sticky_cookie(scope))
+
+    def session(self, keys: Iterable[str] = (), sticky: bool = False) -> AsyncSession:
+        """
+        A session for reads on behalf of ``keys`` (see ``routing_keys``).
+
+        Returns:
+            A session on a healthy replica, or on the primary when
+            ``sticky`` is set, the keys wrote recently or no replica is
+            available
+        """
+        if not self.enabled:
+            return self.primary()
+        if sticky or self.is_sticky(keys):
+            self.sticky_reads += 1
+            return self.primary()
+        name = self.pick()
+        if name is None:
+            self.fallback_reads += 1
+            return self.primary()
+        self.reads[name] += 1
+        return self._sessionmakers[name]()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+            return
+        request = _current_request.get()
+        if request is not None:
+            request.wrote = True
+            self.mark_written(routing_keys(request.scope))
+
+    def track_writes(self, engine: Engine) -> Engine:
+        """
+        Make the current request sticky whenever it writes through ``engine``.
+
+        Pass ``async_engine.sync_engine`` for async engines.
+        """
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        return engine
+
+    async def _check(self, name: str, engine: AsyncEngine) -> bool:
+        try:
+            async with engine.connect() as conn:
+                await asyncio.wait_for(conn.execute(text("SELECT 1")), self.health_timeout)
+            return True
+        except Exception as e:
+            self.health_failures[name] += 1
+            if name in self._healthy:
+                logger.warning("Read replica %s failed its health check: %s", name, e)
+            return False
+
+    async def check(self):
+        """Health check every replica and route reads to the ones that pass."""
+        results = await asyncio.gather(*(
+            self._check(name, engine) for name, engine in self.engines.items()
+        ))
+        healthy = [name for name, ok in zip(self.engines, results) if ok]
+        for name in set(healthy) - set(self._healthy):
+            logger.info("Read replica %s is healthy again", name)
+        self._healthy = healthy
+
+        now = time.monotonic()
+        with self._lock:
+            self._sticky = {key: until for key, until in self._sticky.items() if until > now}
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for engine in self.engines.values():
+            await engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": {
+                name: {
+                    "healthy": name in self._healthy,
+                    "reads": self.reads[name],
+                    "health_failures": self.health_failures[name],
+                }
+                for name in self.engines
+            },
+            "sticky_keys": len(self._sticky),
+            "sticky_seconds": self.sticky_seconds,
+            "sticky_reads": self.sticky_reads,
+            "fallback_reads": self.fallback_reads,
+        }
+
+class ReplicaRoutingMiddleware:
+    """
+    Pure ASGI middleware that lets writes made while handling a request
+    keep that request's user on the primary.
+
+    Anonymous writers can't be recognised later, so responses to requests
+    that wrote carry a short-lived ``REPLICA_STICKY_COOKIE`` instead.
+    """
+
+    def __init__(self, app, replicas: ReplicaSet):
+        self.app = app
+        self.replicas = replicas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.replicas.enabled:
+            return await self.app(scope, receive, send)
+        request = _RequestWrites(scope)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and request.wrote and REPLICA_STICKY_COOKIE:
+                cookie = (
+                    f"{REPLICA_STICKY_COOKIE}=1; Max-Age={max(int(self.replicas.sticky_seconds), 1)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        token = _current_request.set(request)
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _current_request.reset(token)
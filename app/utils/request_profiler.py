@@ -0,0 +1,197 @@
+import cProfile
+import heapq
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import time
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fraction of HTTP requests to profile (0 disables sampling)
+REQUEST_PROFILE_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILE_SAMPLE_RATE", "0"))
+# When set, a request with a matching X-Profile header is always profiled
+REQUEST_PROFILE_TOKEN = os.getenv("REQUEST_PROFILE_TOKEN")
+# Profiles kept: the slowest ones win
+REQUEST_PROFILE_KEEP = int(os.getenv("REQUEST_PROFILE_KEEP", "20"))
+# Functions listed in a text report
+REQUEST_PROFILE_LINES = int(os.getenv("REQUEST_PROFILE_LINES", "40"))
+
+PROFILE_HEADER = b"x-profile"
+
+class RequestProfile:
+    def __init__(self, profile_id: int, method: str, path: str, trigger: str, stats: dict,
+                 duration: float, status: int):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.stats = stats
+        self.duration = duration
+        self.status = status
+        self.created_at = time.time()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "status": self.status,
+            "duration_ms": self.duration * 1000,
+            "created_at": self.created_at,
+        }
+
+    def report(self, sort: str = "cumulative", lines: int = REQUEST_PROFILE_LINES) -> str:
+        out = io.StringIO()
+        stats = pstats.Stats(_StatsSource(self.stats), stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(lines)
+        return f"{self.method} {self.path} -> {self.status} in {self.duration * 1000:.1f}ms\n{out.getvalue()}"
+
+    def dump(self) -> bytes:
+        """The profile in ``pstats`` dump format, for snakeviz, flameprof or ``pstats``."""
+        return marshal.dumps(self.stats)
+
+class _StatsSource:
+    # pstats.Stats accepts anything with create_stats() and a stats dict
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+class RequestProfiler:
+    """
+    Opt-in cProfile of HTTP requests.
+
+    A request is profiled when it carries ``X-Profile: <token>`` or is
+    picked by ``sample_rate``. The profile covers everything the event
+    loop runs while the request is in flight, so concurrent requests can
+    show up in it, and work handed to the threadpool (sync endpoints,
+    password hashing) appears as time spent waiting. Only one request is
+    profiled at a time since the interpreter allows a single profiler.
+    """
+
+    def __init__(self, sample_rate: float = REQUEST_PROFILE_SAMPLE_RATE,
+                 token: Optional[str] = REQUEST_PROFILE_TOKEN, keep: int = REQUEST_PROFILE_KEEP):
+        self.sample_rate = sample_rate
+        self.token = token.encode() if token else None
+        self.keep = keep
+        self._ids = itertools.count(1)
+        # Min-heap on duration, so the fastest kept profile is evicted first
+        self._slowest: List[tuple] = []
+        self._by_id: Dict[int, RequestProfile] = {}
+        self._active = False
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.token is not None
+
+    def trigger(self, scope) -> Optional[str]:
+        """Why this request should be profiled, or None."""
+        if self.token is not None:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        if self._active:
+            self.skipped_busy += 1
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running in this process
+            self.skipped_busy += 1
+            return None
+        self._active = True
+        return profile
+
+    def end(self, profile: cProfile.Profile, scope, trigger: str, duration: float, status: int,
+            profile_id: int) -> RequestProfile:
+        profile.disable()
+        self._active = False
+        profile.create_stats()
+        record = RequestProfile(profile_id, scope["method"], scope["path"], trigger, profile.stats,
+                                duration, status)
+        self.profiled += 1
+        heapq.heappush(self._slowest, (duration, profile_id))
+        self._by_id[profile_id] = record
+        while len(self._slowest) > self.keep:
+            _, evicted = heapq.heappop(self._slowest)
+            self._by_id.pop(evicted, None)
+        return record
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        return self._by_id.get(profile_id)
+
+    def slowest(self) -> List[dict]:
+        return [
+            record.summary()
+            for record in sorted(self._by_id.values(), key=lambda record: record.duration, reverse=True)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "header": self.token is not None,
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy,
+            "kept": len(self._by_id),
+        }
+
+request_profiler = RequestProfiler()
+
+class ProfilerMiddleware:
+    """
+    Pure ASGI middleware that profiles requests picked by ``request_profiler``.
+
+    Profiled responses carry an ``X-Profile-Id`` header; the report is at
+    ``/internal/profiles/{id}`` as long as it is among the slowest kept.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler = request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            return await self.app(scope, receive, send)
+        trigger = self.profiler.trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+        profile = self.profiler.begin()
+        if profile is None:
+            return await self.app(scope, receive, send)
+
+        profile_id = self.profiler.next_id()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", str(profile_id).encode())
+                ]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.end(profile, scope, trigger, time.perf_counter() - started, status[0], profile_id)
@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+# Any constant, as long as every worker uses the same one
+SCHEMA_LOCK_KEY = 7_250_418
+
+@contextmanager
+def _schema_connection(engine: Engine):
+    """
+    An autocommit connection holding the schema upgrade lock.
+
+    Every worker upgrades the schema when it imports the app. On Postgres
+    they queue on an advisory lock, and each finds the work of the ones
+    before it already done. SQLite has no such lock, so every statement
+    below is also safe to run twice.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name != "postgresql":
+            yield conn
+            return
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        try:
+            yield conn
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+def upgrade_schema(engine: Engine, metadata: MetaData):
+    """Create missing tables, columns and indexes under one schema lock."""
+    with _schema_connection(engine) as conn:
+        # Unlike create_all, IF NOT EXISTS can't race another worker
+        for table in metadata.sorted_tables:
+            conn.execute(CreateTable(table, if_not_exists=True))
+        _add_missing_columns(conn, metadata)
+        _create_missing_indexes(conn, metadata)
+
+def _create_missing_indexes(conn: Connection, metadata: MetaData):
+    """
+    Create indexes that were added to the models after their tables existed.
+
+    ``create_all`` only creates indexes together with new tables, so indexes
+    added to an existing table would otherwise never be built. Postgres
+    builds them ``CONCURRENTLY``, so writes to the table carry on meanwhile.
+    """
+    postgres = conn.dialect.name == "postgresql"
+    names = {index.name for table in metadata.sorted_tables for index in table.indexes}
+    if postgres:
+        # A failed concurrent build leaves an invalid index behind that
+        # IF NOT EXISTS would skip forever
+        invalid = conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid"
+        )).scalars()
+        for name in set(invalid) & names:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {conn.dialect.identifier_preparer.quote(name)}"))
+    for table in metadata.sorted_tables:
+        existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+            if postgres:
+                statement = statement.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+            conn.execute(text(statement))
+
+def _add_missing_columns(conn: Connection, metadata: MetaData):
+    """
+    Add columns that were added to the models after their tables existed.
+
+    Like indexes, new columns are only created together with new tables.
+    Nullable columns and NOT NULL columns with a server default are added;
+    anything else (or a key column) needs a real migration and is left alone.
+    """
+    existing_tables = set(inspect(conn).get_table_names())
+    preparer = conn.dialect.identifier_preparer
+    ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+    # SQLite has no ADD COLUMN IF NOT EXISTS
+    if_not_exists = "IF NOT EXISTS " if conn.dialect.name == "postgresql" else ""
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or column.primary_key:
+                continue
+            default = ddl.get_column_default_string(column)
+            if not column.nullable and default is None:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            statement = (
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {if_not_exists}{preparer.format_column(column)} {column_type}"
+            )
+            if default is not None:
+                statement += f" DEFAULT {default}"
+            if not column.nullable:
+                statement += " NOT NULL"
+            try:
+                conn.execute(text(statement))
+            except (OperationalError, ProgrammingError):
+                # Another worker added it first
+                if column.name not in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+                    raise
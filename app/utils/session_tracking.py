@@ -0,0 +1,192 @@
+import bisect
+import logging
+import os
+import threading
+import time
+import traceback
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "off" only counts, "warn" logs where leaked sessions were opened, "raise" fails the scope
+DB_SESSION_TRACKING = os.getenv("DB_SESSION_TRACKING", "off")
+# Sessions held longer than this many seconds are reported
+DB_SESSION_MAX_HOLD = float(os.getenv("DB_SESSION_MAX_HOLD", "5"))
+
+HOLD_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+class SessionLeakError(RuntimeError):
+    pass
+
+@dataclass
+class SessionRecord:
+    opened_at: float
+    scope: Optional[str]
+    origin: Optional[str]
+
+class _Scope:
+    def __init__(self, label: str):
+        self.label = label
+        self.sessions: Set[int] = set()
+
+_current_scope: ContextVar[Optional[_Scope]] = ContextVar("db_session_scope", default=None)
+
+def _origin() -> str:
+    # First frame outside SQLAlchemy and this module is where the session was opened
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if "sqlalchemy" not in frame.filename and not frame.filename.endswith("session_tracking.py"):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+class SessionTracker:
+    """
+    Records where each session was opened and how long it was held.
+
+    Sessions opened inside a ``scope()`` (one HTTP request or Socket.IO
+    event) must be closed before the scope ends; sessions that are never
+    closed at all are counted when they are garbage collected.
+    """
+
+    def __init__(self, mode: str = DB_SESSION_TRACKING, max_hold: float = DB_SESSION_MAX_HOLD):
+        if mode not in ("off", "warn", "raise"):
+            raise ValueError(f"Unknown session tracking mode '{mode}'")
+        self.mode = mode
+        self.max_hold = max_hold
+        self._open: Dict[int, SessionRecord] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.leaked = 0
+        self.outlived_scope = 0
+        self.held_too_long = 0
+        self.hold_buckets = [0] * (len(HOLD_BUCKETS) + 1)
+
+    def track(self, session: Session):
+        key = id(session)
+        scope = _current_scope.get()
+        record = SessionRecord(
+            opened_at=time.perf_counter(),
+            scope=scope.label if scope else None,
+            origin=_origin() if self.mode != "off" else None,
+        )
+        with self._lock:
+            self._open[key] = record
+            self.opened += 1
+        if scope is not None:
+            scope.sessions.add(key)
+        weakref.finalize(session, self._collected, key)
+
+    def release(self, session: Session):
+        with self._lock:
+            record = self._open.pop(id(session), None)
+            if record is None:
+                return
+            self.closed += 1
+            held = time.perf_counter() - record.opened_at
+            self.hold_buckets[bisect.bisect_left(HOLD_BUCKETS, held)] += 1
+            if held > self.max_hold:
+                self.held_too_long += 1
+        if held > self.max_hold and self.mode != "off":
+            logger.warning(
+                "DB session held for %.2fs (opened at %s, scope %s)",
+                held, record.origin, record.scope,
+            )
+
+    def _collected(self, key: int):
+        with self._lock:
+            record = self._open.pop(key, None)
+            if record is None:
+                return
+            self.leaked += 1
+        if self.mode != "off":
+            # Never raise from a GC callback
+            logger.warning(
+                "DB session garbage collected without close() (opened at %s, scope %s)",
+                record.origin, record.scope,
+            )
+
+    @contextmanager
+    def scope(self, label: str):
+        """
+        Mark the lifetime of a request or socket event.
+
+        Any session opened inside the scope and still open when it ends
+        is reported as having outlived it.
+        """
+        current = _Scope(label)
+        token = _current_scope.set(current)
+        try:
+            yield current
+        except BaseException:
+            # Don't mask the original error with a leak report
+            self._end_scope(current, token, may_raise=False)
+            raise
+        self._end_scope(current, token)
+
+    def _end_scope(self, current: _Scope, token, may_raise: bool = True):
+        _current_scope.reset(token)
+        with self._lock:
+            leaked = [self._open[key] for key in current.sessions if key in self._open]
+            self.outlived_scope += len(leaked)
+        if not leaked or self.mode == "off":
+            return
+        origins = ", ".join(str(record.origin) for record in leaked)
+        message = f"{len(leaked)} DB session(s) outlived {current.label} (opened at {origins})"
+        if self.mode == "raise" and may_raise:
+            raise SessionLeakError(message)
+        logger.warning(message)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "open": len(self._open),
+            "opened": self.opened,
+            "closed": self.closed,
+            "leaked": self.leaked,
+            "outlived_scope": self.outlived_scope,
+            "held_too_long": self.held_too_long,
+            "hold_histogram": {
+                **{
+                    f"le_{bound}": sum(self.hold_buckets[:i + 1])
+                    for i, bound in enumerate(HOLD_BUCKETS)
+                },
+                "le_inf": sum(self.hold_buckets),
+            },
+        }
+
+session_tracker = SessionTracker()
+
+class TrackedSession(Session):
+    """Session that reports its lifetime to ``session_tracker``."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        session_tracker.track(self)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            session_tracker.release(self)
+
+class SessionScopeMiddleware:
+    """
+    Pure ASGI middleware that runs each HTTP request in a tracking scope.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with session_tracker.scope(f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
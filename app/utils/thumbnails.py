@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Without Pillow only originals are served; see ThumbnailPool.check()
+    Image = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Square WebP variants generated for every stored photo, in pixels
+THUMBNAIL_SIZES = tuple(sorted(int(size) for size in os.getenv("THUMBNAIL_SIZES", "64,256").split(",") if size))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+
+# Module level so it can be pickled into the process pool
+def render_variants(source: str, targets: Sequence[Tuple[int, str]], quality: int = THUMBNAIL_QUALITY):
+    """
+    Write a centre-cropped square WebP of ``source`` for each ``(size, path)``.
+
+    Each variant is written to a temporary file and renamed into place, so
+    a half-written variant is never served.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        for size, path in sorted(targets, reverse=True):
+            variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            temp_path = f"{path}.part"
+            variant.save(temp_path, "WEBP", quality=quality, method=4)
+            os.replace(temp_path, path)
+
+class ThumbnailPool:
+    """
+    Renders photo variants in a process pool, off the event loop and the GIL.
+    """
+
+    def __init__(self, sizes: Sequence[int] = THUMBNAIL_SIZES, max_workers: int = THUMBNAIL_WORKERS):
+        self.sizes = tuple(sizes)
+        self.max_workers = max_workers
+        self.rendered = 0
+        self.failed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return Image is not None and bool(self.sizes) and self.max_workers > 0
+
+    def check(self):
+        """Warn at startup when variants are configured but can't be rendered."""
+        if Image is None and self.sizes and self.max_workers > 0:
+            logger.warning(
+                "Pillow is not installed: photo variants %s will not be generated "
+                "and photos are served at their original size",
+                list(self.sizes),
+            )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def render(self, source: str, targets: List[Tuple[int, str]]):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, partial(render_variants, source, targets))
+        except Exception:
+            self.failed += 1
+            raise
+        self.rendered += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "sizes": list(self.sizes),
+            "max_workers": self.max_workers,
+            "rendered": self.rendered,
+            "failed": self.failed,
+        }
+
+thumbnail_pool = ThumbnailPool()
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Revocations only need to outlive the tokens they revoke
+TOKEN_DENYLIST_TTL = float(os.getenv(
+    "TOKEN_DENYLIST_TTL", str(max(int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")), 15) * 60)
+))
+
+class RevocationChannel:
+    """
+    Fans token revocations out to the other workers.
+
+    Like ``InvalidationChannel`` this default only reaches the local
+    process; ``token_denylist.set_channel()`` plugs in a cluster-wide one.
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[int, int], None]] = []
+
+    def subscribe(self, callback: Callable[[int, int], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, user_id: int, version: int):
+        pass
+
+    def deliver(self, user_id: int, version: int):
+        for callback in self._subscribers:
+            callback(user_id, version)
+
+class TokenDenylist:
+    """
+    In-memory record of users whose older tokens were revoked.
+
+    Tokens carry the user's ``token_version`` (``ver``); revoking a user
+    rejects every token with a lower version. An entry is dropped once
+    ``ttl`` has passed, since every token it covered has expired by then,
+    so the list stays as small as the number of recent revocations.
+    """
+
+    def __init__(self, ttl: float = TOKEN_DENYLIST_TTL, channel: Optional[RevocationChannel] = None):
+        self.ttl = ttl
+        # user id -> (lowest valid version, forget at)
+        self._entries: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self.revocations = 0
+        self.rejected = 0
+        self.channel = None
+        self.set_channel(channel or RevocationChannel())
+
+    def set_channel(self, channel: RevocationChannel):
+        self.channel = channel
+        channel.subscribe(self._add)
+
+    def _add(self, user_id: int, version: int):
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None:
+                version = max(version, current[0])
+            self._entries[user_id] = (version, time.monotonic() + self.ttl)
+            self.revocations += 1
+
+    def revoke(self, user_id: int, version: int):
+        """Reject ``user_id``'s tokens older than ``version``, here and on the other workers."""
+        self._add(user_id, version)
+        self.channel.publish(user_id, version)
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False
+        min_version, forget_at = entry
+        if time.monotonic() >= forget_at:
+            with self._lock:
+                if self._entries.get(user_id) == entry:
+                    del self._entries[user_id]
+            return False
+        if version < min_version:
+            self.rejected += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "ttl_s": self.ttl,
+            "revocations": self.revocations,
+            "rejected": self.rejected,
+        }
+
+token_denylist = TokenDenylist()
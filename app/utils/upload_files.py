@@ -0,0 +1,85 @@
+import os
+import re
+from functools import partial
+from typing import Dict, Optional
+from anyio import to_thread
+from dotenv import load_dotenv
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from .file_upload import UPLOAD_DIR
+
+load_dotenv()
+
+# Cache lifetime of uploads whose name is not their content hash
+UPLOADS_MAX_AGE = int(os.getenv("UPLOADS_MAX_AGE", "3600"))
+# Read size when the server can't send files itself
+UPLOADS_CHUNK_SIZE = int(os.getenv("UPLOADS_CHUNK_SIZE", str(256 * 1024)))
+
+# <sha256>.<ext> originals and <sha256>_<size>.webp variants
+CONTENT_ADDRESSED_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})(?P<variant>_\d+)?\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+class UploadFileResponse(FileResponse):
+    chunk_size = UPLOADS_CHUNK_SIZE
+
+def content_headers(name: str) -> Optional[Dict[str, str]]:
+    """
+    Caching headers for a content-addressed file name, None for any other.
+
+    The ETag comes from the digest in the name, so it is the same on
+    every worker and host and never needs the file's mtime.
+    """
+    match = CONTENT_ADDRESSED_NAME.match(name)
+    if match is None:
+        return None
+    return {
+        "etag": f'"{match.group("digest")}{match.group("variant") or ""}"',
+        "cache-control": IMMUTABLE,
+    }
+
+class UploadFiles(StaticFiles):
+    """
+    Serves ``/uploads``.
+
+    Content-addressed files get a strong ETag and an immutable
+    ``Cache-Control``, and an ``If-None-Match`` for one is answered with a
+    304 before the disk is touched, since a name never changes content.
+    Other files are revalidated after ``max_age`` seconds. Ranges are
+    handled by ``FileResponse``, which also hands the file to the server
+    (``http.response.pathsend``, i.e. sendfile) when the server offers it
+    and otherwise streams it in large chunks. Staged uploads (dot files)
+    are never served.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, max_age: int = UPLOADS_MAX_AGE):
+        super().__init__(directory=directory, check_dir=False)
+        self.max_age = max_age
+
+    async def check_config(self):
+        # Nothing may have been uploaded yet
+        await to_thread.run_sync(partial(os.makedirs, self.directory, exist_ok=True))
+        await super().check_config()
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.split("/")):
+            raise HTTPException(status_code=404)
+        if scope["method"] in ("GET", "HEAD"):
+            headers = content_headers(path.rsplit("/", 1)[-1])
+            if headers is not None and self.is_not_modified(Headers(headers), Headers(scope=scope)):
+                return NotModifiedResponse(Headers(headers))
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        headers = content_headers(os.path.basename(full_path)) or {
+            "cache-control": f"public, max-age={self.max_age}",
+        }
+        # Users upload these; never let a browser reinterpret them
+        headers["x-content-type-options"] = "nosniff"
+        response = UploadFileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
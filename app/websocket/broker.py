@@ -0,0 +1,159 @@
+"""
+Local pub/sub broker for running several Socket.IO workers on one host.
+
+Workers connect over a UNIX socket and every frame a worker sends is
+relayed to the other workers on the same channel. Frames are a 4-byte
+big-endian length followed by a JSON document; the first frame from a
+worker is ``{"channel": ..., "host_id": ...}``. When a worker goes away
+the broker tells the rest with a ``host_down`` cluster message.
+
+    python -m app.websocket.broker --path /tmp/lagfast-socketio.sock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from .cluster import CLUSTER_METHOD, ClusterMixin
+
+logger = logging.getLogger(__name__)
+
+SOCKETIO_BROKER_PATH = os.getenv("SOCKETIO_BROKER_PATH", "/tmp/lagfast-socketio.sock")
+# Broker-side limit; a worker sending anything larger is disconnected
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+RECONNECT_DELAY = 1.0
+
+_header = struct.Struct(">I")
+
+def encode_frame(payload: bytes) -> bytes:
+    return _header.pack(len(payload)) + payload
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = _header.unpack(await reader.readexactly(_header.size))
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError(f"Frame of {size} bytes exceeds limit")
+    return await reader.readexactly(size)
+
+class Broker:
+    def __init__(self):
+        self.workers: Dict[asyncio.StreamWriter, Tuple[str, str]] = {}
+
+    async def relay(self, channel: str, frame: bytes, source: Optional[asyncio.StreamWriter] = None):
+        peers = [w for w, (c, _) in self.workers.items() if c == channel and w is not source]
+        for writer in peers:
+            writer.write(frame)
+        results = await asyncio.gather(*(w.drain() for w in peers), return_exceptions=True)
+        for writer, result in zip(peers, results):
+            if isinstance(result, Exception):
+                writer.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            hello = json.loads(await read_frame(reader))
+            channel, host_id = hello["channel"], hello["host_id"]
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, KeyError):
+            writer.close()
+            return
+        self.workers[writer] = (channel, host_id)
+        logger.info("Worker %s joined channel %s", host_id, channel)
+        try:
+            while True:
+                payload = await read_frame(reader)
+                await self.relay(channel, encode_frame(payload), source=writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.workers[writer]
+            writer.close()
+            logger.info("Worker %s left channel %s", host_id, channel)
+            await self.relay(channel, encode_frame(json.dumps({
+                "method": CLUSTER_METHOD,
+                "topic": "host_down",
+                "payload": {"host_id": host_id},
+                "host_id": None,
+            }).encode()))
+
+async def serve(path: str = SOCKETIO_BROKER_PATH):
+    if os.path.exists(path):
+        os.unlink(path)
+    broker = Broker()
+    server = await asyncio.start_unix_server(broker.handle, path)
+    async with server:
+        await server.serve_forever()
+
+class UnixSocketPubSubManager(AsyncPubSubManager):
+    """
+    Socket.IO client manager that publishes through the local broker.
+
+    Args:
+        url: ``unix:///path/to/broker.sock``
+    """
+    name = 'unixsocket'
+
+    def __init__(self, url: str = f"unix://{SOCKETIO_BROKER_PATH}", channel: str = 'socketio',
+                 write_only: bool = False, logger=None, json=None):
+        self.path = urlparse(url).path
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self) -> asyncio.StreamReader:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                writer.write(encode_frame(self.json.dumps({
+                    "channel": self.channel,
+                    "host_id": self.host_id,
+                }).encode()))
+                await writer.drain()
+                self._reader, self._writer = reader, writer
+            return self._reader
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _publish(self, data):
+        frame = encode_frame(self.json.dumps(data).encode())
+        for retry in (True, False):
+            try:
+                await self._connect()
+                self._writer.write(frame)
+                await self._writer.drain()
+                return
+            except (ConnectionError, OSError) as e:
+                self._disconnect()
+                if not retry:
+                    self._get_logger().error('Cannot publish to broker at %s: %s', self.path, e)
+
+    async def _listen(self):
+        while True:
+            try:
+                reader = await self._connect()
+                while True:
+                    yield self.json.loads(await read_frame(reader))
+            except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                self._get_logger().error('Broker connection lost (%s), retrying', e)
+                self._disconnect()
+                await asyncio.sleep(RECONNECT_DELAY)
+
+class UnixSocketManager(ClusterMixin, UnixSocketPubSubManager):
+    pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=SOCKETIO_BROKER_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.path))
+    except KeyboardInterrupt:
+        pass
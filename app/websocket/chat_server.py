@@ -1,122 +1,174 @@
 from fastapi import WebSocket, WebSocketDisconnect, HTTPException
 from typing import Dict, List, Optional
+import functools
+import logging
 import socketio
 import asyncio
 # from app.core.security import decode_access_token
 # from app.models.user import User
 # from app.models.chat import Message
 # from app.database import SessionLocal
-from ..models.chat import ChatMessage
-from sqlalchemy.orm import Session
 from datetime import datetime
 from urllib.parse import parse_qs
-from ..utils.auth import verify_token
+from ..utils.auth import authenticate_token
+from ..utils.token_denylist import token_denylist
 from ..services.user_service import UserService
-from ..utils.database import SessionLocal
+from ..utils.database import AsyncSessionLocal
+from ..utils.query_budget import event_budget
+from ..utils.session_tracking import session_tracker
+from ..services.user_cache import user_cache
+from .cluster import ClusterInvalidationChannel, ClusterRevocationChannel, cluster, create_client_manager
+from .message_writer import MessageQueueFull, MessageWriteFailed, MessageWriterStopped, message_writer
+from .instrumentation import InstrumentedServer
+from .presence import GLOBAL, PresenceEngine
+from .registry import ConnectionRegistry
+from .typing_indicators import TypingTracker
 
-# Create Socket.IO server
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+logger = logging.getLogger(__name__)
+
+# Create Socket.IO server; SOCKETIO_MANAGER_URL shares rooms between workers
+sio = InstrumentedServer(async_mode='asgi', cors_allowed_origins='*',
+                         client_manager=create_client_manager())
 app = socketio.ASGIApp(sio)
 
+def room_name(room_id) -> str:
+    return f"room:{room_id}"
+
+def user_room(user_id) -> str:
+    return f"user:{user_id}"
+
+def valid_message(room_id, content) -> bool:
+    return (
+        isinstance(room_id, int) and not isinstance(room_id, bool) and room_id > 0
+        and isinstance(content, str) and content.strip() != ""
+    )
+
 # Store active connections
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, Dict[str, List[socketio.AsyncServer]]] = {}
-        self.user_connections: Dict[str, socketio.AsyncServer] = {}
+        self.registry = ConnectionRegistry()
 
     async def connect(self, sid: str, token: str):
         try:            
-            # Decode token to get user_id
-            user_name = verify_token(token).get('sub')
-            db = SessionLocal()
-            user_id = UserService.get_user_by_name(db, user_name).id
+            authentication = authenticate_token(token)
+            if authentication.error is not None:
+                raise HTTPException(status_code=401, detail=authentication.error)
+            # Current tokens name the user id, so reconnects don't touch the database
+            user_id = authentication.user_id
+            if user_id is None:
+                async with AsyncSessionLocal() as db:
+                    user = await UserService.get_principal_by_name(db, authentication.username)
+                user_id = user.id if user else None
             if not user_id:
                 raise HTTPException(status_code=401, detail="Invalid token")
             
             # Store the connection
-            self.user_connections[sid] = user_id
+            first_device = self.registry.add(sid, user_id)
+            await sio.enter_room(sid, user_room(user_id))
             
-            # Notify others about the new user
-            await sio.emit('user_joined', {'user_id': user_id}, skip_sid=sid)
+            # Others hear about the new user in the next presence_delta
+            if first_device:
+                presence.user_online(user_id)
             
-            # Send list of online users to the new connection
-            online_users = [
-                uid for uid in self.user_connections.values() if uid != user_id
-            ]
-            await sio.emit('online_users', online_users, room=sid)
+            # Send the online users to the new connection
+            if presence.scope == "global":
+                await sio.emit('presence_snapshot', presence.snapshot(), room=sid)
             
         except Exception as e:
-            print(f"Error in connect: {str(e)}")
+            logger.info("Connection refused: %s", e)
             raise HTTPException(status_code=401, detail="Invalid token")
 
     async def disconnect(self, sid: str):
-        if sid in self.user_connections:
-            user_id = self.user_connections[sid]
-            del self.user_connections[sid]
-            
-            # Notify others about the user leaving
-            await sio.emit('user_left', {'user_id': user_id}, skip_sid=sid)
+        # Socket.IO drops the sid from its rooms itself
+        user_id, last_device, rooms_left = self.registry.remove(sid)
+        for room in rooms_left:
+            presence.room_left(room, user_id)
+            typing_tracker.clear(room, user_id)
+        if user_id is not None and last_device:
+            presence.user_offline(user_id)
 
     async def join_room(self, sid: str, room_id: str):
         try:
-            user_id = self.user_connections[sid]
+            user_id = self.registry.user_of(sid)
             if not user_id:
                 return
 
-            # Initialize room if it doesn't exist
-            if room_id not in self.active_connections:
-                self.active_connections[room_id] = {}
-            
-            # Initialize user's connections in the room if they don't exist
-            if user_id not in self.active_connections[room_id]:
-                self.active_connections[room_id][user_id] = []
-            
-            # Add the connection to the room
-            self.active_connections[room_id][user_id].append(sid)
+            room = room_name(room_id)
+            first_device = self.registry.join(sid, room)
+            await sio.enter_room(sid, room)
             
-            # Join Socket.IO room
-            if sio is not None:
-                print(f"Joining room {room_id} for user {self.active_connections[room_id]}")
-                # await sio.enter_room(sid, room_id)
-                
+            if presence.scope == "room":
+                # Members hear about the user in the next presence_delta
+                if first_device:
+                    presence.room_joined(room, user_id)
+                await sio.emit('presence_snapshot', presence.snapshot(room), room=sid)
+            else:
                 # Notify others in the room
                 await sio.emit('user_joined_room', 
                              {'user_id': user_id, 'room_id': room_id}, 
-                             room=room_id, 
+                             room=room, 
                              skip_sid=sid)
-            else:
-                print("Socket.IO server not initialized")
                 
-        except Exception as e:
-            print(f"Error in join_room: {str(e)}")
+        except Exception:
+            logger.exception("Error in join_room")
             raise
 
     async def leave_room(self, sid: str, room_id: str):
-        if sid in self.user_connections:
-            user_id = self.user_connections[sid]
-            if room_id in self.active_connections and user_id in self.active_connections[room_id]:
-                self.active_connections[room_id][user_id].remove(sid)
-                if not self.active_connections[room_id][user_id]:
-                    del self.active_connections[room_id][user_id]
-                if not self.active_connections[room_id]:
-                    del self.active_connections[room_id]
+        user_id = self.registry.user_of(sid)
+        if user_id:
+            room = room_name(room_id)
+            last_device = self.registry.leave(sid, room)
             
             # Leave Socket.IO room
-            await sio.leave_room(sid, room_id)
+            await sio.leave_room(sid, room)
             
-            # Notify others in the room
-            await sio.emit('user_left_room', 
-                         {'user_id': user_id, 'room_id': room_id}, 
-                         room=room_id, 
-                         skip_sid=sid)
+            if last_device:
+                typing_tracker.clear(room, user_id)
+            if presence.scope == "room":
+                if last_device:
+                    presence.room_left(room, user_id)
+            else:
+                # Notify others in the room
+                await sio.emit('user_left_room', 
+                             {'user_id': user_id, 'room_id': room_id}, 
+                             room=room, 
+                             skip_sid=sid)
 
     async def broadcast_to_room(self, room_id: str, message: dict, skip_sid: str = None):
-        if room_id in self.active_connections:
-            await sio.emit('message', message, room=room_id, skip_sid=skip_sid)
+        # Members may be connected to other workers, so always emit
+        await sio.emit('message', message, room=room_name(room_id), skip_sid=skip_sid)
 
 manager = ConnectionManager()
+presence = PresenceEngine(sio, manager.registry, cluster)
+typing_tracker = TypingTracker(sio, cluster)
+
+async def start_realtime():
+    """Start presence ticks and join the other workers before the first client connects."""
+    if cluster.enabled:
+        if not sio.manager_initialized:
+            sio.manager_initialized = True
+            sio.manager.initialize()
+        user_cache.set_channel(ClusterInvalidationChannel(cluster))
+        token_denylist.set_channel(ClusterRevocationChannel(cluster))
+    presence.start()
+    typing_tracker.start()
+
+async def stop_realtime():
+    await presence.stop()
+    await typing_tracker.stop()
+
+def session_scoped(handler):
+    """Report DB sessions that outlive a single Socket.IO event."""
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        with session_tracker.scope(f"socket:{handler.__name__}"):
+            return await handler(*args)
+    return wrapper
 
 @sio.event
+# Only tokens without a uid claim (issued before it existed) look the user up
+@event_budget(1)
+@session_scoped
 async def connect(sid, environ, auth):
     try:
         qs = parse_qs(environ.get("QUERY_STRING", ""))
@@ -125,70 +177,126 @@ async def connect(sid, environ, auth):
             raise Exception("No token provided")
         await manager.connect(sid, token)
     except Exception as e:
-        print(f"Connection error: {str(e)}")
+        logger.info("Connection error: %s", e)
         return False
 
 @sio.event
+@event_budget(0)
+@session_scoped
 async def disconnect(sid):
     await manager.disconnect(sid)
 
 @sio.event
+@event_budget(0)
+@session_scoped
 async def join_room(sid, data):
     room_id = data.get('room_id')
     if room_id:
         await manager.join_room(sid, room_id)
 
 @sio.event
+@event_budget(0)
+@session_scoped
 async def leave_room(sid, data):
     room_id = data.get('room_id')
     if room_id:
         await manager.leave_room(sid, room_id)
 
 @sio.event
+@event_budget(0)
+@session_scoped
+async def presence_sync(sid, data):
+    # Clients that missed a presence_delta version ask for a fresh snapshot
+    if not manager.registry.user_of(sid):
+        return
+    room_id = (data or {}).get('room_id')
+    if presence.scope == "room":
+        if not room_id:
+            return
+        key = room_name(room_id)
+        if key not in manager.registry.rooms_of(manager.registry.user_of(sid)):
+            return
+    else:
+        key = GLOBAL
+    await sio.emit('presence_snapshot', presence.snapshot(key), room=sid)
+
+@sio.event
+@event_budget(0)
+@session_scoped
 async def message(sid, data):
     try:
-        room_id = data.get('room_id')
-        content = data.get('content')
-        if not room_id or not content:
-            return
+        room_id = data.get('room_id') if isinstance(data, dict) else None
+        content = data.get('content') if isinstance(data, dict) else None
         
         # Get user_id from connection
-        user_id = manager.user_connections.get(sid)
+        user_id = manager.registry.user_of(sid)
         if not user_id:
             return
+
+        # Rows are written in batches, so reject what the insert can't take up front
+        if not valid_message(room_id, content):
+            await sio.emit('message_error', {
+                'room_id': room_id,
+                'detail': 'room_id must be an integer and content a non-empty string'
+            }, room=sid)
+            return
         
-        # Save message to database
-        db = SessionLocal()
+        # Queue message for the batched writer
+        timestamp = datetime.utcnow()
         try:
-            message = ChatMessage(
-                room_id=room_id,
-                receiver_id=room_id,
-                sender_id=user_id,
-                content=content,
-                message_type='text',
-                is_read=False,
-                timestamp=datetime.utcnow()
-            )
-            db.add(message)
-            db.commit()
-            
-            # Broadcast message to room
-            await manager.broadcast_to_room(
-                room_id,
-                {
+            committed = await message_writer.submit({
+                'room_id': room_id,
+                'receiver_id': room_id,
+                'sender_id': user_id,
+                'content': content,
+                'message_type': 'text',
+                'is_read': False,
+                'timestamp': timestamp,
+            })
+        except MessageQueueFull:
+            await sio.emit('message_error', {
+                'room_id': room_id,
+                'detail': 'Server is busy, message was not sent'
+            }, room=sid)
+            return
+        except MessageWriterStopped:
+            await sio.emit('message_error', {
+                'room_id': room_id,
+                'detail': 'Server is shutting down, message was not sent'
+            }, room=sid)
+            return
+
+        # Sending a message ends the sender's typing indicator
+        typing_tracker.clear(room_name(room_id), user_id)
+
+        # Unless broadcasting early, wait until the message is durable
+        if committed is not None:
+            try:
+                await committed
+            except MessageWriteFailed:
+                await sio.emit('message_error', {
                     'room_id': room_id,
-                    'receiver_id': user_id,
-                    'content': content,
-                    'timestamp': message.timestamp.isoformat()
-                },
-                skip_sid=sid
-            )
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"Error handling message: {str(e)}")
+                    'detail': 'Message could not be saved'
+                }, room=sid)
+                return
+
+        # Broadcast message to room
+        await manager.broadcast_to_room(
+            room_id,
+            {
+                'room_id': room_id,
+                'receiver_id': user_id,
+                'content': content,
+                'timestamp': timestamp.isoformat()
+            },
+            skip_sid=sid
+        )
+    except Exception:
+        logger.exception("Error handling message")
 
 @sio.event
+@event_budget(0)
+@session_scoped
 async def typing(sid, data):
     try:
         room_id = data.get('room_id')
@@ -197,24 +305,18 @@ async def typing(sid, data):
             return
         
         # Get user_id from connection
-        user_id = manager.user_connections.get(sid)
+        user_id = manager.registry.user_of(sid)
         if not user_id:
             return
         
-        # Broadcast typing status to room
-        await manager.broadcast_to_room(
-            room_id,
-            {
-                'room_id': room_id,
-                'user_id': user_id,
-                'is_typing': is_typing
-            },
-            skip_sid=sid
-        )
-    except Exception as e:
-        print(f"Error handling typing status: {str(e)}")
+        # Only transitions count; the room hears about them in its next typing_users
+        typing_tracker.update(room_name(room_id), user_id, bool(is_typing))
+    except Exception:
+        logger.exception("Error handling typing status")
 
 @sio.event
+@event_budget(0)
+@session_scoped
 async def webrtc_signal(sid, data):
     try:
         target_user_id = data.get('target_user_id')
@@ -223,21 +325,14 @@ async def webrtc_signal(sid, data):
             return
         
         # Get user_id from connection
-        user_id = manager.user_connections.get(sid)
+        user_id = manager.registry.user_of(sid)
         if not user_id:
             return
         
-        # Find target user's connection
-        target_sid = None
-        for sid, uid in manager.user_connections.items():
-            if uid == target_user_id:
-                target_sid = sid
-                break
-        
-        if target_sid:
-            await sio.emit('webrtc_signal', {
-                'from_user_id': user_id,
-                'signal': signal
-            }, room=target_sid)
-    except Exception as e:
-        print(f"Error handling WebRTC signal: {str(e)}") 
\ No newline at end of file
+        # Every device of the target user, on whichever worker
+        await sio.emit('webrtc_signal', {
+            'from_user_id': user_id,
+            'signal': signal
+        }, room=user_room(target_user_id))
+    except Exception:
+        logger.exception("Error handling WebRTC signal") 
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import inspect
+import logging
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from dotenv import load_dotenv
+from ..services.user_cache import InvalidationChannel
+from ..utils.token_denylist import RevocationChannel
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# unset: single process; unix:///path/to.sock: local broker; redis://...: Redis
+SOCKETIO_MANAGER_URL = os.getenv("SOCKETIO_MANAGER_URL")
+CLUSTER_HEARTBEAT_INTERVAL = float(os.getenv("CLUSTER_HEARTBEAT_INTERVAL", "5"))
+
+# Pub/sub messages with this method are ours, not python-socketio's
+CLUSTER_METHOD = "lagfast.cluster"
+
+class ClusterBus:
+    """
+    Topic-based messages between the workers sharing a pub/sub manager.
+
+    Without a pub/sub manager (a single worker) publishing is a no-op.
+    Subscribers are called with ``(payload, host_id)`` and may be
+    coroutines; messages from this host are not delivered back to it.
+    """
+
+    def __init__(self):
+        self.manager: Optional[AsyncPubSubManager] = None
+        self._subscribers: Dict[str, List[Callable]] = defaultdict(list)
+
+    @property
+    def enabled(self) -> bool:
+        return self.manager is not None
+
+    @property
+    def host_id(self) -> str:
+        return self.manager.host_id if self.manager is not None else "local"
+
+    def bind(self, manager: AsyncPubSubManager):
+        self.manager = manager
+
+    def subscribe(self, topic: str, callback: Callable):
+        self._subscribers[topic].append(callback)
+
+    async def publish(self, topic: str, payload: dict):
+        if self.manager is None:
+            return
+        await self.manager._publish({
+            "method": CLUSTER_METHOD,
+            "topic": topic,
+            "payload": payload,
+            "host_id": self.host_id,
+        })
+
+    async def deliver(self, message: dict):
+        for callback in self._subscribers.get(message.get("topic"), ()):
+            try:
+                result = callback(message.get("payload") or {}, message.get("host_id"))
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Cluster subscriber for %s failed", message.get("topic"))
+
+cluster = ClusterBus()
+
+class ClusterMixin:
+    """
+    Adds cluster bus delivery to an ``AsyncPubSubManager`` subclass.
+
+    Cluster messages travel on the same channel as Socket.IO's own and are
+    filtered out of ``_listen`` before python-socketio sees them.
+    """
+
+    async def _listen(self):
+        async for message in super()._listen():
+            data = message
+            if not isinstance(data, dict):
+                try:
+                    data = self.json.loads(message)
+                except Exception:
+                    yield message
+                    continue
+            if isinstance(data, dict) and data.get("method") == CLUSTER_METHOD:
+                if data.get("host_id") != self.host_id:
+                    await cluster.deliver(data)
+                continue
+            yield message
+
+class RedisClusterManager(ClusterMixin, socketio.AsyncRedisManager):
+    pass
+
+def create_client_manager(url: Optional[str] = SOCKETIO_MANAGER_URL) -> Optional[socketio.AsyncManager]:
+    """
+    Build the Socket.IO client manager for ``SOCKETIO_MANAGER_URL``.
+
+    Returns:
+        A pub/sub manager bound to ``cluster``, or None for the default
+        in-process manager
+    """
+    if not url:
+        return None
+    if url.startswith("unix://"):
+        from .broker import UnixSocketManager
+        manager = UnixSocketManager(url)
+    elif url.startswith(("redis://", "rediss://", "redis+sentinel://")):
+        manager = RedisClusterManager(url)
+    else:
+        raise ValueError(f"Unsupported SOCKETIO_MANAGER_URL '{url}'")
+    cluster.bind(manager)
+    return manager
+
+class ClusterInvalidationChannel(InvalidationChannel):
+    """Sends user cache invalidations to the other workers over the cluster bus."""
+
+    def __init__(self, bus: ClusterBus):
+        super().__init__()
+        self.bus = bus
+        self._pending: Set[asyncio.Task] = set()
+        bus.subscribe("user_invalidate", lambda payload, host_id: self.deliver(payload["user_id"]))
+
+    def publish(self, user_id: int):
+        task = asyncio.get_running_loop().create_task(
+            self.bus.publish("user_invalidate", {"user_id": user_id})
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+class ClusterRevocationChannel(RevocationChannel):
+    """Sends token revocations to the other workers over the cluster bus."""
+
+    def __init__(self, bus: ClusterBus):
+        super().__init__()
+        self.bus = bus
+        self._pending: Set[asyncio.Task] = set()
+        bus.subscribe(
+            "token_revoke",
+            lambda payload, host_id: self.deliver(payload["user_id"], payload["version"]),
+        )
+
+    def publish(self, user_id: int, version: int):
+        task = asyncio.get_running_loop().create_task(
+            self.bus.publish("token_revoke", {"user_id": user_id, "version": version})
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
@@ -0,0 +1,25 @@
+import time
+from ..utils.metrics import METRICS_ENABLED, socketio_errors, socketio_events, socketio_latency
+from .outbound import BackpressureServer
+
+class InstrumentedServer(BackpressureServer):
+    """
+    Socket.IO server that counts and times every event handler call.
+
+    Events without a registered handler share the ``unhandled`` label,
+    so clients can't create new series by sending made-up event names.
+    """
+
+    async def _trigger_event(self, event, namespace, *args):
+        if not METRICS_ENABLED:
+            return await super()._trigger_event(event, namespace, *args)
+        label = (event if event in self.handlers.get(namespace, ()) else "unhandled",)
+        socketio_events.inc(label)
+        started = time.perf_counter()
+        try:
+            return await super()._trigger_event(event, namespace, *args)
+        except Exception:
+            socketio_errors.inc(label)
+            raise
+        finally:
+            socketio_latency.observe(label, time.perf_counter() - started)
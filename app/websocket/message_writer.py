@@ -0,0 +1,196 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Optional
+from sqlalchemy import insert
+from dotenv import load_dotenv
+from ..models.chat import ChatMessage
+from ..utils.database import AsyncSessionLocal, replicas
+from ..utils.replicas import user_key
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_QUEUE_SIZE = int(os.getenv("MESSAGE_QUEUE_SIZE", "10000"))
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", "500"))
+# Longest a message waits for more company before its batch is committed
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.02"))
+# How long a sender waits for queue space before the message is rejected
+MESSAGE_ENQUEUE_TIMEOUT = float(os.getenv("MESSAGE_ENQUEUE_TIMEOUT", "1.0"))
+# Broadcast as soon as a message is queued instead of after it is committed
+BROADCAST_BEFORE_COMMIT = os.getenv("BROADCAST_BEFORE_COMMIT", "false").lower() in ("1", "true", "yes")
+
+class MessageQueueFull(Exception):
+    pass
+
+class MessageWriterStopped(Exception):
+    pass
+
+class MessageWriteFailed(Exception):
+    """Set on the commit futures of a batch whose insert failed."""
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    Handlers put rows on a bounded asyncio queue; a single writer task
+    drains it and inserts each batch with one INSERT and one COMMIT
+    (group commit). A batch is flushed once it reaches ``batch_size`` rows
+    or ``flush_interval`` seconds after its first row, whichever is first.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        queue_size: int = MESSAGE_QUEUE_SIZE,
+        batch_size: int = MESSAGE_BATCH_SIZE,
+        flush_interval: float = MESSAGE_FLUSH_INTERVAL,
+        enqueue_timeout: float = MESSAGE_ENQUEUE_TIMEOUT,
+        broadcast_before_commit: bool = BROADCAST_BEFORE_COMMIT,
+    ):
+        self.session_factory = session_factory
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.broadcast_before_commit = broadcast_before_commit
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+        self.written = 0
+        self.failed = 0
+        self.retried_batches = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Run in a fresh context so the writer isn't tied to the request or
+        # socket event that happened to start it (see session_tracking)
+        self._task = contextvars.Context().run(asyncio.create_task, self._run())
+
+    async def submit(self, row: dict, wait: Optional[bool] = None) -> Optional[asyncio.Future]:
+        """
+        Queue a chat message row for insertion.
+
+        Args:
+            row: Column values for ``ChatMessage``
+            wait: Return a future that resolves once the row is committed.
+                Defaults to ``not broadcast_before_commit``.
+
+        Returns:
+            The commit future, or None when not waiting
+
+        Raises:
+            MessageQueueFull: If no queue space freed up within ``enqueue_timeout``
+            MessageWriterStopped: If ``stop()`` was called
+        """
+        if self._stopped:
+            raise MessageWriterStopped("Message writer is stopped")
+        self.start()
+        if wait is None:
+            wait = not self.broadcast_before_commit
+        future = asyncio.get_running_loop().create_future() if wait else None
+        try:
+            await asyncio.wait_for(self._queue.put((row, future)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise MessageQueueFull("Message queue is full")
+        return future
+
+    async def stop(self):
+        """Flush everything queued so far and stop the writer for good."""
+        self._stopped = True
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _insert(self, rows: list):
+        async with self.session_factory() as db:
+            await db.execute(insert(ChatMessage), rows)
+            await db.commit()
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            await self._insert([row for row, _ in batch])
+            saved = batch
+        except Exception:
+            # Retry row by row, so a bad message only fails its own sender
+            logger.warning("Failed to persist %d chat messages at once, retrying one by one",
+                           len(batch), exc_info=True)
+            self.retried_batches += 1
+            saved = []
+            for row, future in batch:
+                try:
+                    await self._insert([row])
+                except Exception as e:
+                    self.failed += 1
+                    logger.exception("Failed to persist a chat message from user %s", row.get("sender_id"))
+                    if future is not None and not future.done():
+                        error = MessageWriteFailed("Message could not be saved")
+                        error.__cause__ = e
+                        future.set_exception(error)
+                else:
+                    saved.append((row, future))
+        if saved:
+            # Senders read their own messages from the primary for a while
+            replicas.mark_written({user_key(row["sender_id"]) for row, _ in saved})
+        self.written += len(saved)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_flush_seconds = time.perf_counter() - started
+        for _, future in saved:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "written": self.written,
+            "failed": self.failed,
+            "retried_batches": self.retried_batches,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": self.last_flush_seconds * 1000,
+            "broadcast_before_commit": self.broadcast_before_commit,
+        }
+
+message_writer = MessageWriter()
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+import socketio
+from dotenv import load_dotenv
+from engineio import packet as eio_packet
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+def connection_key(sid: Optional[str]) -> Optional[str]:
+    """
+    Short stable id of a Socket.IO connection for stats.
+
+    Session ids are never reported as is: an Engine.IO sid is enough to
+    hijack a long-polling session.
+    """
+    if sid is None:
+        return None
+    return hashlib.sha256(sid.encode()).hexdigest()[:12]
+
+# Packets queued for one connection before it is disconnected as too slow
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "1000"))
+# Above this depth typing updates and presence deltas are dropped
+OUTBOUND_SOFT_LIMIT = int(os.getenv("OUTBOUND_SOFT_LIMIT", "100"))
+# Packets allowed in Engine.IO's own queue before we hold the rest back
+OUTBOUND_EIO_WINDOW = int(os.getenv("OUTBOUND_EIO_WINDOW", "16"))
+
+CONTROL, CHAT, PRESENCE, TYPING = range(4)
+CLASS_NAMES = ("control", "chat", "presence", "typing")
+
+EVENT_CLASSES = {
+    'presence_delta': PRESENCE,
+    'presence_snapshot': PRESENCE,
+    'user_joined_room': PRESENCE,
+    'user_left_room': PRESENCE,
+    'typing_users': TYPING,
+}
+# Events carrying full state; a newer one for the same room replaces a queued one
+COALESCED_EVENTS = {'presence_snapshot', 'typing_users'}
+# Events a client can recover from losing (presence_delta: via the version gap)
+DROPPABLE_EVENTS = {'presence_delta', 'typing_users'}
+
+class Classified:
+    """Priority class and coalescing key of an outgoing Engine.IO packet."""
+    __slots__ = ("priority", "event", "key")
+
+    def __init__(self, priority: int, event: Optional[str] = None, key=None):
+        self.priority = priority
+        self.event = event
+        self.key = key
+
+def classify(pkt: eio_packet.Packet) -> Classified:
+    """
+    Work out the class of a packet from its Socket.IO event name.
+
+    Emits to a room share one packet object between recipients, so the
+    result is cached on the packet.
+    """
+    cached = getattr(pkt, "_outbound_class", None)
+    if cached is not None:
+        return cached
+    data = pkt.data
+    result = Classified(CHAT)
+    if isinstance(data, str) and data[:1] == '2':
+        start = data.find('[')
+        if start != -1 and data[start + 1:start + 2] == '"':
+            event = data[start + 2:data.find('"', start + 2)]
+            result = Classified(EVENT_CLASSES.get(event, CHAT), event)
+            if event in COALESCED_EVENTS:
+                try:
+                    payload = json.loads(data[start:])[1]
+                    result.key = (event, payload.get('room_id'))
+                except (ValueError, IndexError, AttributeError):
+                    pass
+    elif isinstance(data, str) and data[:1] in ('0', '1', '3', '4'):
+        result = Classified(CONTROL)
+    pkt._outbound_class = result
+    return result
+
+class OutboundQueue:
+    """
+    Bounded priority queue of packets waiting to go to one connection.
+
+    Classes are served strictly in order: control, chat, presence,
+    typing. A full-state event replaces a queued one for the same room in
+    place; droppable events are refused above ``soft_limit``.
+    """
+
+    def __init__(self, soft_limit: int = OUTBOUND_SOFT_LIMIT):
+        self.soft_limit = soft_limit
+        self._queues: List[Deque[list]] = [deque() for _ in CLASS_NAMES]
+        self._coalesce: Dict[tuple, list] = {}
+        self.depth = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def put(self, pkt: eio_packet.Packet) -> bool:
+        """
+        Returns:
+            bool: False if the packet was dropped
+        """
+        info = classify(pkt)
+        if info.key is not None:
+            entry = self._coalesce.get(info.key)
+            if entry is not None:
+                entry[0] = pkt
+                self.coalesced += 1
+                return True
+        if info.event in DROPPABLE_EVENTS and self.depth >= self.soft_limit:
+            self.dropped += 1
+            return False
+        entry = [pkt, info.key]
+        self._queues[info.priority].append(entry)
+        if info.key is not None:
+            self._coalesce[info.key] = entry
+        self.depth += 1
+        return True
+
+    def get(self) -> Optional[eio_packet.Packet]:
+        for queue in self._queues:
+            if queue:
+                pkt, key = queue.popleft()
+                if key is not None:
+                    del self._coalesce[key]
+                self.depth -= 1
+                return pkt
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "by_class": {name: len(q) for name, q in zip(CLASS_NAMES, self._queues)},
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+class BackpressureServer(socketio.AsyncServer):
+    """
+    Socket.IO server with a bounded outbound queue per connection.
+
+    Packets go straight to Engine.IO while its queue for the connection
+    holds fewer than ``eio_window`` packets. Beyond that they wait in an
+    ``OutboundQueue`` drained by a task per connection as the client keeps
+    up. A connection whose queue reaches ``high_water`` is disconnected.
+
+    This overrides private python-socketio/engineio methods, so
+    requirements.txt pins the versions it was verified against.
+    """
+
+    def __init__(self, *args, high_water: int = OUTBOUND_QUEUE_SIZE,
+                 soft_limit: int = OUTBOUND_SOFT_LIMIT, eio_window: int = OUTBOUND_EIO_WINDOW, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.high_water = high_water
+        self.soft_limit = soft_limit
+        self.eio_window = eio_window
+        self._outbound: Dict[str, OutboundQueue] = {}
+        self.slow_disconnects = 0
+        self.dropped = 0
+
+    def _eio_backlog(self, eio_sid: str) -> Optional[int]:
+        socket = self.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else None
+
+    async def _send_packet(self, eio_sid, pkt):
+        # Connect/disconnect/ack packets take the same route as events
+        encoded_packet = pkt.encode()
+        if not isinstance(encoded_packet, list):
+            encoded_packet = [encoded_packet]
+        for ep in encoded_packet:
+            await self._send_eio_packet(eio_sid, eio_packet.Packet(eio_packet.MESSAGE, ep))
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        queue = self._outbound.get(eio_sid)
+        if queue is None or not queue.depth:
+            backlog = self._eio_backlog(eio_sid)
+            if backlog is None:
+                return
+            if backlog < self.eio_window:
+                await super()._send_eio_packet(eio_sid, eio_pkt)
+                return
+            if queue is None:
+                queue = self._outbound[eio_sid] = OutboundQueue(self.soft_limit)
+
+        if not queue.put(eio_pkt):
+            self.dropped += 1
+            return
+        if queue.depth >= self.high_water:
+            self._disconnect_slow(eio_sid)
+            return
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._drain(eio_sid, queue))
+
+    async def _drain(self, eio_sid: str, queue: OutboundQueue):
+        delay = 0.005
+        try:
+            while queue.depth:
+                backlog = self._eio_backlog(eio_sid)
+                if backlog is None:
+                    return
+                if backlog >= self.eio_window:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.1)
+                    continue
+                delay = 0.005
+                while queue.depth and backlog < self.eio_window:
+                    await super()._send_eio_packet(eio_sid, queue.get())
+                    queue.sent += 1
+                    backlog += 1
+        finally:
+            queue.task = None
+
+    def _disconnect_slow(self, eio_sid: str):
+        queue = self._outbound.pop(eio_sid, None)
+        if queue is None:
+            return
+        self.slow_disconnects += 1
+        if queue.task is not None:
+            queue.task.cancel()
+        logger.warning(
+            "Disconnecting %s: %d packets queued",
+            connection_key(self.manager.sid_from_eio_sid(eio_sid, '/')), queue.depth,
+        )
+        asyncio.ensure_future(self.eio.disconnect(eio_sid))
+
+    async def _handle_eio_disconnect(self, eio_sid, reason):
+        queue = self._outbound.pop(eio_sid, None)
+        if queue is not None and queue.task is not None:
+            queue.task.cancel()
+        await super()._handle_eio_disconnect(eio_sid, reason)
+
+    def outbound_stats(self, limit: int = 20) -> dict:
+        """Totals plus the ``limit`` connections with the deepest queues."""
+        deepest = sorted(self._outbound.items(), key=lambda item: item[1].depth, reverse=True)[:limit]
+        return {
+            "queued_connections": len(self._outbound),
+            "queued_packets": sum(q.depth for q in self._outbound.values()),
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "high_water": self.high_water,
+            "soft_limit": self.soft_limit,
+            "connections": [
+                {"connection": connection_key(self.manager.sid_from_eio_sid(eio_sid, '/')), **queue.stats()}
+                for eio_sid, queue in deepest
+            ],
+        }
+
+    def connection_stats(self, sid: str) -> Optional[dict]:
+        """Queue depth of one Socket.IO connection, or None if unknown."""
+        eio_sid = self.manager.eio_sid_from_sid(sid, '/')
+        if eio_sid is None:
+            return None
+        queue = self._outbound.get(eio_sid)
+        return {
+            "connection": connection_key(sid),
+            "engineio_backlog": self._eio_backlog(eio_sid),
+            **(queue.stats() if queue is not None else OutboundQueue().stats()),
+        }
@@ -0,0 +1,299 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import socketio
+from dotenv import load_dotenv
+from .cluster import CLUSTER_HEARTBEAT_INTERVAL, ClusterBus
+from .registry import ConnectionRegistry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# global: every client hears about every user; room: only room members do
+PRESENCE_SCOPE = os.getenv("PRESENCE_SCOPE", "global")
+# Seconds presence changes are collected before one presence_delta goes out
+PRESENCE_TICK = float(os.getenv("PRESENCE_TICK", "0.25"))
+
+# Presence key of the global scope; room scopes use the Socket.IO room name
+GLOBAL = "*"
+
+class PresenceEngine:
+    """
+    Coalesced, versioned presence.
+
+    Presence is kept per key: ``GLOBAL`` (who is online) or a room name
+    (who is in the room). Changes are collected for ``tick`` seconds and
+    then sent as one ``presence_delta`` per key to this worker's clients,
+    so N users reconnecting within a tick cost each client one event
+    instead of N. A user who leaves and comes back within a tick produces
+    nothing.
+
+    Each key has a version that goes up by one with every delta this
+    worker sends for it. A client that sees a gap, or reconnects, asks for
+    a ``presence_snapshot`` and applies deltas from its version on.
+
+    With a cluster bus, local changes are published to the other workers
+    once per tick and their state is mirrored here (full state on start-up
+    and every heartbeat, changes in between); a host that misses three
+    heartbeats or that the broker reports as gone is dropped.
+    """
+
+    def __init__(self, sio: socketio.AsyncServer, registry: ConnectionRegistry, bus: ClusterBus,
+                 scope: str = PRESENCE_SCOPE, tick: float = PRESENCE_TICK,
+                 heartbeat: float = CLUSTER_HEARTBEAT_INTERVAL):
+        if scope not in ("global", "room"):
+            raise ValueError(f"Unknown PRESENCE_SCOPE '{scope}'")
+        self.sio = sio
+        self.registry = registry
+        self.bus = bus
+        self.scope = scope
+        self.tick = tick
+        self.heartbeat = heartbeat
+        # key -> user -> whether clients last saw the user as present
+        self._pending: Dict[str, Dict[int, bool]] = {}
+        # key -> users whose local state changed since the last publish
+        self._outbox: Dict[str, Set[int]] = {}
+        self._versions: Dict[str, int] = {}
+        self._snapshots: Dict[str, Tuple[int, list]] = {}
+        # Keys with a snapshot built since the last flush
+        self._served: Set[str] = set()
+        # host -> (key -> users, last seen)
+        self._hosts: Dict[str, Tuple[Dict[str, Set[int]], float]] = {}
+        self._dirty: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.changes = 0
+        self.deltas = 0
+        self.flushes = 0
+        bus.subscribe("presence_hello", self._on_hello)
+        bus.subscribe("presence_state", self._on_state)
+        bus.subscribe("presence_delta", self._on_delta)
+        bus.subscribe("host_down", self._on_host_down)
+
+    def _local(self, key: str) -> Iterable[int]:
+        if key == GLOBAL:
+            return self.registry.online_users()
+        return self.registry.room_members(key)
+
+    def _is_local(self, key: str, user_id: int) -> bool:
+        if key == GLOBAL:
+            return self.registry.is_online(user_id)
+        return user_id in self.registry.room_members(key)
+
+    def _is_remote(self, key: str, user_id: int) -> bool:
+        return any(user_id in state.get(key, ()) for state, _ in self._hosts.values())
+
+    def is_present(self, key: str, user_id: int) -> bool:
+        return self._is_local(key, user_id) or self._is_remote(key, user_id)
+
+    def members(self, key: str) -> Set[int]:
+        users = set(self._local(key))
+        for state, _ in self._hosts.values():
+            users.update(state.get(key, ()))
+        return users
+
+    def _changed(self, key: str, user_id: int, was_present: bool):
+        self._pending.setdefault(key, {}).setdefault(user_id, was_present)
+        self.changes += 1
+        if self._dirty is not None:
+            self._dirty.set()
+
+    def _local_changed(self, key: str, user_id: int, was_local: bool):
+        """Record a change to this worker's own state for ``key``."""
+        self._changed(key, user_id, was_local or self._is_remote(key, user_id))
+        if self.bus.enabled:
+            self._outbox.setdefault(key, set()).add(user_id)
+
+    def user_online(self, user_id: int):
+        """Call after a user's first connection on this worker was registered."""
+        if self.scope == "global":
+            self._local_changed(GLOBAL, user_id, False)
+
+    def user_offline(self, user_id: int):
+        """Call after a user's last connection on this worker was removed."""
+        if self.scope == "global":
+            self._local_changed(GLOBAL, user_id, True)
+
+    def room_joined(self, room: str, user_id: int):
+        """Call after a user's first device joined ``room`` on this worker."""
+        if self.scope == "room":
+            self._local_changed(room, user_id, False)
+
+    def room_left(self, room: str, user_id: int):
+        """Call after a user's last device left ``room`` on this worker."""
+        if self.scope == "room":
+            self._local_changed(room, user_id, True)
+
+    def snapshot(self, key: str = GLOBAL) -> dict:
+        """
+        Everyone present under ``key`` with the version it corresponds to.
+
+        The member list is computed once per version, so a connect storm
+        shares one list between all the clients asking within a tick.
+        Changes still pending may already be included, so the next delta
+        for the key states every pending user exactly (see ``flush``).
+        """
+        version = self._versions.get(key, 0)
+        cached = self._snapshots.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, list(self.members(key)))
+            self._snapshots[key] = cached
+            self._served.add(key)
+        payload = {'version': version, 'users': cached[1]}
+        if key != GLOBAL:
+            payload['room_id'] = key.split(':', 1)[1]
+        return payload
+
+    async def flush(self):
+        """Send one presence_delta per changed key and publish local changes."""
+        self.flushes += 1
+        if self._outbox:
+            outbox, self._outbox = self._outbox, {}
+            changes = {}
+            for key, users in outbox.items():
+                online = [u for u in users if self._is_local(key, u)]
+                offline = [u for u in users if not self._is_local(key, u)]
+                changes[key] = {"online": online, "offline": offline}
+            await self.bus.publish("presence_delta", {"changes": changes})
+
+        pending, self._pending = self._pending, {}
+        served, self._served = self._served, set()
+        for key, users in pending.items():
+            # A snapshot taken mid-tick may hold changes that have since
+            # been undone, so state those users too, not just transitions
+            exact = key in served
+            online, offline = [], []
+            for user_id, was_present in users.items():
+                present = self.is_present(key, user_id)
+                if present and (exact or not was_present):
+                    online.append(user_id)
+                elif not present and (exact or was_present):
+                    offline.append(user_id)
+            if not online and not offline:
+                continue
+            version = self._versions.get(key, 0) + 1
+            self._versions[key] = version
+            payload = {'version': version, 'online': online, 'offline': offline}
+            room = None
+            if key != GLOBAL:
+                payload['room_id'] = key.split(':', 1)[1]
+                room = key
+            self.deltas += 1
+            # Every worker versions and sends deltas to its own clients
+            await self.sio.emit('presence_delta', payload, room=room, ignore_queue=True)
+
+    async def _run_ticks(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.tick)
+            self._dirty.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Presence flush failed")
+
+    async def _run_heartbeats(self):
+        await self.bus.publish("presence_hello", {})
+        while True:
+            await self.announce()
+            await asyncio.sleep(self.heartbeat)
+            self._expire_hosts()
+
+    async def announce(self):
+        keys = [GLOBAL] if self.scope == "global" else list(self.registry.rooms())
+        await self.bus.publish("presence_state", {
+            "state": {key: list(self._local(key)) for key in keys},
+        })
+
+    def _expire_hosts(self):
+        deadline = time.monotonic() - 3 * self.heartbeat
+        for host_id, (_, seen) in list(self._hosts.items()):
+            if seen < deadline:
+                self._drop_host(host_id)
+
+    def _drop_host(self, host_id: str):
+        state, _ = self._hosts.get(host_id, ({}, 0.0))
+        for key, users in state.items():
+            for user_id in users:
+                self._changed(key, user_id, self.is_present(key, user_id))
+        self._hosts.pop(host_id, None)
+
+    def _apply(self, host_id: str, key: str, user_id: int, present: bool):
+        state = self._hosts[host_id][0]
+        users = state.setdefault(key, set())
+        if (user_id in users) == present:
+            return
+        self._changed(key, user_id, self.is_present(key, user_id))
+        if present:
+            users.add(user_id)
+        else:
+            users.discard(user_id)
+            if not users:
+                del state[key]
+
+    def _touch(self, host_id: str):
+        state, _ = self._hosts.get(host_id, ({}, 0.0))
+        self._hosts[host_id] = (state, time.monotonic())
+
+    async def _on_hello(self, payload: dict, host_id: str):
+        await self.announce()
+
+    def _on_state(self, payload: dict, host_id: str):
+        self._touch(host_id)
+        state = self._hosts[host_id][0]
+        incoming = {key: set(users) for key, users in payload.get("state", {}).items()}
+        for key in set(state) | set(incoming):
+            current = state.get(key, set())
+            new = incoming.get(key, set())
+            for user_id in new - current:
+                self._apply(host_id, key, user_id, True)
+            for user_id in current - new:
+                self._apply(host_id, key, user_id, False)
+
+    def _on_delta(self, payload: dict, host_id: str):
+        self._touch(host_id)
+        for key, change in payload.get("changes", {}).items():
+            for user_id in change.get("online", ()):
+                self._apply(host_id, key, user_id, True)
+            for user_id in change.get("offline", ()):
+                self._apply(host_id, key, user_id, False)
+
+    def _on_host_down(self, payload: dict, host_id: str):
+        self._drop_host(payload.get("host_id"))
+
+    def start(self):
+        if self._tasks:
+            return
+        self._dirty = asyncio.Event()
+        if self._pending:
+            self._dirty.set()
+        # Fresh context: not tied to the request that happened to start us
+        context = contextvars.Context()
+        self._tasks.append(context.run(asyncio.create_task, self._run_ticks()))
+        if self.bus.enabled:
+            self._tasks.append(context.run(asyncio.create_task, self._run_heartbeats()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._dirty = None
+
+    def stats(self) -> dict:
+        return {
+            "scope": self.scope,
+            "tick_s": self.tick,
+            "changes": self.changes,
+            "deltas": self.deltas,
+            "flushes": self.flushes,
+            "pending_keys": len(self._pending),
+            "remote_hosts": len(self._hosts),
+        }
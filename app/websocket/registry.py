@@ -0,0 +1,143 @@
+import sys
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+class ConnectionRegistry:
+    """
+    Indexes of this worker's Socket.IO connections.
+
+    Keeps sid -> user, user -> sids, sid -> rooms, room -> user -> device
+    count and user -> rooms, so every lookup and update is O(1) in the
+    number of connections and cleanup on disconnect only touches the rooms
+    the sid had joined. A sid or user is in a handful of rooms, so those
+    are tuples rather than sets, and rooms count devices instead of holding
+    a set of sids per member. Rooms are keyed by their Socket.IO room name.
+    """
+
+    __slots__ = ("_sid_user", "_user_sids", "_sid_rooms", "_room_members", "_user_rooms")
+
+    def __init__(self):
+        self._sid_user: Dict[str, int] = {}
+        self._user_sids: Dict[int, Set[str]] = {}
+        self._sid_rooms: Dict[str, Tuple[str, ...]] = {}
+        self._room_members: Dict[str, Dict[int, int]] = {}
+        self._user_rooms: Dict[int, Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sid_user)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._sid_user
+
+    def add(self, sid: str, user_id: int) -> bool:
+        """
+        Register a connection.
+
+        Returns:
+            bool: True if this is the user's first connection on this worker
+        """
+        self._sid_user[sid] = user_id
+        sids = self._user_sids.get(user_id)
+        if sids is None:
+            self._user_sids[user_id] = {sid}
+            return True
+        sids.add(sid)
+        return False
+
+    def remove(self, sid: str) -> Tuple[Optional[int], bool, List[str]]:
+        """
+        Forget a connection and its room memberships.
+
+        Returns:
+            The user id (None if unknown), whether that was the user's last
+            connection, and the rooms the user no longer has any device in
+        """
+        user_id = self._sid_user.get(sid)
+        if user_id is None:
+            return None, False, []
+        rooms_left = [room for room in self._sid_rooms.get(sid, ()) if self.leave(sid, room)]
+        self._sid_rooms.pop(sid, None)
+        del self._sid_user[sid]
+        sids = self._user_sids[user_id]
+        sids.discard(sid)
+        if sids:
+            return user_id, False, rooms_left
+        del self._user_sids[user_id]
+        return user_id, True, rooms_left
+
+    def join(self, sid: str, room: str) -> bool:
+        """
+        Add a connection to a room.
+
+        Returns:
+            bool: True if the user was not in the room on any device
+        """
+        user_id = self._sid_user.get(sid)
+        if user_id is None:
+            return False
+        rooms = self._sid_rooms.get(sid, ())
+        if room in rooms:
+            return False
+        room = sys.intern(room)
+        self._sid_rooms[sid] = rooms + (room,)
+        members = self._room_members.setdefault(room, {})
+        devices = members.get(user_id, 0) + 1
+        members[user_id] = devices
+        if devices > 1:
+            return False
+        self._user_rooms[user_id] = self._user_rooms.get(user_id, ()) + (room,)
+        return True
+
+    def leave(self, sid: str, room: str) -> bool:
+        """
+        Remove a connection from a room.
+
+        Returns:
+            bool: True if that was the user's last device in the room
+        """
+        rooms = self._sid_rooms.get(sid, ())
+        if room not in rooms:
+            return False
+        self._sid_rooms[sid] = tuple(r for r in rooms if r != room)
+        user_id = self._sid_user[sid]
+        members = self._room_members[room]
+        devices = members[user_id] - 1
+        if devices:
+            members[user_id] = devices
+            return False
+        del members[user_id]
+        if not members:
+            del self._room_members[room]
+        user_rooms = tuple(r for r in self._user_rooms[user_id] if r != room)
+        if user_rooms:
+            self._user_rooms[user_id] = user_rooms
+        else:
+            del self._user_rooms[user_id]
+        return True
+
+    def user_of(self, sid: str) -> Optional[int]:
+        return self._sid_user.get(sid)
+
+    def sids_of(self, user_id: int) -> Set[str]:
+        return self._user_sids.get(user_id, set())
+
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self._user_sids
+
+    def online_users(self) -> Iterable[int]:
+        return self._user_sids.keys()
+
+    def room_members(self, room: str) -> Iterable[int]:
+        return self._room_members.get(room, {}).keys()
+
+    def rooms(self) -> Iterable[str]:
+        return self._room_members.keys()
+
+    def rooms_of(self, user_id: int) -> Iterable[str]:
+        return self._user_rooms.get(user_id, ())
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self._sid_user),
+            "users": len(self._user_sids),
+            "rooms": len(self._room_members),
+        }
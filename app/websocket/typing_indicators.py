@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+import socketio
+from dotenv import load_dotenv
+from .cluster import ClusterBus
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a typing event after which a user stops typing
+TYPING_TIMEOUT = float(os.getenv("TYPING_TIMEOUT", "5"))
+# Seconds between typing_users updates for a room
+TYPING_INTERVAL = float(os.getenv("TYPING_INTERVAL", "0.5"))
+
+class TypingTracker:
+    """
+    Server-side typing state per (room, user).
+
+    Clients send ``typing`` on every keystroke; only transitions between
+    typing and not typing change the state, and a user who stops sending
+    events stops typing after ``timeout`` seconds. Every ``interval``
+    seconds each room whose state changed gets one ``typing_users`` event
+    listing everyone typing in it.
+
+    With a cluster bus, each worker publishes the full list of its own
+    typers for every changed room once per interval and mirrors the other
+    workers' lists, so each worker can send its clients the whole room.
+    """
+
+    def __init__(self, sio: socketio.AsyncServer, bus: ClusterBus,
+                 timeout: float = TYPING_TIMEOUT, interval: float = TYPING_INTERVAL):
+        self.sio = sio
+        self.bus = bus
+        self.timeout = timeout
+        self.interval = interval
+        # room -> user -> expiry (monotonic)
+        self._typing: Dict[str, Dict[int, float]] = {}
+        # host -> room -> users
+        self._remote: Dict[str, Dict[str, Set[int]]] = {}
+        self._dirty: Set[str] = set()
+        self._publish: Set[str] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.suppressed = 0
+        self.transitions = 0
+        self.expired = 0
+        self.updates = 0
+        bus.subscribe("typing", self._on_remote)
+        bus.subscribe("host_down", self._on_host_down)
+
+    def _changed(self, room: str):
+        self._dirty.add(room)
+        self._publish.add(room)
+        self.transitions += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    def update(self, room: str, user_id: int, is_typing: bool) -> bool:
+        """
+        Apply a typing event from a client.
+
+        Returns:
+            bool: True if it changed the user's state in the room
+        """
+        self.received += 1
+        users = self._typing.get(room)
+        if is_typing:
+            if users is not None and user_id in users:
+                users[user_id] = time.monotonic() + self.timeout
+                self.suppressed += 1
+                return False
+            self._typing.setdefault(room, {})[user_id] = time.monotonic() + self.timeout
+        else:
+            if users is None or user_id not in users:
+                self.suppressed += 1
+                return False
+            self._remove(room, user_id)
+        self._changed(room)
+        return True
+
+    def clear(self, room: str, user_id: int):
+        """Stop a user typing in a room they left."""
+        users = self._typing.get(room)
+        if users is not None and user_id in users:
+            self._remove(room, user_id)
+            self._changed(room)
+
+    def _remove(self, room: str, user_id: int):
+        users = self._typing[room]
+        del users[user_id]
+        if not users:
+            del self._typing[room]
+
+    def typing_users(self, room: str) -> List[int]:
+        users = set(self._typing.get(room, ()))
+        for rooms in self._remote.values():
+            users.update(rooms.get(room, ()))
+        return list(users)
+
+    def _expire(self):
+        now = time.monotonic()
+        for room, users in list(self._typing.items()):
+            for user_id, expires_at in list(users.items()):
+                if expires_at <= now:
+                    self._remove(room, user_id)
+                    self.expired += 1
+                    self._dirty.add(room)
+                    self._publish.add(room)
+
+    async def flush(self):
+        """Expire idle typers and send one typing_users per changed room."""
+        self._expire()
+        if self._publish:
+            publish, self._publish = self._publish, set()
+            await self.bus.publish("typing", {
+                "rooms": {room: list(self._typing.get(room, ())) for room in publish},
+            })
+        dirty, self._dirty = self._dirty, set()
+        for room in dirty:
+            self.updates += 1
+            # Every worker sends the merged list to its own clients
+            await self.sio.emit('typing_users', {
+                'room_id': room.split(':', 1)[1],
+                'user_ids': self.typing_users(room),
+            }, room=room, ignore_queue=True)
+
+    def _on_remote(self, payload: dict, host_id: str):
+        rooms = self._remote.setdefault(host_id, {})
+        for room, users in payload.get("rooms", {}).items():
+            if users:
+                rooms[room] = set(users)
+            else:
+                rooms.pop(room, None)
+            self._dirty.add(room)
+        if self._wake is not None:
+            self._wake.set()
+
+    def _on_host_down(self, payload: dict, host_id: str):
+        rooms = self._remote.pop(payload.get("host_id"), {})
+        self._dirty.update(rooms)
+        if rooms and self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.interval)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Typing flush failed")
+            # Keep ticking while anyone is typing so expiries go out
+            if self._typing:
+                self._wake.set()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        if self._dirty or self._typing:
+            self._wake.set()
+        self._task = contextvars.Context().run(asyncio.create_task, self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wake = None
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "suppressed": self.suppressed,
+            "transitions": self.transitions,
+            "expired": self.expired,
+            "updates_sent": self.updates,
+            "typing_rooms": len(self._typing),
+        }
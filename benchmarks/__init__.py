@@ -0,0 +1,5 @@
+"""
+Standalone benchmarks for the LabFast API.
+
+Run them from the repository root, e.g. ``python -m benchmarks.event_loop_latency``.
+"""
@@ -0,0 +1,98 @@
+"""
+Chat history latency as the messages table grows.
+
+Seeds the table in steps up to ``--messages`` rows and, at each step,
+times the keyset history queries (latest page, a page deep in the past,
+a conversation page) against loading a whole room the way the old
+``get_messages`` did (``.all()`` ordered by timestamp).
+
+    python -m benchmarks.chat_history --messages 2000000 --steps 3
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+from sqlalchemy import select  # noqa: E402
+
+from app.models.chat import ChatMessage  # noqa: E402
+from app.services.chat_service import ChatService  # noqa: E402
+from app.utils.database import AsyncSessionLocal, async_engine  # noqa: E402
+
+from .seed import prepare_schema, seed_messages, seed_users  # noqa: E402
+
+ROOM_ID = 1
+
+async def timed(samples: list, coro_factory, repeat: int):
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append(time.perf_counter() - started)
+
+async def measure(total: int, repeat: int, full_load_limit: int) -> dict:
+    async with AsyncSessionLocal() as db:
+        latest = await ChatService.get_room_history(db, ROOM_ID, limit=50)
+        # A cursor roughly in the middle of the room's history
+        middle = latest
+        for _ in range(3):
+            if middle["next_before"] is None:
+                break
+            middle = await ChatService.get_room_history(db, ROOM_ID, before=middle["next_before"], limit=500)
+
+        results = {}
+        samples: list = []
+        await timed(samples, lambda: ChatService.get_room_history(db, ROOM_ID, limit=50), repeat)
+        results["room_latest_page"] = summarize(samples)
+
+        samples = []
+        await timed(samples, lambda: ChatService.get_room_history(
+            db, ROOM_ID, before=middle["next_before"], limit=50), repeat)
+        results["room_before_page"] = summarize(samples)
+
+        samples = []
+        await timed(samples, lambda: ChatService.get_conversation_history(
+            db, 1, ROOM_ID, limit=50), repeat)
+        results["conversation_latest_page"] = summarize(samples)
+
+        if total <= full_load_limit:
+            async def full_load():
+                result = await db.execute(
+                    select(ChatMessage)
+                    .where(ChatMessage.room_id == ROOM_ID)
+                    .order_by(ChatMessage.timestamp.asc())
+                )
+                return result.scalars().all()
+
+            samples = []
+            await timed(samples, full_load, max(1, repeat // 10))
+            results["room_full_load"] = summarize(samples)
+    return {"messages": total, **results}
+
+async def main(args):
+    prepare_schema()
+    users = seed_users(args.users)
+    steps = []
+    total = 0
+    for step in range(1, args.steps + 1):
+        target = args.messages * step // args.steps
+        started = time.perf_counter()
+        total = seed_messages(target - total, users, args.rooms, seed=step)
+        seeded_in = time.perf_counter() - started
+        steps.append({**await measure(total, args.repeat, args.full_load_limit), "seeded_in_s": seeded_in})
+    await async_engine.dispose()
+    print(json.dumps({"benchmark": "chat_history", "rooms": args.rooms, "steps": steps}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--full-load-limit", type=int, default=1_000_000,
+                        help="skip the whole-room load above this many rows")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+def configure_environment(database_url: str = None) -> str:
+    """
+    Provide the environment the app modules need at import time.
+
+    Must be called before anything under ``app`` is imported. When no
+    database URL is given a throwaway SQLite file is used.
+
+    Returns:
+        str: The database URL the app will use
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    os.environ.setdefault("INTERNAL_API_TOKEN", "benchmark-internal")
+    if database_url is None:
+        database_url = os.getenv("DATABASE_URL") or (
+            f"sqlite:///{tempfile.mkdtemp(prefix='lagfast-bench-')}/bench.db"
+        )
+    os.environ["DATABASE_URL"] = database_url
+    return database_url
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples (in seconds) as milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def run_metadata() -> dict:
+    """Where and on what a result was produced, so runs can be compared fairly."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+    }
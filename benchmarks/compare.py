@@ -0,0 +1,99 @@
+"""
+Compare two benchmark results and flag regressions.
+
+Walks both JSON documents and compares every numeric value whose name
+says which way is better: latencies and durations (``*_ms``, ``*_s``)
+should go down, rates (``*_per_s``) should go up. Anything else (counts,
+parameters, run metadata) is ignored. A metric that got worse by more
+than ``--threshold`` percent is a regression, and the exit status is 1
+if there are any.
+
+    python -m benchmarks.http_load > before.json
+    # ... change something ...
+    python -m benchmarks.http_load > after.json
+    python -m benchmarks.compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+IGNORED = {"run", "params"}
+
+def direction(name: str) -> Optional[int]:
+    """+1 if higher is better, -1 if lower is better, None if not a metric."""
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_s"):
+        return -1
+    return None
+
+def metrics(document, path: str = "") -> Iterator[Tuple[str, int, float]]:
+    if isinstance(document, list):
+        for n, item in enumerate(document):
+            # Lists of results are keyed by their kind/mode where they have one
+            key = (item.get("kind") or item.get("mode")) if isinstance(item, dict) else None
+            yield from metrics(item, f"{path}[{key or n}]")
+        return
+    if not isinstance(document, dict):
+        return
+    for name, value in document.items():
+        if not path and name in IGNORED:
+            continue
+        child = f"{path}.{name}" if path else name
+        if isinstance(value, (dict, list)):
+            yield from metrics(value, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            better = direction(name)
+            if better is not None:
+                yield child, better, float(value)
+
+def compare(before, after, threshold: float) -> Dict[str, list]:
+    old = {path: value for path, _, value in metrics(before)}
+    changes = {"regressions": [], "improvements": [], "unchanged": [], "missing": []}
+    seen = set()
+    for path, better, value in metrics(after):
+        seen.add(path)
+        if path not in old:
+            continue
+        base = old[path]
+        if base == 0:
+            # No percentage from zero; any move counts as past the threshold
+            change = 0.0 if value == 0 else (threshold + 1) * (1 if value > 0 else -1)
+            change_pct = None if value != 0 else 0.0
+        else:
+            change = change_pct = (value - base) / abs(base) * 100
+        entry = {"metric": path, "before": base, "after": value,
+                 "change_pct": round(change_pct, 2) if change_pct is not None else None}
+        if change * better < -threshold:
+            changes["regressions"].append(entry)
+        elif change * better > threshold:
+            changes["improvements"].append(entry)
+        else:
+            changes["unchanged"].append(entry)
+    changes["missing"] = sorted(set(old) - seen)
+    return changes
+
+def main(args) -> bool:
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    result = compare(before, after, args.threshold)
+    if not args.verbose:
+        result.pop("unchanged")
+    print(json.dumps({
+        "before": before.get("run") if isinstance(before, dict) else None,
+        "after": after.get("run") if isinstance(after, dict) else None,
+        "threshold_pct": args.threshold,
+        **result,
+    }, indent=2))
+    return not result["regressions"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change to report")
+    parser.add_argument("--verbose", action="store_true", help="Also list metrics within the threshold")
+    sys.exit(0 if main(parser.parse_args()) else 1)
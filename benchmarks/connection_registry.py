@@ -0,0 +1,116 @@
+"""
+ConnectionRegistry operations at 100k connections.
+
+Registers ``--connections`` sids (spread over users with several devices
+each), joins each to a few rooms, then times the per-event lookups the
+Socket.IO handlers make, against the linear scans the old
+``ConnectionManager`` did over ``user_connections``. Also reports the
+registry's memory footprint (excluding the sid and room name strings).
+
+    python -m benchmarks.connection_registry --connections 100000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+from app.websocket.registry import ConnectionRegistry  # noqa: E402
+
+def timed(samples: list, fn, args_list):
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+
+def populate(sids: list, devices: int, memberships: list) -> ConnectionRegistry:
+    registry = ConnectionRegistry()
+    for n, sid in enumerate(sids):
+        registry.add(sid, n // devices + 1)
+        for room in memberships[n]:
+            registry.join(sid, room)
+    return registry
+
+def main(args):
+    rng = random.Random(0)
+    sids = [f"sid-{n:020d}" for n in range(args.connections)]
+    names = [f"room:{n}" for n in range(args.rooms)]
+    memberships = [
+        [names[room] for room in rng.sample(range(args.rooms), args.rooms_per_sid)]
+        for _ in sids
+    ]
+
+    tracemalloc.start()
+    sized = populate(sids, args.devices, memberships)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sized
+
+    started = time.perf_counter()
+    registry = populate(sids, args.devices, memberships)
+    populated_in = time.perf_counter() - started
+
+    users = args.connections // args.devices
+    probes = [rng.randrange(args.connections) for _ in range(args.probes)]
+    # What the old ConnectionManager kept
+    user_connections = {sid: n // args.devices + 1 for n, sid in enumerate(sids)}
+
+    results = {}
+    samples: list = []
+    timed(samples, registry.user_of, [(sids[n],) for n in probes])
+    results["user_of"] = summarize(samples)
+
+    samples = []
+    timed(samples, registry.sids_of, [(n // args.devices + 1,) for n in probes])
+    results["sids_of"] = summarize(samples)
+
+    samples = []
+    timed(samples, lambda: set(registry.online_users()), [()] * min(args.probes, 100))
+    results["online_users_snapshot"] = summarize(samples)
+
+    def linear_find(target):
+        for sid, uid in user_connections.items():
+            if uid == target:
+                return sid
+
+    samples = []
+    timed(samples, linear_find, [(n // args.devices + 1,) for n in probes[:args.scan_probes]])
+    results["old_linear_find_sid"] = summarize(samples)
+
+    samples = []
+    timed(samples, lambda: [u for u in user_connections.values()], [()] * min(args.scan_probes, 100))
+    results["old_online_users_list"] = summarize(samples)
+
+    # Disconnect/reconnect churn, with room cleanup
+    churn = rng.sample(range(args.connections), min(args.probes, args.connections))
+    samples = []
+    timed(samples, registry.remove, [(sids[n],) for n in churn])
+    results["remove"] = summarize(samples)
+    samples = []
+    timed(samples, registry.add, [(sids[n], n // args.devices + 1) for n in churn])
+    results["add"] = summarize(samples)
+
+    print(json.dumps({
+        "benchmark": "connection_registry",
+        "connections": args.connections,
+        "users": users,
+        "rooms": args.rooms,
+        "populated_in_s": populated_in,
+        "registry_memory_mb": memory / 1024 / 1024,
+        "stats": registry.stats(),
+        "results": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=100_000)
+    parser.add_argument("--devices", type=int, default=2, help="connections per user")
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--rooms-per-sid", type=int, default=3)
+    parser.add_argument("--probes", type=int, default=10_000)
+    parser.add_argument("--scan-probes", type=int, default=200, help="lookups timed for the linear scans")
+    main(parser.parse_args())
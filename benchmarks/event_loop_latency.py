@@ -0,0 +1,82 @@
+"""
+Event-loop latency while database queries run concurrently.
+
+Compares the old pattern (sync ``SessionLocal`` queries inside ``async def``
+handlers) with the ``AsyncSessionLocal`` path. A ticker coroutine wakes up
+every few milliseconds and records how late it was; blocking queries show up
+as large tick delays.
+
+    python -m benchmarks.event_loop_latency --queries 20 --concurrency 10
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+from sqlalchemy import text  # noqa: E402
+
+from app.utils.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.models import chat, user  # noqa: E402,F401
+
+# A deliberately slow statement so a single query is clearly visible on the loop
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :n) "
+    "SELECT count(*) FROM c"
+)
+
+async def tick(interval: float, samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+async def run_sync_queries(n: int, rows: int):
+    db = SessionLocal()
+    try:
+        for _ in range(n):
+            db.execute(SLOW_QUERY, {"n": rows}).scalar()
+            await asyncio.sleep(0)
+    finally:
+        db.close()
+
+async def run_async_queries(n: int, rows: int):
+    async with AsyncSessionLocal() as db:
+        for _ in range(n):
+            (await db.execute(SLOW_QUERY, {"n": rows})).scalar()
+
+async def measure(mode: str, queries: int, concurrency: int, rows: int, interval: float) -> dict:
+    samples: list = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(tick(interval, samples, stop))
+    worker = run_sync_queries if mode == "sync" else run_async_queries
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(queries, rows) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return {
+        "mode": mode,
+        "queries": queries * concurrency,
+        "elapsed_s": elapsed,
+        "loop_lag": summarize(samples),
+    }
+
+async def main(args):
+    Base.metadata.create_all(bind=engine)
+    results = []
+    for mode in ("sync", "async"):
+        results.append(await measure(mode, args.queries, args.concurrency, args.rows, args.interval))
+    await async_engine.dispose()
+    print(json.dumps({"benchmark": "event_loop_latency", "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=5, help="queries per concurrent worker")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=300_000, help="size of the recursive CTE per query")
+    parser.add_argument("--interval", type=float, default=0.005, help="ticker interval in seconds")
+    asyncio.run(main(parser.parse_args()))
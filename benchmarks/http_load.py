@@ -0,0 +1,149 @@
+"""
+HTTP load against a real uvicorn server.
+
+Seeds ``--users`` users and ``--messages`` chat messages, starts uvicorn
+with ``--workers`` processes and drives each scenario with
+``--concurrency`` closed-loop clients for ``--duration`` seconds (after
+``--warmup`` seconds that are not recorded):
+
+- ``login``: ``POST /auth/login`` as a random user (bcrypt bound)
+- ``users``: ``GET /users/?limit=--page``
+- ``users_me``: ``GET /users/me`` with a random user's token
+- ``messages``: ``GET /messages/{user_id}`` for a random user
+
+Reports requests/sec, p50/p95/p99 latency and status codes per scenario
+as JSON; save it and diff runs with ``benchmarks.compare``. Set
+``DATABASE_URL`` to run against Postgres instead of a throwaway SQLite
+file.
+
+    python -m benchmarks.http_load --users 10000 --messages 1000000 > before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from .common import configure_environment, run_metadata, summarize
+
+configure_environment()
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.models.chat import ChatMessage  # noqa: E402
+from app.utils.auth import create_access_token  # noqa: E402
+from app.utils.database import engine  # noqa: E402
+
+from .multi_worker import wait_ready  # noqa: E402
+from .seed import PASSWORD, prepare_schema, seed_messages, seed_users  # noqa: E402
+
+SCENARIOS = ("login", "users", "users_me", "messages")
+
+def build_request(scenario: str, users: int, page: int, tokens: list, rng: random.Random):
+    n = rng.randrange(users)
+    if scenario == "login":
+        return "POST", "/auth/login", {"json": {"username": f"user{n}", "password": PASSWORD}}
+    if scenario == "users":
+        return "GET", f"/users/?limit={page}", {}
+    if scenario == "users_me":
+        return "GET", "/users/me", {"headers": {"Authorization": f"Bearer {rng.choice(tokens)}"}}
+    return "GET", f"/messages/{n + 1}", {}
+
+def count_messages() -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(ChatMessage)).scalar()
+
+async def drive(client: httpx.AsyncClient, scenario: str, args, tokens: list) -> dict:
+    rng = random.Random(args.seed)
+    latencies = []
+    statuses: dict = {}
+    recording = False
+    stop_at = time.perf_counter() + args.warmup + args.duration
+
+    async def worker():
+        while time.perf_counter() < stop_at:
+            method, url, kwargs = build_request(scenario, args.users, args.page, tokens, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if recording:
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    async def record():
+        nonlocal recording
+        await asyncio.sleep(args.warmup)
+        recording = True
+
+    started = time.perf_counter()
+    await asyncio.gather(record(), *(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started - args.warmup
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": len(latencies) / elapsed,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "latency": summarize(latencies),
+    }
+
+async def main(args):
+    prepare_schema()
+    seed_users(args.users)
+    # Top up to --messages so a reused database isn't seeded twice
+    seed_messages(max(args.messages - count_messages(), 0), args.users, args.rooms)
+    tokens = [create_access_token({"sub": f"user{n}"}) for n in range(min(args.users, 1000))]
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        env=os.environ.copy(),
+    )
+    results = {}
+    try:
+        await wait_ready([args.port])
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                     timeout=args.timeout) as client:
+            for scenario in args.scenarios:
+                results[scenario] = await drive(client, scenario, args, tokens)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps({
+        "benchmark": "http_load",
+        "run": run_metadata(),
+        "params": {
+            "users": args.users,
+            "messages": args.messages,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "page": args.page,
+        },
+        "scenarios": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,140 @@
+"""
+Cost of serializing large list responses.
+
+Seeds ``--rows`` users and ``--rows`` messages (all sent by user 1 to
+room/user 1, so ``GET /messages/1`` returns every one), then:
+
+- ``serialize``: CPU time to turn the rows into a response body, for the
+  ``response_model`` path (ORM objects validated by Pydantic, or the hand
+  built dicts ``get_messages`` used to return) vs ``rows_to_json`` with
+  orjson and with the stdlib fallback
+- ``endpoint``: latency of ``GET /users/?limit=N`` and
+  ``GET /messages/1`` through the ASGI app with FAST_JSON_RESPONSES off
+  and on
+
+    python -m benchmarks.json_serialization --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+import httpx  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.controllers import user_controller  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.chat import ChatMessage  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.routers import chat_router  # noqa: E402
+from app.schemas.chat import ChatMessageResponse  # noqa: E402
+from app.schemas.user import User as UserSchema  # noqa: E402
+from app.services.chat_service import MESSAGE_COLUMNS  # noqa: E402
+from app.services.user_service import USER_COLUMNS  # noqa: E402
+from app.utils import fast_json  # noqa: E402
+from app.utils.database import SessionLocal, async_engine  # noqa: E402
+
+from .seed import prepare_schema, seed_messages, seed_users  # noqa: E402
+
+def timed(fn, repeat: int) -> dict:
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(fn())
+        samples.append(time.perf_counter() - started)
+    return {"bytes": size, **summarize(samples)}
+
+def hand_built(messages) -> List[dict]:
+    """What get_messages returned before: dicts with isoformat() per row."""
+    return [
+        {
+            "id": msg.id,
+            "content": msg.content,
+            "sender_id": msg.sender_id,
+            "receiver_id": msg.receiver_id,
+            "timestamp": msg.timestamp.isoformat(),
+            "is_read": msg.is_read,
+            "room_id": msg.room_id,
+            "message_type": msg.message_type,
+        }
+        for msg in messages
+    ]
+
+def stdlib_rows_to_json(rows) -> bytes:
+    orjson, fast_json.orjson = fast_json.orjson, None
+    try:
+        return fast_json.rows_to_json(rows)
+    finally:
+        fast_json.orjson = orjson
+
+def serialize(rows: int, repeat: int) -> dict:
+    db = SessionLocal()
+    try:
+        users = db.execute(select(User).order_by(User.id).limit(rows)).scalars().all()
+        user_rows = db.execute(select(*USER_COLUMNS).order_by(User.id).limit(rows)).all()
+        messages = db.execute(select(ChatMessage).order_by(ChatMessage.id).limit(rows)).scalars().all()
+        message_rows = db.execute(select(*MESSAGE_COLUMNS).order_by(ChatMessage.id).limit(rows)).all()
+    finally:
+        db.close()
+
+    user_adapter = TypeAdapter(List[UserSchema])
+    message_adapter = TypeAdapter(List[ChatMessageResponse])
+    return {
+        "users": {
+            "pydantic_orm": timed(lambda: user_adapter.dump_json(user_adapter.validate_python(users)), repeat),
+            "rows_orjson": timed(lambda: fast_json.rows_to_json(user_rows), repeat),
+            "rows_stdlib": timed(lambda: stdlib_rows_to_json(user_rows), repeat),
+        },
+        "messages": {
+            "hand_dicts_pydantic": timed(
+                lambda: message_adapter.dump_json(message_adapter.validate_python(hand_built(messages))), repeat
+            ),
+            "pydantic_orm": timed(lambda: message_adapter.dump_json(message_adapter.validate_python(messages)), repeat),
+            "rows_orjson": timed(lambda: fast_json.rows_to_json(message_rows), repeat),
+            "rows_stdlib": timed(lambda: stdlib_rows_to_json(message_rows), repeat),
+        },
+    }
+
+async def endpoints(rows: int, repeat: int) -> dict:
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for fast in (False, True):
+            user_controller.FAST_JSON_RESPONSES = chat_router.FAST_JSON_RESPONSES = fast
+            for name, url in (("users", f"/users/?limit={rows}"), ("messages", "/messages/1")):
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    samples.append(time.perf_counter() - started)
+                    response.raise_for_status()
+                results[f"{name}_{'fast' if fast else 'response_model'}"] = {
+                    "items": len(response.json()),
+                    **summarize(samples),
+                }
+    return results
+
+async def main(args):
+    prepare_schema()
+    seed_users(args.rows)
+    seed_messages(args.rows, users=1, rooms=1)
+    print(json.dumps({
+        "benchmark": "json_serialization",
+        "rows": args.rows,
+        "orjson": fast_json.orjson is not None,
+        "serialize": serialize(args.rows, args.repeat),
+        "endpoint": await endpoints(args.rows, args.repeat),
+    }, indent=2))
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
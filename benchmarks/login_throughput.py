@@ -0,0 +1,101 @@
+"""
+Login throughput with bcrypt inline on the loop vs in a thread/process pool.
+
+Drives concurrent ``POST /auth/login`` requests through the ASGI app in
+process and reports logins/sec, request latency and event-loop lag.
+
+    python -m benchmarks.login_throughput --users 50 --logins 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils import auth  # noqa: E402
+from app.utils.database import SessionLocal, async_engine  # noqa: E402
+from app.utils.password_hashing import PasswordHasher, hash_password  # noqa: E402
+
+PASSWORD = "benchmark-password"
+
+def seed_users(count: int):
+    hashed = hash_password(PASSWORD)
+    db = SessionLocal()
+    try:
+        db.query(User).delete()
+        db.add_all(
+            User(email=f"login{i}@example.com", username=f"login{i}", hashed_password=hashed)
+            for i in range(count)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+async def tick(samples: list, stop: asyncio.Event, interval: float = 0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+async def run(kind: str, users: int, logins: int, concurrency: int, workers: int) -> dict:
+    auth.password_hasher = PasswordHasher(kind=kind, max_workers=workers, max_pending=concurrency)
+    latencies, lag = [], []
+    statuses: dict = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(i % users)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                n = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post(
+                    "/auth/login", json={"username": f"login{n}", "password": PASSWORD}
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(tick(lag, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await ticker
+
+    auth.password_hasher.shutdown()
+    return {
+        "kind": kind,
+        "logins": logins,
+        "elapsed_s": elapsed,
+        "logins_per_s": logins / elapsed,
+        "statuses": statuses,
+        "latency": summarize(latencies),
+        "loop_lag": summarize(lag),
+    }
+
+async def main(args):
+    seed_users(args.users)
+    results = [
+        await run(kind, args.users, args.logins, args.concurrency, args.workers)
+        for kind in args.kinds
+    ]
+    await async_engine.dispose()
+    print(json.dumps({"benchmark": "login_throughput", "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="hash pool size")
+    parser.add_argument("--kinds", nargs="+", default=["inline", "thread", "process"])
+    asyncio.run(main(parser.parse_args()))
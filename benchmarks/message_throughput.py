@@ -0,0 +1,97 @@
+"""
+Chat message persistence throughput: per-message commit vs group commit.
+
+Concurrent producers each send messages one after another, the way the
+Socket.IO ``message`` handler does. Modes:
+
+- ``per_message``: a session, INSERT and COMMIT per message (the old handler)
+- ``batched_durable``: MessageWriter, each sender waits for its commit
+- ``batched_early``: MessageWriter with broadcast-before-commit
+
+    python -m benchmarks.message_throughput --producers 100 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+from app.models.chat import ChatMessage  # noqa: E402
+from app.utils.database import AsyncSessionLocal, async_engine  # noqa: E402
+from app.websocket.message_writer import MessageWriter  # noqa: E402
+
+from .seed import prepare_schema, seed_users  # noqa: E402
+
+def make_row(producer: int, n: int) -> dict:
+    return {
+        "room_id": producer % 10 + 1,
+        "receiver_id": producer % 10 + 1,
+        "sender_id": producer % 100 + 1,
+        "content": f"message {n} from {producer}",
+        "message_type": "text",
+        "is_read": False,
+        "timestamp": datetime.utcnow(),
+    }
+
+async def per_message(producer: int, count: int, latencies: list):
+    for n in range(count):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            db.add(ChatMessage(**make_row(producer, n)))
+            await db.commit()
+        latencies.append(time.perf_counter() - started)
+
+def batched(writer: MessageWriter):
+    async def produce(producer: int, count: int, latencies: list):
+        for n in range(count):
+            started = time.perf_counter()
+            committed = await writer.submit(make_row(producer, n))
+            if committed is not None:
+                await committed
+            latencies.append(time.perf_counter() - started)
+    return produce
+
+async def run(mode: str, producers: int, messages: int, batch_size: int) -> dict:
+    writer = None
+    if mode == "per_message":
+        produce = per_message
+    else:
+        writer = MessageWriter(batch_size=batch_size, broadcast_before_commit=mode == "batched_early")
+        produce = batched(writer)
+
+    latencies: list = []
+    started = time.perf_counter()
+    await asyncio.gather(*(produce(p, messages, latencies) for p in range(producers)))
+    accepted = time.perf_counter() - started
+    if writer is not None:
+        await writer.stop()
+    durable = time.perf_counter() - started
+
+    total = producers * messages
+    return {
+        "mode": mode,
+        "messages": total,
+        "accepted_per_s": total / accepted,
+        "durable_per_s": total / durable,
+        "send_latency": summarize(latencies),
+        "writer": writer.stats() if writer else None,
+    }
+
+async def main(args):
+    prepare_schema()
+    seed_users(100)
+    results = [await run(mode, args.producers, args.messages, args.batch_size) for mode in args.modes]
+    await async_engine.dispose()
+    print(json.dumps({"benchmark": "message_throughput", "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--producers", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=40, help="messages per producer")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--modes", nargs="+", default=["per_message", "batched_durable", "batched_early"])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,186 @@
+"""
+Socket.IO across several workers sharing the local pub/sub broker.
+
+Starts the broker and ``--workers`` uvicorn processes on consecutive
+ports, spreads ``--clients`` Socket.IO clients across them round-robin
+and checks that presence, room messages and WebRTC signals cross worker
+boundaries. Then measures room fan-out latency with every client in one
+room. Exits non-zero if any check fails.
+
+    python -m benchmarks.multi_worker --workers 4 --clients 40 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+import httpx  # noqa: E402
+import socketio  # noqa: E402
+
+from app.utils.auth import create_access_token  # noqa: E402
+
+from .seed import prepare_schema, seed_users  # noqa: E402
+
+ROOM_ID = 1
+
+class Client:
+    def __init__(self, user_id: int, port: int):
+        self.user_id = user_id
+        self.port = port
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.online: set = set()
+        self.messages: list = []
+        self.signals: list = []
+        self.sio.on('presence_snapshot', self._on_presence_snapshot)
+        self.sio.on('presence_delta', self._on_presence_delta)
+        self.sio.on('message', lambda data: self.messages.append((time.perf_counter(), data)))
+        self.sio.on('webrtc_signal', lambda data: self.signals.append(data))
+
+    def _on_presence_snapshot(self, data):
+        self.online = set(data['users'])
+
+    def _on_presence_delta(self, data):
+        self.online.update(data['online'])
+        self.online.difference_update(data['offline'])
+
+    async def connect(self):
+        token = create_access_token({"sub": f"user{self.user_id - 1}"})
+        await self.sio.connect(
+            f"http://127.0.0.1:{self.port}?token={token}",
+            socketio_path="socket.io",
+            transports=["websocket"],
+        )
+
+async def wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.02)
+    return predicate()
+
+def start_processes(workers: int, base_port: int, socket_path: str) -> list:
+    env = {**os.environ, "SOCKETIO_MANAGER_URL": f"unix://{socket_path}"}
+    processes = [subprocess.Popen(
+        [sys.executable, "-m", "app.websocket.broker", "--path", socket_path],
+        env=env, stderr=subprocess.DEVNULL,
+    )]
+    for n in range(workers):
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--port", str(base_port + n), "--log-level", "warning"],
+            env=env,
+        ))
+    return processes
+
+async def wait_ready(ports: list, timeout: float = 30.0):
+    async with httpx.AsyncClient() as http:
+        for port in ports:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    await http.get(f"http://127.0.0.1:{port}/")
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Worker on port {port} did not start")
+                    await asyncio.sleep(0.1)
+
+async def run_checks(clients: list, late: Client, timeout: float) -> dict:
+    checks = {}
+    others = clients[1:]
+    sender = clients[0]
+
+    await late.connect()
+    checks["presence_delta_crosses_workers"] = await wait_for(
+        lambda: all(late.user_id in c.online for c in clients if c.port != late.port), timeout)
+    expected = {c.user_id for c in clients}
+    checks["presence_snapshot_includes_remote"] = await wait_for(
+        lambda: expected <= late.online, timeout)
+
+    for client in clients + [late]:
+        await client.sio.emit('join_room', {'room_id': ROOM_ID})
+    await asyncio.sleep(0.2)
+    await sender.sio.emit('message', {'room_id': ROOM_ID, 'content': 'hello'})
+    checks["room_message_crosses_workers"] = await wait_for(
+        lambda: all(c.messages for c in others + [late]), timeout)
+
+    target = next(c for c in clients if c.port != sender.port)
+    await sender.sio.emit('webrtc_signal', {'target_user_id': target.user_id, 'signal': {'type': 'offer'}})
+    checks["webrtc_signal_crosses_workers"] = await wait_for(lambda: bool(target.signals), timeout)
+
+    await late.sio.disconnect()
+    checks["presence_offline_crosses_workers"] = await wait_for(
+        lambda: all(late.user_id not in c.online for c in clients), timeout)
+    return checks
+
+async def fan_out(clients: list, messages: int, timeout: float) -> dict:
+    for client in clients:
+        client.messages.clear()
+    sender, receivers = clients[0], clients[1:]
+    sent_at = {}
+    for n in range(messages):
+        content = f"fan-out {n}"
+        sent_at[content] = time.perf_counter()
+        await sender.sio.emit('message', {'room_id': ROOM_ID, 'content': content})
+        await asyncio.sleep(0.01)
+    await wait_for(lambda: all(len(c.messages) >= messages for c in receivers), timeout)
+
+    samples = [
+        received - sent_at[data['content']]
+        for client in receivers
+        for received, data in client.messages
+        if data.get('content') in sent_at
+    ]
+    expected = messages * len(receivers)
+    return {"delivered": len(samples), "expected": expected, "latency": summarize(samples)}
+
+async def main(args) -> bool:
+    prepare_schema()
+    seed_users(args.clients + 1)
+    ports = [args.port + n for n in range(args.workers)]
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="lagfast-broker-"), "broker.sock")
+    processes = start_processes(args.workers, args.port, socket_path)
+    try:
+        await wait_ready(ports)
+        clients = [Client(n + 1, ports[n % len(ports)]) for n in range(args.clients)]
+        for client in clients:
+            await client.connect()
+        late = Client(args.clients + 1, ports[-1])
+
+        checks = await run_checks(clients, late, args.timeout)
+        fan_out_result = await fan_out(clients, args.messages, args.timeout)
+        checks["fan_out_complete"] = fan_out_result["delivered"] == fan_out_result["expected"]
+        for client in clients:
+            await client.sio.disconnect()
+    finally:
+        # Workers first so they don't log the broker going away
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    print(json.dumps({
+        "benchmark": "multi_worker",
+        "workers": args.workers,
+        "clients": args.clients,
+        "checks": checks,
+        "fan_out": fan_out_result,
+    }, indent=2))
+    return all(checks.values())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--clients", type=int, default=12)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
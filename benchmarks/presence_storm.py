@@ -0,0 +1,158 @@
+"""
+Presence fan-out during a reconnect storm.
+
+``--connections`` users are online, each in a few rooms; then every one
+of them disconnects and reconnects (rejoining its rooms) within
+``--storm-seconds``, as after a deploy. The handlers' presence logic runs
+against a stand-in server that counts what would be sent instead of
+sending it. Modes:
+
+- ``legacy``: user_joined/user_left to everyone per connect/disconnect,
+  the full online list to each new connection, user_joined_room per join
+- ``global``: PresenceEngine, one presence_delta per tick to everyone
+- ``room``: PresenceEngine scoped to rooms
+
+    python -m benchmarks.presence_storm --connections 5000 --storm-seconds 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from .common import configure_environment
+
+configure_environment()
+
+from app.websocket.cluster import ClusterBus  # noqa: E402
+from app.websocket.presence import PresenceEngine  # noqa: E402
+from app.websocket.registry import ConnectionRegistry  # noqa: E402
+
+class CountingServer:
+    """Counts deliveries and payload bytes of ``emit`` calls."""
+
+    def __init__(self, registry: ConnectionRegistry):
+        self.registry = registry
+        self.reset()
+
+    def reset(self):
+        self.emits = 0
+        self.deliveries = 0
+        self.bytes = 0
+
+    async def emit(self, event, data=None, to=None, room=None, skip_sid=None, ignore_queue=False):
+        room = to or room
+        if room is None:
+            recipients = len(self.registry) - (1 if skip_sid in self.registry else 0)
+        elif room.startswith("room:"):
+            recipients = len(self.registry.room_members(room)) - (1 if skip_sid else 0)
+        else:
+            recipients = 1
+        self.emits += 1
+        self.deliveries += recipients
+        self.bytes += len(json.dumps([event, data])) * recipients
+
+class Handlers:
+    """The presence side of connect/join_room/disconnect for one mode."""
+
+    def __init__(self, mode: str, tick: float):
+        self.mode = mode
+        self.registry = ConnectionRegistry()
+        self.server = CountingServer(self.registry)
+        self.presence = None
+        if mode != "legacy":
+            self.presence = PresenceEngine(self.server, self.registry, ClusterBus(), scope=mode, tick=tick)
+
+    async def connect(self, sid: str, user_id: int, rooms: list):
+        first = self.registry.add(sid, user_id)
+        if self.mode == "legacy":
+            await self.server.emit('user_joined', {'user_id': user_id}, skip_sid=sid)
+            online = [u for u in self.registry.online_users() if u != user_id]
+            await self.server.emit('online_users', online, room=sid)
+        else:
+            if first:
+                self.presence.user_online(user_id)
+            if self.mode == "global":
+                await self.server.emit('presence_snapshot', self.presence.snapshot(), room=sid)
+        for room in rooms:
+            first_in_room = self.registry.join(sid, room)
+            if self.mode == "room":
+                if first_in_room:
+                    self.presence.room_joined(room, user_id)
+                await self.server.emit('presence_snapshot', self.presence.snapshot(room), room=sid)
+            else:
+                await self.server.emit('user_joined_room', {'user_id': user_id, 'room_id': room},
+                                       room=room, skip_sid=sid)
+
+    async def disconnect(self, sid: str):
+        user_id, last, rooms_left = self.registry.remove(sid)
+        if self.mode == "legacy":
+            await self.server.emit('user_left', {'user_id': user_id}, skip_sid=sid)
+            return
+        for room in rooms_left:
+            self.presence.room_left(room, user_id)
+        if last:
+            self.presence.user_offline(user_id)
+
+async def run(mode: str, args) -> dict:
+    rng = random.Random(0)
+    rooms = [f"room:{n}" for n in range(args.rooms)]
+    memberships = [rng.sample(rooms, args.rooms_per_user) for _ in range(args.connections)]
+    handlers = Handlers(mode, args.tick)
+    for n in range(args.connections):
+        await handlers.connect(f"sid-{n}", n + 1, memberships[n])
+    if handlers.presence is not None:
+        await handlers.presence.flush()
+    handlers.server.reset()
+
+    if handlers.presence is not None:
+        handlers.presence.start()
+    order = list(range(args.connections))
+    rng.shuffle(order)
+    batch = max(1, args.connections // max(1, int(args.storm_seconds * 100)))
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for i in range(0, len(order), batch):
+        for n in order[i:i + batch]:
+            await handlers.disconnect(f"sid-{n}")
+            await handlers.connect(f"sid-{n}-r", n + 1, memberships[n])
+        await asyncio.sleep(args.storm_seconds / (len(order) / batch))
+    if handlers.presence is not None:
+        await asyncio.sleep(args.tick * 2)
+        await handlers.presence.stop()
+        await handlers.presence.flush()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    server = handlers.server
+    return {
+        "mode": mode,
+        "emits": server.emits,
+        "deliveries": server.deliveries,
+        "deliveries_per_client": server.deliveries / args.connections,
+        "mb_sent": server.bytes / 1024 / 1024,
+        "cpu_s": cpu,
+        "elapsed_s": elapsed,
+        "presence": handlers.presence.stats() if handlers.presence else None,
+    }
+
+async def main(args):
+    results = [await run(mode, args) for mode in args.modes]
+    print(json.dumps({
+        "benchmark": "presence_storm",
+        "connections": args.connections,
+        "rooms": args.rooms,
+        "rooms_per_user": args.rooms_per_user,
+        "storm_seconds": args.storm_seconds,
+        "results": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--rooms-per-user", type=int, default=3)
+    parser.add_argument("--storm-seconds", type=float, default=2.0)
+    parser.add_argument("--tick", type=float, default=0.25)
+    parser.add_argument("--modes", nargs="+", default=["legacy", "global", "room"])
+    asyncio.run(main(parser.parse_args()))
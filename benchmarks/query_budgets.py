@@ -0,0 +1,85 @@
+"""
+SQL statement counts per endpoint, checked against declared budgets.
+
+Runs each request below through the ASGI app in process with
+``QUERY_BUDGET_MODE=raise``, so a request that goes over the budget its
+route declares (``dependencies=[query_budget(n)]``) fails. Prints the
+statement count of every request and exits non-zero on any overrun;
+``--statements`` also lists the SQL each request ran.
+
+    python -m benchmarks.query_budgets --statements
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from .common import configure_environment
+
+configure_environment()
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.utils.auth import create_access_token  # noqa: E402
+from app.utils.database import async_engine  # noqa: E402
+from app.utils.query_budget import QueryBudgetExceeded, count_queries  # noqa: E402
+
+from .seed import PASSWORD, prepare_schema, seed_messages, seed_users  # noqa: E402
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+def requests(token: str) -> list:
+    auth = {"Authorization": f"Bearer {token}"}
+    new_user = {"email": "budget@example.com", "username": "budget", "password": PASSWORD}
+    return [
+        ("POST", "/users/", {"json": new_user}),
+        ("POST", "/users/", {"json": new_user}),
+        ("GET", "/users/", {}),
+        ("GET", "/users/?skip=1", {}),
+        ("GET", "/users/1", {}),
+        ("PUT", "/users/2", {"json": {"username": "renamed"}}),
+        ("DELETE", "/users/3", {}),
+        ("POST", "/auth/login", {"json": {"username": "user5", "password": PASSWORD}}),
+        ("GET", "/users/me", {"headers": auth}),
+        ("GET", "/messages/1", {}),
+        ("GET", "/messages/2/history?peer_id=3", {"headers": auth}),
+        ("GET", "/rooms/1/messages", {}),
+        ("GET", "/users/export", {}),
+        ("POST", "/users/4/photo", {"files": {"file": ("a.png", PNG_HEADER + b"a", "image/png")}}),
+        ("POST", "/users/5/photo", {"files": {"file": ("a.png", PNG_HEADER + b"a", "image/png")}}),
+        ("POST", "/users/4/photo", {"files": {"file": ("b.png", PNG_HEADER + b"b", "image/png")}}),
+        ("DELETE", "/users/4", {}),
+        ("DELETE", "/users/5", {}),
+    ]
+
+async def main(args) -> bool:
+    prepare_schema()
+    seed_users(10)
+    seed_messages(100, users=10, rooms=2)
+    results = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for method, url, kwargs in requests(create_access_token({"sub": "user5"})):
+            result = {"request": f"{method} {url}"}
+            with count_queries(result["request"]) as counter:
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    result["status"] = response.status_code
+                    result["within_budget"] = True
+                except QueryBudgetExceeded:
+                    result["within_budget"] = False
+            result["statements"] = counter.count
+            if args.statements:
+                result["sql"] = counter.statements
+            results.append(result)
+    await async_engine.dispose()
+
+    print(json.dumps({"benchmark": "query_budgets", "requests": results}, indent=2))
+    return all(result["within_budget"] for result in results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", action="store_true", help="List the SQL each request ran")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
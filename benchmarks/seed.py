@@ -0,0 +1,84 @@
+"""
+Synthetic data seeder for benchmarks.
+
+Inserts users and chat messages in large batches through SQLAlchemy Core.
+Messages follow the shape the Socket.IO ``message`` handler writes
+(``receiver_id`` is the room id) with strictly increasing timestamps.
+
+    python -m benchmarks.seed --users 1000 --messages 2000000 --rooms 100
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from .common import configure_environment
+
+configure_environment()
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app.models.chat import ChatMessage  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.utils.database import Base, engine  # noqa: E402
+from app.utils.password_hashing import hash_password  # noqa: E402
+from app.utils.schema import upgrade_schema  # noqa: E402
+
+PASSWORD = "benchmark-password"
+EPOCH = datetime(2024, 1, 1)
+
+def seed_users(count: int, batch_size: int = 10_000) -> int:
+    """Insert users ``user{n}`` sharing one password hash; returns the total user count."""
+    hashed = hash_password(PASSWORD)
+    with engine.begin() as conn:
+        start = conn.execute(select(func.count()).select_from(User)).scalar()
+        for offset in range(start, count, batch_size):
+            conn.execute(insert(User), [
+                {"email": f"user{n}@example.com", "username": f"user{n}", "hashed_password": hashed}
+                for n in range(offset, min(count, offset + batch_size))
+            ])
+    return max(start, count)
+
+def seed_messages(count: int, users: int, rooms: int, batch_size: int = 50_000, seed: int = 0) -> int:
+    """Append ``count`` messages; returns the total message count."""
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        start = conn.execute(select(func.count()).select_from(ChatMessage)).scalar()
+    for offset in range(start, start + count, batch_size):
+        rows = []
+        for n in range(offset, min(start + count, offset + batch_size)):
+            room_id = rng.randint(1, rooms)
+            rows.append({
+                "room_id": room_id,
+                "sender_id": rng.randint(1, users),
+                "receiver_id": room_id,
+                "content": f"message {n}",
+                "message_type": "text",
+                "is_read": False,
+                "timestamp": EPOCH + timedelta(seconds=n),
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(ChatMessage), rows)
+    return start + count
+
+def prepare_schema():
+    upgrade_schema(engine, Base.metadata)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--rooms", type=int, default=100)
+    args = parser.parse_args()
+
+    prepare_schema()
+    started = time.perf_counter()
+    users = seed_users(args.users)
+    messages = seed_messages(args.messages, users, args.rooms)
+    print(json.dumps({
+        "database_url": str(engine.url),
+        "users": users,
+        "messages": messages,
+        "elapsed_s": time.perf_counter() - started,
+    }, indent=2))
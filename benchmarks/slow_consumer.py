@@ -0,0 +1,134 @@
+"""
+One client that stops reading while a room is busy.
+
+Starts a worker, puts a normal Socket.IO client and a raw WebSocket
+client that never reads after joining into the same room, then sends
+``--messages`` chat messages of ``--size`` bytes. Reports the worker's
+peak memory, outbound queue depth, whether the stalled client was
+disconnected, and delivery latency for the client that keeps up.
+
+    python -m benchmarks.slow_consumer --messages 2000 --size 16384
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+import httpx  # noqa: E402
+import websockets  # noqa: E402
+
+from app.utils.auth import create_access_token  # noqa: E402
+
+from .multi_worker import Client, wait_for, wait_ready  # noqa: E402
+from .seed import prepare_schema, seed_users  # noqa: E402
+
+ROOM_ID = 1
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+async def stalled_client(port: int) -> websockets.ClientConnection:
+    """Join the room over a raw Engine.IO WebSocket, then never read again."""
+    token = create_access_token({"sub": "user2"})
+    ws = await websockets.connect(
+        f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket&token={token}",
+        max_queue=1,
+    )
+    await ws.recv()  # Engine.IO open
+    await ws.send("40")
+    await ws.recv()  # Socket.IO connect
+    await ws.send('42["join_room",{"room_id":%d}]' % ROOM_ID)
+    return ws
+
+async def main(args) -> dict:
+    prepare_schema()
+    seed_users(3)
+    env = {**os.environ, "OUTBOUND_QUEUE_SIZE": str(args.high_water), "BROADCAST_BEFORE_COMMIT": "true"}
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        await wait_ready([args.port])
+        sender, reader = Client(1, args.port), Client(3, args.port)
+        for client in (sender, reader):
+            await client.connect()
+            await client.sio.emit('join_room', {'room_id': ROOM_ID})
+        stalled = await stalled_client(args.port)
+        await asyncio.sleep(0.2)
+
+        peak = {"rss_mb": rss_mb(worker.pid), "queued_packets": 0}
+        stats = {}
+        stop = asyncio.Event()
+
+        async def monitor():
+            nonlocal stats
+            async with httpx.AsyncClient() as http:
+                while not stop.is_set():
+                    stats = (await http.get(
+                        f"http://127.0.0.1:{args.port}/internal/ws/outbound",
+                        headers={"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]},
+                    )).json()
+                    peak["queued_packets"] = max(peak["queued_packets"], stats["queued_packets"])
+                    peak["rss_mb"] = max(peak["rss_mb"], rss_mb(worker.pid))
+                    await asyncio.sleep(0.1)
+
+        baseline_mb = peak["rss_mb"]
+        monitor_task = asyncio.create_task(monitor())
+        sent_at = {}
+        for n in range(args.messages):
+            # Random so permessage-deflate can't shrink it
+            content = f"{n}:{os.urandom(args.size // 2).hex()}"
+            sent_at[str(n)] = time.perf_counter()
+            await sender.sio.emit('message', {'room_id': ROOM_ID, 'content': content})
+            if n % 50 == 0:
+                await asyncio.sleep(0.01)
+        await wait_for(lambda: len(reader.messages) >= args.messages, args.timeout)
+        await asyncio.sleep(0.5)
+        stop.set()
+        await monitor_task
+
+        samples = [
+            received - sent_at[data['content'].split(':', 1)[0]]
+            for received, data in reader.messages
+        ]
+        await stalled.close()
+        for client in (sender, reader):
+            await client.sio.disconnect()
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    return {
+        "benchmark": "slow_consumer",
+        "messages": args.messages,
+        "message_bytes": args.size,
+        "high_water": args.high_water,
+        "baseline_rss_mb": baseline_mb,
+        "peak_rss_mb": peak["rss_mb"],
+        "peak_queued_packets": peak["queued_packets"],
+        "slow_disconnects": stats.get("slow_disconnects"),
+        "dropped": stats.get("dropped"),
+        "reader_delivered": len(samples),
+        "reader_latency": summarize(samples),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=16384, help="bytes of padding per message")
+    parser.add_argument("--high-water", type=int, default=1000, help="OUTBOUND_QUEUE_SIZE for the worker")
+    parser.add_argument("--port", type=int, default=8150)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,141 @@
+"""
+Socket.IO load against real uvicorn workers.
+
+Starts the broker and ``--workers`` uvicorn processes (as
+``benchmarks.multi_worker`` does) and runs:
+
+- ``connect_storm``: ``--clients`` clients connect at once; connect
+  latency, connects/sec and refusals
+- ``fan_out``: every client joins one room and one client sends
+  ``--fan-out-messages`` messages; delivery latency to all the others
+- ``throughput``: clients pair up, one room per pair, and every sender
+  emits ``--messages`` messages as fast as it can; delivered messages/sec
+  and send-to-receive latency
+
+Results are JSON; save them and diff runs with ``benchmarks.compare``.
+
+    python -m benchmarks.socketio_load --clients 500 --workers 2 > before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from .common import configure_environment, run_metadata, summarize
+
+configure_environment()
+
+from .multi_worker import ROOM_ID, Client, fan_out, start_processes, wait_for, wait_ready  # noqa: E402
+from .seed import prepare_schema, seed_users  # noqa: E402
+
+async def connect_storm(clients: list) -> dict:
+    latencies = []
+    refused = 0
+
+    async def connect(client: Client):
+        nonlocal refused
+        started = time.perf_counter()
+        try:
+            await client.connect()
+        except Exception:
+            refused += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect(client) for client in clients))
+    elapsed = time.perf_counter() - started
+    return {
+        "clients": len(clients),
+        "connected": len(latencies),
+        "refused": refused,
+        "connects_per_s": len(latencies) / elapsed,
+        "latency": summarize(latencies),
+    }
+
+async def throughput(clients: list, messages: int, timeout: float) -> dict:
+    pairs = list(zip(clients[0::2], clients[1::2]))
+    for n, (sender, receiver) in enumerate(pairs):
+        room_id = ROOM_ID + 1 + n
+        await sender.sio.emit('join_room', {'room_id': room_id})
+        await receiver.sio.emit('join_room', {'room_id': room_id})
+        receiver.messages.clear()
+    await asyncio.sleep(0.5)
+
+    sent_at = {}
+
+    async def send(n: int, sender: Client):
+        for m in range(messages):
+            content = f"load {n} {m}"
+            sent_at[content] = time.perf_counter()
+            await sender.sio.emit('message', {'room_id': ROOM_ID + 1 + n, 'content': content})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(n, sender) for n, (sender, _) in enumerate(pairs)))
+    await wait_for(lambda: all(len(receiver.messages) >= messages for _, receiver in pairs), timeout)
+    elapsed = time.perf_counter() - started
+
+    samples = [
+        received - sent_at[data['content']]
+        for _, receiver in pairs
+        for received, data in receiver.messages
+        if data.get('content') in sent_at
+    ]
+    return {
+        "pairs": len(pairs),
+        "sent": len(sent_at),
+        "delivered": len(samples),
+        "messages_per_s": len(samples) / elapsed,
+        "latency": summarize(samples),
+    }
+
+async def main(args):
+    prepare_schema()
+    seed_users(args.clients)
+    ports = [args.port + n for n in range(args.workers)]
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="lagfast-broker-"), "broker.sock")
+    processes = start_processes(args.workers, args.port, socket_path)
+    clients = [Client(n + 1, ports[n % len(ports)]) for n in range(args.clients)]
+    results = {}
+    try:
+        await wait_ready(ports)
+        results["connect_storm"] = await connect_storm(clients)
+        connected = [client for client in clients if client.sio.connected]
+        for client in connected:
+            await client.sio.emit('join_room', {'room_id': ROOM_ID})
+        await asyncio.sleep(0.5)
+        results["fan_out"] = await fan_out(connected, args.fan_out_messages, args.timeout)
+        for client in connected:
+            await client.sio.emit('leave_room', {'room_id': ROOM_ID})
+        results["throughput"] = await throughput(connected, args.messages, args.timeout)
+        await asyncio.gather(*(client.sio.disconnect() for client in connected))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    print(json.dumps({
+        "benchmark": "socketio_load",
+        "run": run_metadata(),
+        "params": {
+            "workers": args.workers,
+            "clients": args.clients,
+            "messages": args.messages,
+            "fan_out_messages": args.fan_out_messages,
+        },
+        "scenarios": results,
+    }, indent=2))
+    return results["connect_storm"]["refused"] == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--fan-out-messages", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
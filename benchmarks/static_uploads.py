@@ -0,0 +1,138 @@
+"""
+Serving ``/uploads`` with UploadFiles vs a plain FileResponse route.
+
+Starts a uvicorn worker serving a temporary upload directory twice: at
+``/uploads`` through ``UploadFiles`` and at ``/plain`` through a route
+that returns ``FileResponse(path)``. For an avatar variant and a full
+size original it measures requests/sec, latency and bytes on the wire
+for:
+
+- ``full``: a client without a cache
+- ``revalidate``: a client sending back the ETag it got
+- ``range``: the first 64 KiB of the file
+
+    python -m benchmarks.static_uploads --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .common import summarize
+from .multi_worker import wait_ready
+
+def create_app():
+    """ASGI app for the worker; serves ``STATIC_BENCH_DIR``."""
+    from starlette.applications import Starlette
+    from starlette.responses import FileResponse
+    from starlette.routing import Mount, Route
+
+    from app.utils.upload_files import UploadFiles
+
+    directory = os.environ["STATIC_BENCH_DIR"]
+
+    async def plain(request):
+        return FileResponse(os.path.join(directory, request.path_params["path"]))
+
+    return Starlette(routes=[
+        Route("/plain/{path:path}", plain),
+        Mount("/uploads", UploadFiles(directory=directory)),
+    ])
+
+def write_file(directory: str, size: int, variant: str = "", extension: str = "png") -> str:
+    content = os.urandom(size)
+    digest = hashlib.sha256(content).hexdigest()
+    name = f"{digest[:2]}/{digest}{variant}.{extension}"
+    os.makedirs(os.path.join(directory, digest[:2]), exist_ok=True)
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(content)
+    return name
+
+async def run(client: httpx.AsyncClient, url: str, scenario: str, requests: int, concurrency: int) -> dict:
+    first = await client.get(url)
+    headers = {}
+    if scenario == "revalidate":
+        headers["If-None-Match"] = first.headers["etag"]
+    elif scenario == "range":
+        headers["Range"] = "bytes=0-65535"
+
+    latencies = []
+    statuses: dict = {}
+    received = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, received
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            received += len(response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": scenario,
+        "requests_per_s": requests / elapsed,
+        "body_mb": received / 1024 / 1024,
+        "statuses": statuses,
+        "cache_control": first.headers.get("cache-control"),
+        "etag": first.headers.get("etag"),
+        "latency": summarize(latencies),
+    }
+
+async def main(args):
+    directory = tempfile.mkdtemp(prefix="lagfast-static-")
+    files = {
+        "avatar": write_file(directory, args.avatar_size, "_64", "webp"),
+        "original": write_file(directory, args.original_size),
+    }
+    env = {**os.environ, "STATIC_BENCH_DIR": directory}
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.static_uploads:create_app", "--factory",
+         "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    results = []
+    try:
+        await wait_ready([args.port])
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits) as client:
+            for kind, name in files.items():
+                for target in ("plain", "uploads"):
+                    for scenario in args.scenarios:
+                        result = await run(client, f"/{target}/{name}", scenario, args.requests, args.concurrency)
+                        results.append({"file": kind, "target": target, **result})
+    finally:
+        worker.terminate()
+        worker.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(json.dumps({
+        "benchmark": "static_uploads",
+        "avatar_bytes": args.avatar_size,
+        "original_bytes": args.original_size,
+        "concurrency": args.concurrency,
+        "results": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--avatar-size", type=int, default=4 * 1024)
+    parser.add_argument("--original-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--scenarios", nargs="+", default=["full", "revalidate", "range"])
+    parser.add_argument("--port", type=int, default=8160)
+    asyncio.run(main(parser.parse_args()))
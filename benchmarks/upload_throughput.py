@@ -0,0 +1,164 @@
+"""
+Concurrent photo uploads with the file copied on the loop vs streamed.
+
+Drives concurrent ``POST /users/{id}/photo`` requests through the ASGI
+app in process and reports uploads/sec, request latency and event-loop
+lag for:
+
+- ``blocking``: the old ``shutil.copyfileobj`` on the event loop,
+  trusting the declared size
+- ``streaming``: ``stage_upload_file``, chunked reads written and hashed
+  from a thread
+
+Uploads cycle through ``--distinct`` different images, and the files
+stored per mode show what content addressing saves. Also checks that an
+oversized upload (sent without a declared size) and a non-image with an
+image extension are rejected.
+
+    python -m benchmarks.upload_throughput --uploads 200 --distinct 10 --size 2097152 --concurrency 16
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .common import configure_environment, summarize
+
+configure_environment()
+
+import httpx  # noqa: E402
+
+from app.controllers import user_controller  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.photo_service import PhotoService  # noqa: E402
+from app.utils import file_upload  # noqa: E402
+from app.utils.database import async_engine  # noqa: E402
+from app.utils.thumbnails import thumbnail_pool  # noqa: E402
+
+from .login_throughput import tick  # noqa: E402
+from .seed import prepare_schema, seed_users  # noqa: E402
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+async def blocking_stage(upload_file) -> file_upload.StagedFile:
+    """Staging the way uploads were saved before they streamed: all on the loop."""
+    if upload_file.size and upload_file.size > file_upload.MAX_FILE_SIZE:
+        raise ValueError("File too large")
+    path = file_upload.get_upload_dir() / f".upload-{time.time_ns()}.part"
+    with path.open("wb") as buffer:
+        shutil.copyfileobj(upload_file.file, buffer)
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    return file_upload.StagedFile(str(path), digest, "png", path.stat().st_size)
+
+def stored_files() -> tuple:
+    count = size = 0
+    for root, _, files in os.walk(file_upload.UPLOAD_DIR):
+        for name in files:
+            count += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return count, size
+
+def image(size: int) -> bytes:
+    """About ``size`` bytes of PNG; a decodable noise image if Pillow is installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return PNG_HEADER + os.urandom(max(0, size - len(PNG_HEADER)))
+    side = max(1, int((size / 3) ** 0.5))
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(buffer, "PNG", compress_level=0)
+    return buffer.getvalue()
+
+async def run(mode: str, users: int, uploads: int, distinct: int, size: int, concurrency: int) -> dict:
+    user_controller.stage_upload_file = blocking_stage if mode == "blocking" else file_upload.stage_upload_file
+    payloads = [image(size) for _ in range(distinct)]
+    latencies, lag = [], []
+    statuses: dict = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(uploads):
+        queue.put_nowait((i % users + 1, payloads[i % distinct]))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                user_id, payload = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post(
+                    f"/users/{user_id}/photo", files={"file": ("photo.png", payload, "image/png")}
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        stop = asyncio.Event()
+        ticker = asyncio.create_task(tick(lag, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await ticker
+
+        oversized = await client.post(
+            "/users/1/photo",
+            files={"file": ("big.png", PNG_HEADER + os.urandom(file_upload.MAX_FILE_SIZE), "image/png")},
+        )
+        spoofed = await client.post(
+            "/users/1/photo", files={"file": ("fake.png", b"<html></html>", "image/png")}
+        )
+        variants_started = time.perf_counter()
+        await PhotoService.wait_for_variants()
+        variants_s = time.perf_counter() - variants_started
+        photo = (await client.get("/users/1")).json()["photo_url"]
+
+    files, stored_bytes = stored_files()
+    return {
+        "mode": mode,
+        "uploads": uploads,
+        "elapsed_s": elapsed,
+        "uploads_per_s": uploads / elapsed,
+        "mb_per_s": uploads * size / elapsed / 1024 / 1024,
+        "statuses": statuses,
+        "latency": summarize(latencies),
+        "loop_lag": summarize(lag),
+        "oversized_status": oversized.status_code,
+        "spoofed_status": spoofed.status_code,
+        "stored_files": files,
+        "stored_mb": stored_bytes / 1024 / 1024,
+        "uploaded_mb": uploads * size / 1024 / 1024,
+        "variants_wait_s": variants_s,
+        "user_1_photo_url": photo,
+    }
+
+async def main(args):
+    prepare_schema()
+    seed_users(args.users)
+    results = []
+    for mode in args.modes:
+        file_upload.UPLOAD_DIR = tempfile.mkdtemp(prefix="lagfast-uploads-")
+        try:
+            results.append(await run(mode, args.users, args.uploads, args.distinct, args.size, args.concurrency))
+        finally:
+            shutil.rmtree(file_upload.UPLOAD_DIR, ignore_errors=True)
+    thumbnail_pool.shutdown()
+    await async_engine.dispose()
+    print(json.dumps({
+        "benchmark": "upload_throughput",
+        "file_bytes": args.size,
+        "concurrency": args.concurrency,
+        "thumbnails": thumbnail_pool.stats(),
+        "results": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=10, help="different images uploaded")
+    parser.add_argument("--size", type=int, default=2 * 1024 * 1024, help="bytes per upload")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--modes", nargs="+", default=["blocking", "streaming"])
+    asyncio.run(main(parser.parse_args()))
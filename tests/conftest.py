@@ -0,0 +1,23 @@
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.common import configure_environment
+
+# The app reads its configuration at import time
+configure_environment()
+
+from app.main import app  # noqa: E402
+from benchmarks.seed import PASSWORD, prepare_schema, seed_users  # noqa: E402
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: starts real worker processes; skip with -m 'not slow'")
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture(scope="session")
+def users():
+    """Seed ``user0``..``user4``, all with ``PASSWORD``."""
+    prepare_schema()
+    seed_users(5)
+    return PASSWORD
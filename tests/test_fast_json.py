@@ -0,0 +1,23 @@
+import pytest
+from app.controllers import user_controller
+from app.routers import chat_router
+from benchmarks.seed import seed_messages
+
+PATHS = ["/users/?limit=5", "/rooms/1/messages", "/messages/1/history?peer_id=1", "/messages/1"]
+
+@pytest.fixture(scope="module")
+def messages(users):
+    seed_messages(20, users=2, rooms=2)
+
+def get(client, monkeypatch, path, fast):
+    monkeypatch.setattr(user_controller, "FAST_JSON_RESPONSES", fast)
+    monkeypatch.setattr(chat_router, "FAST_JSON_RESPONSES", fast)
+    response = client.get(path)
+    assert response.status_code == 200
+    return response.text
+
+@pytest.mark.parametrize("path", PATHS)
+def test_fast_path_body_matches_response_model(client, monkeypatch, messages, path):
+    fast = get(client, monkeypatch, path, True)
+    assert fast == get(client, monkeypatch, path, False)
+    assert '"id"' in fast
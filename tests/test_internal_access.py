@@ -0,0 +1,20 @@
+import pytest
+from app.routers import internal_router
+
+PATHS = ["/internal/ws/outbound", "/internal/loop/stalls", "/internal/auth/user-cache", "/internal/metrics"]
+
+@pytest.mark.parametrize("path", PATHS)
+def test_rejected_without_configured_token(client, monkeypatch, path):
+    monkeypatch.setattr(internal_router, "INTERNAL_API_TOKEN", None)
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Internal-Token": ""}).status_code == 403
+
+@pytest.mark.parametrize("headers", [{}, {"X-Internal-Token": "wrong"}])
+def test_rejected_without_matching_header(client, monkeypatch, headers):
+    monkeypatch.setattr(internal_router, "INTERNAL_API_TOKEN", "s3cret")
+    assert client.get("/internal/ws/outbound", headers=headers).status_code == 403
+
+def test_allowed_with_matching_header(client, monkeypatch):
+    monkeypatch.setattr(internal_router, "INTERNAL_API_TOKEN", "s3cret")
+    response = client.get("/internal/ws/outbound", headers={"X-Internal-Token": "s3cret"})
+    assert response.status_code == 200
@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from app.utils.database import async_engine
+from app.websocket.chat_server import valid_message
+from app.websocket.message_writer import MessageWriteFailed, MessageWriter, MessageWriterStopped
+
+ROW = {"room_id": 1, "receiver_id": 1, "sender_id": 1, "content": "hi", "message_type": "text", "is_read": False}
+
+def broken_session():
+    raise RuntimeError("database is gone")
+
+def test_submit_after_stop_is_rejected():
+    async def scenario():
+        writer = MessageWriter()
+        writer.start()
+        await writer.stop()
+        with pytest.raises(MessageWriterStopped):
+            await writer.submit(ROW)
+        assert writer._task is None
+
+    asyncio.run(scenario())
+
+def test_failed_batch_fails_every_waiting_sender():
+    async def scenario():
+        writer = MessageWriter(session_factory=broken_session)
+        futures = [await writer.submit(ROW, wait=True) for _ in range(3)]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await writer.stop()
+        assert all(isinstance(result, MessageWriteFailed) for result in results)
+        assert writer.failed == 3
+
+    asyncio.run(scenario())
+
+def test_bad_row_only_fails_its_own_sender(users):
+    async def scenario():
+        writer = MessageWriter(flush_interval=0.5)
+        good = await writer.submit(ROW, wait=True)
+        bad = await writer.submit({**ROW, "content": {"not": "text"}}, wait=True)
+        results = await asyncio.gather(good, bad, return_exceptions=True)
+        await writer.stop()
+        await async_engine.dispose()
+        assert results[0] is None
+        assert isinstance(results[1], MessageWriteFailed)
+        assert (writer.written, writer.failed, writer.retried_batches) == (1, 1, 1)
+
+    asyncio.run(scenario())
+
+def test_invalid_messages_are_rejected_before_queueing():
+    assert valid_message(1, "hi")
+    for room_id, content in [("1", "hi"), (True, "hi"), (0, "hi"), (1, ""), (1, "  "), (1, {"a": 1}), (None, "hi")]:
+        assert not valid_message(room_id, content)
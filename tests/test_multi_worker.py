@@ -0,0 +1,80 @@
+import asyncio
+import os
+import socket
+import tempfile
+import httpx
+import pytest
+from app.utils.auth import create_access_token
+from benchmarks.multi_worker import ROOM_ID, Client, start_processes, wait_for, wait_ready
+
+TIMEOUT = 10.0
+
+def free_ports(count: int) -> list:
+    """``count`` consecutive free ports, as ``start_processes`` needs."""
+    for base in range(8400, 8600, count):
+        try:
+            sockets = [socket.create_server(("127.0.0.1", base + n)) for n in range(count)]
+        except OSError:
+            continue
+        for sock in sockets:
+            sock.close()
+        return [base + n for n in range(count)]
+    raise RuntimeError("No free ports")
+
+@pytest.fixture(scope="module")
+def workers(users):
+    ports = free_ports(2)
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="lagfast-broker-"), "broker.sock")
+    processes = start_processes(len(ports), ports[0], socket_path)
+    try:
+        asyncio.run(wait_ready(ports))
+        yield ports
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+@pytest.mark.slow
+def test_room_messages_and_presence_cross_workers(workers):
+    async def run():
+        first, second = Client(1, workers[0]), Client(2, workers[1])
+        await first.connect()
+        await second.connect()
+        try:
+            assert await wait_for(lambda: second.user_id in first.online, TIMEOUT)
+            assert await wait_for(lambda: first.user_id in second.online, TIMEOUT)
+
+            for client in (first, second):
+                await client.sio.emit('join_room', {'room_id': ROOM_ID})
+            await asyncio.sleep(0.2)
+            await first.sio.emit('message', {'room_id': ROOM_ID, 'content': 'across workers'})
+            assert await wait_for(
+                lambda: any(data.get('content') == 'across workers' for _, data in second.messages), TIMEOUT)
+        finally:
+            await second.sio.disconnect()
+        assert await wait_for(lambda: second.user_id not in first.online, TIMEOUT)
+        await first.sio.disconnect()
+
+    asyncio.run(run())
+
+@pytest.mark.slow
+def test_user_update_invalidates_other_workers_cache(workers):
+    async def run():
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user1'})}"}
+        first, second = (f"http://127.0.0.1:{port}" for port in workers)
+        async with httpx.AsyncClient() as http:
+            # Caches user1 on the first worker
+            me = (await http.get(f"{first}/users/me", headers=headers)).json()
+            email = "moved@example.com" if me["email"] != "moved@example.com" else "user1@example.com"
+            response = await http.put(f"{second}/users/{me['id']}", json={"email": email})
+            assert response.status_code == 200
+
+            async def seen() -> bool:
+                return (await http.get(f"{first}/users/me", headers=headers)).json()["email"] == email
+
+            deadline = asyncio.get_running_loop().time() + TIMEOUT
+            while not await seen():
+                assert asyncio.get_running_loop().time() < deadline
+                await asyncio.sleep(0.05)
+
+    asyncio.run(run())
@@ -0,0 +1,14 @@
+from app.routers import internal_router
+from app.websocket.chat_server import sio
+from app.websocket.outbound import OutboundQueue, connection_key
+
+def test_outbound_stats_hide_session_ids(client, monkeypatch):
+    monkeypatch.setattr(internal_router, "INTERNAL_API_TOKEN", "s3cret")
+    monkeypatch.setitem(sio._outbound, "eio-secret", OutboundQueue())
+    monkeypatch.setattr(sio.manager, "sid_from_eio_sid", lambda eio_sid, namespace: "sio-secret")
+
+    response = client.get("/internal/ws/outbound", headers={"X-Internal-Token": "s3cret"})
+
+    assert response.status_code == 200
+    assert "secret" not in response.text
+    assert response.json()["connections"][0]["connection"] == connection_key("sio-secret")
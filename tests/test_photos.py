@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import select
+from app.models.photo import PhotoBlob
+from app.services import photo_service
+from app.services.photo_service import PhotoBusy, PhotoService
+from app.utils.database import AsyncSessionLocal, async_engine
+from app.utils.file_upload import StagedFile
+
+def staged(digest: str) -> StagedFile:
+    return StagedFile(path="/nonexistent", digest=digest, extension="png", size=1)
+
+def run(scenario):
+    async def wrapped():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await scenario(db)
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(wrapped())
+
+def releasing(digest: str, released_at) -> PhotoBlob:
+    return PhotoBlob(digest=digest, extension="png", size=1, refcount=-1, released_at=released_at)
+
+def test_upload_waits_for_a_release_then_gives_up(users, monkeypatch):
+    monkeypatch.setattr(photo_service, "PHOTO_RELEASE_WAIT", 0.1)
+
+    async def scenario(db):
+        db.add(releasing("a" * 64, datetime.now(timezone.utc)))
+        await db.commit()
+        with pytest.raises(PhotoBusy):
+            await PhotoService.acquire(db, staged("a" * 64))
+
+    run(scenario)
+
+def test_upload_reclaims_a_release_that_never_finished(users):
+    async def scenario(db):
+        db.add(releasing("b" * 64, datetime.now(timezone.utc) - timedelta(hours=1)))
+        await db.commit()
+        await PhotoService.acquire(db, staged("b" * 64))
+        return await db.scalar(select(PhotoBlob.refcount).where(PhotoBlob.digest == "b" * 64))
+
+    assert run(scenario) == 1
+
+def test_failed_release_does_not_leave_the_row_behind(users, monkeypatch):
+    def broken_remove(*args):
+        raise OSError("disk went away")
+    monkeypatch.setattr(photo_service, "remove_stored_files", broken_remove)
+
+    async def scenario(db):
+        db.add(PhotoBlob(digest="c" * 64, extension="png", size=1, refcount=1))
+        await db.commit()
+        with pytest.raises(OSError):
+            await PhotoService.release(db, "c" * 64)
+        return await db.scalar(select(PhotoBlob.refcount).where(PhotoBlob.digest == "c" * 64))
+
+    assert run(scenario) is None
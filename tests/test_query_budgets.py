@@ -0,0 +1,73 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.utils import query_budget as budgets
+from app.utils.auth import create_access_token
+from app.utils.database import get_async_db
+from app.utils.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware, query_budget
+from benchmarks.seed import seed_messages
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+# Run in order: later requests depend on what earlier ones changed
+REQUESTS = [
+    ("POST", "/users/", {"json": {"email": "budget@example.com", "username": "budget", "password": "secret123"}}),
+    ("POST", "/users/", {"json": {"email": "budget@example.com", "username": "budget", "password": "secret123"}}),
+    ("GET", "/users/", {}),
+    ("GET", "/users/?skip=1", {}),
+    ("GET", "/users/1", {}),
+    ("PUT", "/users/2", {"json": {"username": "renamed"}}),
+    ("DELETE", "/users/3", {}),
+    ("POST", "/auth/login", {"json": {"username": "user4", "password": None}}),
+    ("GET", "/users/me", {"auth": True}),
+    ("GET", "/messages/1", {}),
+    ("GET", "/messages/2/history?peer_id=3", {"auth": True}),
+    ("GET", "/rooms/1/messages", {}),
+    ("GET", "/users/export", {}),
+    ("POST", "/users/4/photo", {"files": {"file": ("a.png", PNG + b"a", "image/png")}}),
+    ("DELETE", "/users/4", {}),
+]
+
+@pytest.fixture
+def raise_mode(monkeypatch):
+    monkeypatch.setattr(budgets, "QUERY_BUDGET_MODE", "raise")
+
+@pytest.fixture(scope="module")
+def messages(users):
+    seed_messages(100, users=5, rooms=2)
+    return users
+
+@pytest.mark.parametrize("method, url, options", REQUESTS, ids=[f"{m} {u}" for m, u, _ in REQUESTS])
+def test_endpoint_stays_within_budget(client, raise_mode, messages, method, url, options):
+    options = dict(options)
+    if options.pop("auth", False):
+        options["headers"] = {"Authorization": f"Bearer {create_access_token({'sub': 'user4'})}"}
+    if url == "/auth/login":
+        options["json"] = {**options["json"], "password": messages}
+    # An overrun raises QueryBudgetExceeded here, with the statements it ran
+    response = client.request(method, url, **options)
+    assert response.status_code < 500
+
+def over_budget_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(QueryBudgetMiddleware)
+
+    @app.get("/one-query", dependencies=[query_budget(0)])
+    async def one_query(db=Depends(get_async_db)):
+        await db.execute(text("SELECT 1"))
+        return {"ok": True}
+
+    return app
+
+def test_overrun_fails_before_the_response_starts(raise_mode):
+    client = TestClient(over_budget_app(), raise_server_exceptions=False)
+    assert client.get("/one-query").status_code == 500
+
+    with pytest.raises(QueryBudgetExceeded, match="ran 1 SQL statements, budget is 0"):
+        TestClient(over_budget_app()).get("/one-query")
+
+def test_overrun_is_only_logged_in_warn_mode(monkeypatch, caplog):
+    monkeypatch.setattr(budgets, "QUERY_BUDGET_MODE", "warn")
+    assert TestClient(over_budget_app()).get("/one-query").status_code == 200
+    assert "budget is 0" in caplog.text
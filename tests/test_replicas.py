@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.utils.replicas import ReplicaRoutingMiddleware, ReplicaSet, routing_keys, user_key
+
+INSERT = SimpleNamespace(isinsert=True, isupdate=False, isdelete=False)
+
+def make_replicas():
+    primary = async_sessionmaker(create_async_engine("sqlite+aiosqlite://"))
+    return ReplicaSet(primary, {"replica": create_async_engine("sqlite+aiosqlite://")}, sticky_seconds=30)
+
+def http_scope(cookie=None, user_id=None):
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    auth = SimpleNamespace(user_id=user_id) if user_id is not None else None
+    return {"type": "http", "client": ("10.0.0.1", 1234), "headers": headers, "auth": auth}
+
+def call(replicas, scope, writes):
+    async def app(scope, receive, send):
+        if writes:
+            replicas._after_cursor_execute(None, None, "INSERT", None, INSERT, False)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(ReplicaRoutingMiddleware(app, replicas)(scope, None, send))
+    return dict(sent[0]["headers"])
+
+def test_client_address_is_not_a_routing_key():
+    assert routing_keys(http_scope()) == []
+    assert routing_keys(http_scope(user_id=7)) == [user_key(7)]
+
+def test_anonymous_write_sets_sticky_cookie_only_for_the_writer():
+    replicas = make_replicas()
+    assert b"set-cookie" not in call(replicas, http_scope(), writes=False)
+    cookie = call(replicas, http_scope(), writes=True)[b"set-cookie"].decode()
+    assert cookie.startswith("replica_sticky=1;") and "Max-Age=30" in cookie
+
+    # Another client behind the same address still reads from the replica
+    replicas.session_for(http_scope())
+    assert replicas.reads["replica"] == 1 and replicas.sticky_reads == 0
+    replicas.session_for(http_scope(cookie="replica_sticky=1"))
+    assert replicas.sticky_reads == 1
+
+def test_authenticated_write_keeps_that_user_on_the_primary():
+    replicas = make_replicas()
+    call(replicas, http_scope(user_id=7), writes=True)
+    replicas.session_for(http_scope(user_id=7))
+    assert replicas.sticky_reads == 1
+    replicas.session_for(http_scope(user_id=8))
+    assert replicas.reads["replica"] == 1
@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, inspect, text
+from app.utils.database import Base
+from app.utils.schema import upgrade_schema
+
+def test_upgrade_adds_columns_and_indexes_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, username VARCHAR, "
+            "hashed_password VARCHAR, is_active BOOLEAN, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO users (email, username, hashed_password) VALUES ('a', 'a', 'x')"))
+
+    # Workers starting together must not trip over each other
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: upgrade_schema(engine, Base.metadata), range(4)))
+
+    columns = {column["name"] for column in inspect(engine).get_columns("users")}
+    assert {column.name for column in Base.metadata.tables["users"].columns} <= columns
+    indexes = {index["name"] for table in inspect(engine).get_table_names() for index in inspect(engine).get_indexes(table)}
+    assert {index.name for table in Base.metadata.sorted_tables for index in table.indexes} <= indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM users")).scalar() == 1
+    engine.dispose()
@@ -0,0 +1,41 @@
+import asyncio
+from app.services.user_cache import UserCache, UserSnapshot, user_cache
+from app.services.user_service import UserService
+from app.utils.database import AsyncSessionLocal, async_engine
+
+def snapshot(username: str) -> UserSnapshot:
+    return UserSnapshot(id=1, email=f"{username}@example.com", username=username,
+                        is_active=True, created_at=None, updated_at=None)
+
+def test_put_after_invalidation_is_dropped():
+    cache = UserCache()
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put(snapshot("old"), generation)
+    assert cache.get(1) is None and cache.stats()["stale_puts"] == 1
+    cache.put(snapshot("new"), cache.generation)
+    assert cache.get(1).username == "new"
+
+def test_principal_read_racing_an_update_is_not_cached(users, monkeypatch):
+    get_user = UserService.get_user
+
+    async def racing_get_user(db, user_id):
+        user = await get_user(db, user_id)
+        # An update commits and invalidates while this read is in flight
+        user_cache.invalidate(user_id)
+        return user
+
+    async def run():
+        user_cache.clear()
+        monkeypatch.setattr(UserService, "get_user", racing_get_user)
+        async with AsyncSessionLocal() as db:
+            assert await UserService.get_principal(db, 1) is not None
+        assert user_cache.get(1) is None
+
+        monkeypatch.setattr(UserService, "get_user", get_user)
+        async with AsyncSessionLocal() as db:
+            await UserService.get_principal(db, 1)
+        assert user_cache.get(1) is not None
+        await async_engine.dispose()
+
+    asyncio.run(run())
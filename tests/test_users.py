@@ -0,0 +1,20 @@
+import json
+
+def test_export_rows_match_listing(client, users):
+    listed = client.get("/users/", params={"limit": 5}).json()
+    exported = [json.loads(line) for line in client.get("/users/export").text.splitlines()]
+    assert [set(row) for row in exported[:5]] == [set(row) for row in listed]
+    assert "photo_url" in exported[0]
+
+def test_limit_is_bounded(client, users):
+    assert client.get("/users/", params={"limit": -1}).status_code == 422
+    assert client.get("/users/", params={"limit": 0}).status_code == 422
+    assert client.get("/users/", params={"limit": 1001}).status_code == 422
+    assert client.get("/users/", params={"skip": -1}).status_code == 422
+
+def test_skip_pages_continue_with_their_cursor(client, users):
+    first = client.get("/users/", params={"skip": 1, "limit": 2})
+    ids = [row["id"] for row in first.json()]
+    assert ids == sorted(ids)
+    following = client.get("/users/", params={"cursor": first.headers["X-Next-Cursor"], "limit": 2}).json()
+    assert following[0]["id"] > ids[-1]